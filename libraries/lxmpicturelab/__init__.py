@@ -3,6 +3,8 @@ from .utils import patch_sysargv
 from ._logging import configure_logging
 from . import browse
 from . import download
+from . import imagebufio
 from . import oiiotoolio
+from . import scanlineio
 
 __version__ = "2"
@@ -3,6 +3,11 @@ import enum
 import json
 import logging
 from pathlib import Path
+from typing import Any
+
+import OpenImageIO as oiio
+
+from lxmpicturelab.constants import METADATA_PREFIX
 
 
 LOGGER = logging.getLogger(__name__)
@@ -189,6 +194,35 @@ class AssetMetadata:
         return cls.from_dict(serialized_dict=content)
 
 
+@dataclasses.dataclass(frozen=True)
+class AssetImageSpec:
+    """
+    Description of an asset image file, as found in its header.
+    """
+
+    width: int
+    height: int
+    channels: tuple[str, ...]
+    pixel_type: str
+    """
+    name of the OpenImageIO type of the pixels like "half" or "float".
+    """
+    compression: str
+    """
+    value of the OpenImageIO "compression" attribute, empty if unspecified.
+    """
+
+    @classmethod
+    def from_oiio_spec(cls, spec: oiio.ImageSpec) -> "AssetImageSpec":
+        return cls(
+            width=spec.width,
+            height=spec.height,
+            channels=tuple(spec.channelnames),
+            pixel_type=str(spec.format),
+            compression=spec.get_string_attribute("compression"),
+        )
+
+
 class ImageAsset:
     """
     Represent a virtual test image "asset".
@@ -197,14 +231,30 @@ class ImageAsset:
     an image file, both with the same path stem.
     Only the json file is mandatory to exists to be a valid asset.
 
+    The metadata is parsed once and reused as long as the json file
+    modification time and size doesn't change. Same for the image header
+    which is read without decoding any pixel.
+
     Args:
         json_path: filesystem path to a json file that may not exist yet.
     """
 
+    __slots__ = (
+        "json_path",
+        "_metadata",
+        "_metadata_key",
+        "_image_header",
+        "_image_header_key",
+    )
+
     image_suffix = ".exr"
 
     def __init__(self, json_path: Path):
         self.json_path = json_path
+        self._metadata: AssetMetadata | None = None
+        self._metadata_key: tuple[int, int] | None = None
+        self._image_header: tuple[AssetImageSpec, dict[str, Any]] | None = None
+        self._image_header_key: tuple[int, int] | None = None
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.json_path!r})"
@@ -218,12 +268,64 @@ class ImageAsset:
 
     @property
     def metadata(self) -> AssetMetadata:
-        return AssetMetadata.from_json_file(self.json_path)
+        stat = self.json_path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._metadata is None or self._metadata_key != key:
+            self._metadata = AssetMetadata.from_json_file(self.json_path)
+            self._metadata_key = key
+        return self._metadata
 
     @property
     def image_path(self) -> Path:
         return self.json_path.with_suffix(self.image_suffix)
 
+    def _read_image_header(self) -> tuple[AssetImageSpec, dict[str, Any]]:
+        stat = self.image_path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._image_header is not None and self._image_header_key == key:
+            return self._image_header
+
+        image_file = oiio.ImageInput.open(str(self.image_path))
+        if not image_file:
+            raise RuntimeError(
+                f"(OIIO) cannot open '{self.image_path}': {oiio.geterror()}"
+            )
+        try:
+            spec = image_file.spec()
+        finally:
+            image_file.close()
+
+        prefix = f"{METADATA_PREFIX}/"
+        embedded_metadata = {
+            attribute.name[len(prefix) :]: attribute.value
+            for attribute in spec.extra_attribs
+            if attribute.name.startswith(prefix)
+        }
+        self._image_header = (AssetImageSpec.from_oiio_spec(spec), embedded_metadata)
+        self._image_header_key = key
+        return self._image_header
+
+    @property
+    def image_spec(self) -> AssetImageSpec:
+        """
+        Dimensions and encoding of the image file, read from its header only.
+
+        Raises:
+            FileNotFoundError: if the image file doesn't exist.
+        """
+        return self._read_image_header()[0]
+
+    @property
+    def embedded_metadata(self) -> dict[str, Any]:
+        """
+        Attributes written in the image file header by lxmpicturelab, without
+        their name prefix; like ``__version__``.
+
+        Raises:
+            FileNotFoundError: if the image file doesn't exist.
+        """
+        return dict(self._read_image_header()[1])
+
     @property
     def is_cgi(self) -> bool:
         return self.metadata.type == AssetType.cgi
@@ -1,7 +1,16 @@
+import hashlib
+import json
 import logging
+import os
 from pathlib import Path
+from typing import Any
+from typing import Iterable
 
+import numpy
+
+from .asset import AssetType
 from .asset import ImageAsset
+from .asset import MetadataValidationError
 
 
 LOGGER = logging.getLogger(__name__)
@@ -17,23 +26,339 @@ WORKBENCH_DIR = REPO_ROOT / ".workbench"
 SETS_DIR = REPO_ROOT / "sets"
 
 
+def _get_sort_key(value: Any) -> tuple:
+    if value is None:
+        return (0, "")
+    if isinstance(value, AssetType):
+        return (1, value.value)
+    # AssetPrimaryColor define its own order
+    return (1, value)
+
+
+class AssetIndex:
+    """
+    An in-memory, columnar index of the metadata of many assets.
+
+    Each field is stored as an array of integer codes, one per asset, pointing
+    to the sorted unique values of the field; so filtering and sorting never
+    touch the assets json files again.
+
+    Example::
+
+        index.query(type=AssetType.plate, primary_color=AssetPrimaryColor.blue)
+        index.query(sort_by=("type", "primary_color", "identifier"))
+
+    Args:
+        assets: assets with valid metadata, the others are skipped with a warning.
+    """
+
+    fields = ("identifier", "type", "primary_color", "capture_gamut", "context")
+    """
+    name of the fields that can be filtered and sorted on, in addition to "authors".
+    """
+
+    def __init__(self, assets: Iterable[ImageAsset]):
+        self.assets: list[ImageAsset] = []
+        rows: dict[str, list] = {field: [] for field in self.fields}
+        authors: list[list[str]] = []
+        for asset in assets:
+            try:
+                metadata = asset.metadata
+            except (MetadataValidationError, OSError, ValueError) as error:
+                LOGGER.warning(f"skipping {asset} from index: {error}")
+                continue
+            self.assets.append(asset)
+            rows["identifier"].append(asset.identifier)
+            rows["type"].append(metadata.type)
+            rows["primary_color"].append(metadata.primary_color)
+            rows["capture_gamut"].append(metadata.capture_gamut)
+            rows["context"].append(metadata.context)
+            authors.append(metadata.authors)
+
+        self._values: dict[str, list] = {}
+        self._codes: dict[str, numpy.ndarray] = {}
+        for field, values in rows.items():
+            unique = sorted(set(values), key=_get_sort_key)
+            code_by_value = {value: code for code, value in enumerate(unique)}
+            self._values[field] = unique
+            self._codes[field] = numpy.array(
+                [code_by_value[value] for value in values], dtype=numpy.int32
+            )
+
+        # multi-valued field so stored as an inverted index
+        author_rows: dict[str, list[int]] = {}
+        for row, asset_authors in enumerate(authors):
+            for author in asset_authors:
+                author_rows.setdefault(author, []).append(row)
+        self._authors: dict[str, numpy.ndarray] = {
+            author: numpy.array(rows, dtype=numpy.int64)
+            for author, rows in author_rows.items()
+        }
+
+    def __len__(self):
+        return len(self.assets)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {len(self)} assets>"
+
+    def get_values(self, field: str) -> list:
+        """
+        Get the unique values of the given field, sorted.
+        """
+        if field == "authors":
+            return sorted(self._authors)
+        return list(self._values[field])
+
+    def _match(self, field: str, value: Any) -> numpy.ndarray:
+        # ``value`` can be a single value or a collection of accepted values
+        if isinstance(value, (list, tuple, set, frozenset)):
+            accepted = value
+        else:
+            accepted = [value]
+        if field == "authors":
+            mask = numpy.zeros(len(self), dtype=bool)
+            for author in accepted:
+                mask[self._authors.get(author, [])] = True
+            return mask
+        codes = [
+            code
+            for code, field_value in enumerate(self._values[field])
+            if field_value in accepted
+        ]
+        return numpy.isin(self._codes[field], codes)
+
+    def query(
+        self,
+        sort_by: Iterable[str] = (),
+        reverse: bool = False,
+        **filters: Any,
+    ) -> list[ImageAsset]:
+        """
+        Get the assets matching all the given filters.
+
+        Args:
+            sort_by: name of the fields to sort the result by, by priority. If
+                not specified, assets filtered by "identifier" are returned in the
+                order of the given identifiers, else in the index order.
+            reverse: True to sort in descending order.
+            filters: field name to a value or a collection of accepted values.
+
+        Raises:
+            ValueError: if a field doesn't exist.
+        """
+        for field in list(filters) + list(sort_by):
+            if field not in self.fields and field != "authors":
+                raise ValueError(f"unknown asset field '{field}'")
+
+        mask = numpy.ones(len(self), dtype=bool)
+        for field, value in filters.items():
+            mask &= self._match(field, value)
+        rows = numpy.flatnonzero(mask)
+
+        sort_by = list(sort_by)
+        if "authors" in sort_by:
+            raise ValueError("cannot sort on multi-valued field 'authors'")
+        if sort_by:
+            # lexsort use the last key as primary key
+            keys = [self._codes[field][rows] for field in reversed(sort_by)]
+            rows = rows[numpy.lexsort(keys)]
+        elif isinstance(filters.get("identifier"), (list, tuple)):
+            row_by_id = {self.assets[row].identifier: row for row in rows}
+            order = filters["identifier"]
+            rows = [row_by_id[asset_id] for asset_id in order if asset_id in row_by_id]
+
+        assets = [self.assets[row] for row in rows]
+        if reverse:
+            assets.reverse()
+        return assets
+
+
+class AssetCatalog:
+    """
+    An index of all the ImageAssets stored in a directory, by identifier.
+
+    The directory is scanned once and the index persisted to ``index_path``.
+    The persisted index is reused as long as the modification time of the
+    directories it was built from are unchanged (adding, removing or renaming
+    a file always update its parent directory modification time).
+
+    Args:
+        root_dir: filesystem path to a directory that may not exist.
+        index_path: filesystem path to a json file that may not exist;
+            None to only keep the index in memory.
+    """
+
+    def __init__(self, root_dir: Path, index_path: Path | None = None):
+        self.root_dir = root_dir
+        self.index_path = index_path
+        self._assets: dict[str, ImageAsset] | None = None
+        self._directories: dict[str, int] = {}
+        self._index: AssetIndex | None = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.root_dir!r}, {self.index_path!r})"
+
+    def _is_valid(self, directories: dict[str, int]) -> bool:
+        if not directories:
+            return False
+        for relpath, mtime in directories.items():
+            try:
+                if (self.root_dir / relpath).stat().st_mtime_ns != mtime:
+                    return False
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _scan(self):
+        LOGGER.debug(f"scanning assets in '{self.root_dir}'")
+        self._assets = {}
+        self._directories = {}
+        self._index = None
+        if not self.root_dir.exists():
+            return
+
+        for dirpath, dirnames, filenames in os.walk(self.root_dir):
+            dirnames.sort()
+            relpath = Path(dirpath).relative_to(self.root_dir).as_posix()
+            self._directories[relpath] = os.stat(dirpath).st_mtime_ns
+            for filename in sorted(filenames):
+                if not filename.endswith(".json"):
+                    continue
+                asset = ImageAsset(Path(dirpath, filename))
+                # first found wins, like a linear search would
+                self._assets.setdefault(asset.identifier, asset)
+
+    def _read_index(self) -> bool:
+        if not self.index_path or not self.index_path.exists():
+            return False
+        try:
+            index = json.loads(self.index_path.read_text("utf-8"))
+        except (OSError, ValueError) as error:
+            LOGGER.debug(f"cannot read asset index '{self.index_path}': {error}")
+            return False
+        if index.get("root") != str(self.root_dir):
+            return False
+        if not self._is_valid(index["directories"]):
+            return False
+        self._directories = index["directories"]
+        self._assets = {
+            identifier: ImageAsset(self.root_dir / relpath)
+            for identifier, relpath in index["assets"].items()
+        }
+        return True
+
+    def _write_index(self):
+        if not self.index_path:
+            return
+        index = {
+            "root": str(self.root_dir),
+            "directories": self._directories,
+            "assets": {
+                identifier: asset.json_path.relative_to(self.root_dir).as_posix()
+                for identifier, asset in self._assets.items()
+            },
+        }
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self.index_path.write_text(json.dumps(index), encoding="utf-8")
+        except OSError as error:
+            LOGGER.debug(f"cannot write asset index '{self.index_path}': {error}")
+
+    def _get_assets(self) -> dict[str, ImageAsset]:
+        if self._assets is None:
+            self.refresh()
+        return self._assets
+
+    def refresh(self) -> bool:
+        """
+        Rescan the directory if it changed since the index was built.
+
+        Returns:
+            True if the directory was rescanned.
+        """
+        if self._assets is None and self._read_index():
+            return False
+        if self._assets is not None and self._is_valid(self._directories):
+            return False
+        if self._assets == {} and not self.root_dir.exists():
+            return False
+        self._scan()
+        self._write_index()
+        return True
+
+    def get_all(self) -> list[ImageAsset]:
+        """
+        Get all the assets stored in the directory.
+        """
+        self.refresh()
+        return list(self._assets.values())
+
+    def get(self, identifier: str) -> ImageAsset | None:
+        """
+        Get the asset matching the given identifier, None if not found.
+        """
+        asset = self._get_assets().get(identifier)
+        # the index may be outdated for assets created or deleted since its creation
+        if (not asset or not asset.json_path.exists()) and self.refresh():
+            asset = self._assets.get(identifier)
+        return asset
+
+    def get_index(self) -> AssetIndex:
+        """
+        Get a queryable index of the metadata of all the assets in the directory.
+
+        The index is rebuilt when the directory content changes, not when an
+        asset's json file is edited in-place.
+        """
+        self.refresh()
+        if self._index is None:
+            self._index = AssetIndex(self._assets.values())
+        return self._index
+
+    def get_many(self, identifiers: list[str]) -> list[ImageAsset | None]:
+        """
+        Get the assets matching the given identifiers, in the same order.
+
+        Missing assets are returned as None.
+        """
+        assets = self._get_assets()
+        if not all(
+            identifier in assets and assets[identifier].json_path.exists()
+            for identifier in identifiers
+        ):
+            self.refresh()
+        return [self._assets.get(identifier) for identifier in identifiers]
+
+
+_CATALOGS: dict[Path, AssetCatalog] = {}
+
+
+def get_catalog(root_dir: Path) -> AssetCatalog:
+    """
+    Get the process-wide catalog of the given directory, persisted in the workbench.
+    """
+    root_dir = root_dir.absolute()
+    if root_dir not in _CATALOGS:
+        root_hash = hashlib.sha256(str(root_dir).encode("utf-8")).hexdigest()
+        index_name = f"{root_dir.name}.{root_hash[:8]}.json"
+        index_path = WORKBENCH_DIR / "asset-catalogs" / index_name
+        _CATALOGS[root_dir] = AssetCatalog(root_dir, index_path=index_path)
+    return _CATALOGS[root_dir]
+
+
 def get_all_assets(root_dir: Path) -> list[ImageAsset]:
     """
     Retrieve all the existing ImageryAssets stored in the given directory.
     """
     root_dir = root_dir or ASSET_DIR
-    return [ImageAsset(path) for path in root_dir.rglob("*.json")]
+    return get_catalog(root_dir).get_all()
 
 
 def get_asset(identifier: str, root_dir: Path) -> ImageAsset | None:
     """
     Get the asset matching the given identifier from the given directory.
     """
-    assets = get_all_assets(root_dir)
-    for asset in assets:
-        if asset.identifier == identifier:
-            return asset
-    return None
+    return get_catalog(root_dir).get(identifier)
 
 
 def find_asset(identifier: str) -> ImageAsset | None:
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+LOGGER = logging.getLogger(__name__)
+
+_FILE_HASHES: dict[tuple[Path, int, int], str] = {}
+_FILE_HASHES_LOCK = threading.Lock()
+
+
+def hash_file(path: Path) -> str:
+    """
+    Get the sha256 hex digest of the given file content.
+
+    Results are memoized for the lifetime of the process as long as the file
+    modification time and size doesn't change.
+    """
+    stat = path.stat()
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _FILE_HASHES_LOCK:
+        if key in _FILE_HASHES:
+            return _FILE_HASHES[key]
+
+    hasher = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    with _FILE_HASHES_LOCK:
+        _FILE_HASHES[key] = digest
+    return digest
+
+
+def hash_object(obj) -> str:
+    """
+    Get the sha256 hex digest of the given json-serializable object.
+    """
+    serialized = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    A persistent content-addressed storage of generated files.
+
+    Each entry is a directory named after its key, storing an arbitrary number of
+    files. Entries are evicted by least recent usage when the cache grows over
+    ``max_size``.
+
+    Scanning the cache to evict is expensive, so it is only done once the files
+    stored by this instance grow over ``evict_interval`` of ``max_size``; callers
+    storing many entries should also call :meth:`evict` once they are done.
+
+    The stored size is not shared between copies of an instance: when storing
+    from other processes, disable their eviction and report the stored sizes to
+    a single instance with :meth:`add_stored_size`.
+
+    Multiple processes can use the same cache concurrently; entries removed by
+    another process are considered missing.
+
+    Args:
+        root_dir: filesystem path to a directory that may not exist yet.
+        max_size: maximum size in bytes the cache can occupy on disk.
+        evict_interval: 0-1 ratio of ``max_size`` to store before evicting.
+    """
+
+    def __init__(
+        self,
+        root_dir: Path,
+        max_size: int = 5 * 1024**3,
+        evict_interval: float = 0.1,
+    ):
+        self.root_dir = root_dir
+        self.max_size = max_size
+        self.evict_interval = evict_interval
+        self._stored_size = 0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.root_dir!r}, max_size={self.max_size})"
+
+    def _get_entry_dir(self, key: str) -> Path:
+        return self.root_dir / key[:2] / key
+
+    @staticmethod
+    def _get_entry_name(index: int, path: Path) -> str:
+        return f"{index}{path.suffix}"
+
+    def fetch(self, key: str, dst_paths: list[Path]) -> bool:
+        """
+        Copy the files of the given entry to the given paths.
+
+        Args:
+            key: identifier of the cache entry
+            dst_paths: filesystem path to files that may exist, in the same order
+                they were given to :meth:`store`.
+
+        Returns:
+            True if the entry existed and was copied, else False.
+        """
+        entry_dir = self._get_entry_dir(key)
+        src_paths = [
+            entry_dir / self._get_entry_name(index, dst_path)
+            for index, dst_path in enumerate(dst_paths)
+        ]
+        try:
+            for src_path, dst_path in zip(src_paths, dst_paths):
+                shutil.copy(src_path, dst_path)
+            # update modification time to mark the entry as recently used
+            os.utime(entry_dir)
+        except FileNotFoundError:
+            # never stored, or evicted by another process while copying
+            return False
+        return True
+
+    def store(self, key: str, src_paths: list[Path], evict: bool = True) -> int:
+        """
+        Add the given files to the cache under the given key.
+
+        Args:
+            key: identifier of the cache entry
+            src_paths: filesystem path to existing files.
+            evict: False to not count the stored files toward the next eviction,
+                when the caller reports them with :meth:`add_stored_size` instead.
+
+        Returns:
+            size in bytes of the stored files.
+        """
+        missing = [path for path in src_paths if not path.exists()]
+        if missing:
+            LOGGER.warning(f"cannot cache '{key}'; missing files {missing}")
+            return 0
+
+        entry_dir = self._get_entry_dir(key)
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+        size = sum(path.stat().st_size for path in src_paths)
+        # write in a temporary directory first so concurrent processes never
+        # read an incomplete entry
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=entry_dir.parent))
+        for index, src_path in enumerate(src_paths):
+            shutil.copy(src_path, tmp_dir / self._get_entry_name(index, src_path))
+        try:
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            tmp_dir.rename(entry_dir)
+        except OSError as error:
+            LOGGER.debug(f"cannot store '{key}' (concurrent write ?): {error}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if evict:
+            self.add_stored_size(size)
+        return size
+
+    def add_stored_size(self, size: int):
+        """
+        Count files stored in the cache toward the next eviction, evicting if due.
+
+        Args:
+            size: size in bytes of the stored files, as returned by :meth:`store`.
+        """
+        self._stored_size += size
+        if self._stored_size > self.max_size * self.evict_interval:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is under its max size.
+        """
+        self._stored_size = 0
+        entries: list[tuple[float, int, Path]] = []
+        total_size = 0
+        for entry_dir in self.root_dir.glob("*/*"):
+            if entry_dir.name.startswith(".tmp-"):
+                continue
+            try:
+                size = sum(path.stat().st_size for path in entry_dir.iterdir())
+                mtime = entry_dir.stat().st_mtime
+            except FileNotFoundError:
+                # removed by another process while scanning
+                continue
+            entries.append((mtime, size, entry_dir))
+            total_size += size
+
+        entries.sort()
+        while total_size > self.max_size and entries:
+            _, size, entry_dir = entries.pop(0)
+            LOGGER.debug(f"evicting cache entry '{entry_dir}'")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+
+
+class BuildManifest:
+    """
+    Record the hash of the inputs each output was generated from, so subsequent
+    builds only regenerate the outputs whose inputs changed.
+
+    Usage::
+
+        if manifest.is_outdated(output_path, inputs_hash):
+            ...  # generate output_path
+            manifest.update(output_path, inputs_hash)
+
+    Args:
+        path: filesystem path to a json file that may not exist.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: dict[str, str] = {}
+        self._used: set[str] = set()
+        if path.exists():
+            self._entries = json.loads(path.read_text("utf-8"))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    @staticmethod
+    def _get_key(output_path: Path) -> str:
+        return output_path.absolute().as_posix()
+
+    def is_outdated(self, output_path: Path, inputs_hash: str) -> bool:
+        """
+        Return True if the given output doesn't exist or was generated from other inputs.
+
+        Args:
+            output_path: filesystem path to a file or directory that may exist.
+            inputs_hash: identify all the inputs used to generate the output.
+        """
+        key = self._get_key(output_path)
+        self._used.add(key)
+        return not output_path.exists() or self._entries.get(key) != inputs_hash
+
+    def update(self, output_path: Path, inputs_hash: str):
+        """
+        Record that the given output was generated from the given inputs.
+        """
+        key = self._get_key(output_path)
+        self._used.add(key)
+        self._entries[key] = inputs_hash
+
+    def prune(self) -> list[Path]:
+        """
+        Delete the outputs recorded by a previous build but not used by this one.
+
+        Returns:
+            filesystem path of the outputs deleted.
+        """
+        removed = []
+        for key in list(self._entries):
+            if key in self._used:
+                continue
+            path = Path(key)
+            LOGGER.debug(f"removing stale output '{path}'")
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+            del self._entries[key]
+            removed.append(path)
+        return removed
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        serialized = json.dumps(self._entries, indent=4, sort_keys=True)
+        self.path.write_text(serialized, encoding="utf-8")
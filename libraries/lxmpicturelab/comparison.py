@@ -1,21 +1,242 @@
 import abc
+import contextlib
 import dataclasses
+import enum
 import json
 import logging
+import os
 import subprocess
+import tempfile
+import threading
+import time
 from pathlib import Path
+from typing import Callable
 from typing import ClassVar
 
+import numpy
+import OpenImageIO as oiio
+
 from lxmpicturelab.asset import ImageAsset
+from lxmpicturelab.cache import RenderCache
+from lxmpicturelab.cache import hash_file
+from lxmpicturelab.cache import hash_object
+from lxmpicturelab.encoding import ImageEncoding
+from lxmpicturelab.encoding import encode_imagebuf
+from lxmpicturelab.imagebufio import imagebuf_auto_mosaic
+from lxmpicturelab.imagebufio import imagebuf_export
+from lxmpicturelab.imagebufio import imagebuf_extend
+from lxmpicturelab.imagebufio import imagebuf_generate_expo_bands
+from lxmpicturelab.imagebufio import imagebuf_read
+from lxmpicturelab.imagebufio import imagebuf_resize
+from lxmpicturelab.imagebufio import imagebuf_text
 from lxmpicturelab.oiiotoolio import oiiotool_export
 from lxmpicturelab.oiiotoolio import oiiotool_export_auto_mosaic
+from lxmpicturelab.oiiotoolio import oiiotool_export_resized
 from lxmpicturelab.oiiotoolio import oiiotool_generate_expo_bands
 from lxmpicturelab.oiiotoolio import OIIOTOOL
+from lxmpicturelab.scanlineio import scanline_generate_expo_bands
+from lxmpicturelab.scanlineio import scanline_render_resized
+from lxmpicturelab.renderer import BakedOcioConfigRenderer
 from lxmpicturelab.renderer import OcioConfigRenderer
 
 LOGGER = logging.getLogger(__name__)
 
 
+def _no_measure(stage: str) -> contextlib.AbstractContextManager:
+    return contextlib.nullcontext()
+
+
+class RenderEngine(enum.Enum):
+    """
+    How the image processing operations of a generator are executed.
+    """
+
+    oiiotool = "oiiotool"
+    """
+    build a command and execute it in an oiiotool subprocess, for each image.
+    """
+
+    imagebuf = "imagebuf"
+    """
+    execute the operations in the current process with the OpenImageIO python bindings.
+    """
+
+    scanline = "scanline"
+    """
+    like imagebuf but stream the source image by strips of scanlines to bound
+    memory usage; generators that need the full image fall back to imagebuf.
+    """
+
+
+class SourceImageCache:
+    """
+    Decode source images once and share them across all the renderers using them.
+
+    The image is read and converted to the renderer's linear-sRGB working space
+    a single time; the returned buffers must be considered read-only.
+
+    When a ``shared_dir`` is set, the converted images are also written there as
+    uncompressed float exr, so other processes using the same directory read
+    them instead of decoding and converting the source again.
+
+    Args:
+        max_items: maximum number of decoded images to keep in memory.
+        shared_dir: optional filesystem path to an existing directory shared
+            with other processes.
+    """
+
+    def __init__(self, max_items: int = 2, shared_dir: Path | None = None):
+        self.max_items = max_items
+        self.shared_dir = shared_dir
+        self._images: dict[tuple, oiio.ImageBuf] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        src_path: Path,
+        renderer: OcioConfigRenderer,
+        measure: Callable[[str], contextlib.AbstractContextManager] = _no_measure,
+    ) -> oiio.ImageBuf:
+        """
+        Get the given source image converted to the renderer linear-sRGB colorspace.
+
+        Args:
+            src_path: filesystem path to an existing image file.
+            renderer: renderer defining the colorspace of the source.
+            measure: function returning a context manager wrapping each named
+                stage ("decode", "matrix"), used to time them.
+        """
+        key = (src_path, src_path.stat().st_mtime_ns, renderer.src_colorspace)
+        with self._lock:
+            if key in self._images:
+                # move as most recently used
+                self._images[key] = self._images.pop(key)
+                return self._images[key]
+
+            if self.shared_dir:
+                buf = self._get_shared(src_path, renderer, key, measure)
+            else:
+                buf = self._decode(src_path, renderer, measure)
+            self._images[key] = buf
+            while len(self._images) > self.max_items:
+                del self._images[next(iter(self._images))]
+            return buf
+
+    @staticmethod
+    def _decode(
+        src_path: Path,
+        renderer: OcioConfigRenderer,
+        measure: Callable[[str], contextlib.AbstractContextManager] = _no_measure,
+    ) -> oiio.ImageBuf:
+        LOGGER.debug(f"decoding source '{src_path}'")
+        with measure("decode"):
+            buf = imagebuf_read(src_path)
+        with measure("matrix"):
+            return renderer.convert_source_imagebuf(buf)
+
+    def _get_shared_name(self, src_path: Path) -> str:
+        return hash_object(str(src_path.absolute()))[:16]
+
+    def _get_shared(
+        self,
+        src_path: Path,
+        renderer: OcioConfigRenderer,
+        key: tuple,
+        measure: Callable[[str], contextlib.AbstractContextManager] = _no_measure,
+    ) -> oiio.ImageBuf:
+        name = f"{self._get_shared_name(src_path)}.{hash_object(key)[:16]}"
+        shared_path = self.shared_dir / f"{name}.exr"
+        lock_path = self.shared_dir / f"{name}.lock"
+        # the first process to create the lock file decode the source, the
+        # others wait for it to be written
+        while not shared_path.exists():
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                time.sleep(0.05)
+                continue
+            try:
+                if shared_path.exists():
+                    break
+                buf = self._decode(src_path, renderer, measure)
+                tmp_path = self.shared_dir / f"{name}.{os.getpid()}.tmp.exr"
+                imagebuf_export(buf, tmp_path, bitdepth="float", compression="none")
+                os.replace(tmp_path, shared_path)
+                return buf
+            finally:
+                lock_path.unlink(missing_ok=True)
+
+        LOGGER.debug(f"reading shared source '{shared_path}' of '{src_path}'")
+        return imagebuf_read(shared_path)
+
+    def remove_shared(self, src_path: Path):
+        """
+        Delete the converted images of the given source from the shared directory.
+        """
+        if not self.shared_dir:
+            return
+        for path in self.shared_dir.glob(f"{self._get_shared_name(src_path)}.*.exr"):
+            LOGGER.debug(f"unlink('{path}')")
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        """
+        Release all the decoded images.
+        """
+        with self._lock:
+            self._images.clear()
+
+
+SOURCE_IMAGES = SourceImageCache()
+"""
+Process-wide cache of decoded sources used by the imagebuf engine.
+"""
+
+
+def _get_image_size(image_path: Path) -> tuple[int, int]:
+    """
+    Get the width and height of the given image by only reading its header.
+
+    Returns (0, 0) if the image doesn't exist (yet).
+    """
+    if not image_path.exists():
+        return 0, 0
+    image_file = oiio.ImageInput.open(str(image_path))
+    if not image_file:
+        return 0, 0
+    spec = image_file.spec()
+    image_file.close()
+    return spec.width, spec.height
+
+
+def _get_pixel_count(image_path: Path) -> int:
+    """
+    Get the number of pixels of the given image by only reading its header.
+
+    Returns 0 if the image doesn't exist (yet).
+    """
+    width, height = _get_image_size(image_path)
+    return width * height
+
+
+def export_render(
+    buf: oiio.ImageBuf,
+    dst_path: Path,
+    encoding: ImageEncoding | None = None,
+):
+    """
+    Write a render generated in memory to disk.
+
+    Args:
+        buf: render to write
+        dst_path: filesystem path to a file that may exist.
+        encoding: how to encode the render, default to the format of ``dst_path``.
+    """
+    encoding = encoding or ImageEncoding.from_path(dst_path)
+    LOGGER.debug(f"encode_imagebuf({dst_path}, {encoding})")
+    encode_imagebuf(buf, target_path=dst_path, encoding=encoding)
+
+
 @dataclasses.dataclass
 class BaseGenerator(abc.ABC):
     """
@@ -26,13 +247,60 @@ class BaseGenerator(abc.ABC):
     description: ClassVar[str] = NotImplemented
 
     @abc.abstractmethod
+    def render(
+        self,
+        src_paths: list[Path],
+        dst_path: Path,
+        renderer: OcioConfigRenderer,
+        engine: RenderEngine = RenderEngine.oiiotool,
+        variant_paths: dict[int, Path] | None = None,
+    ) -> oiio.ImageBuf | None:
+        """
+        Generate the image, in memory when the engine allows it.
+
+        Args:
+            src_paths: filesystem path to the existing images to render.
+            dst_path: filesystem path to a file that may exist.
+            renderer: picture formation to apply on the sources.
+            engine: how to execute the image processing operations.
+            variant_paths: downscaled copies of the image to write, by height,
+                when the engine writes ``dst_path`` itself. Ignored when the
+                image is returned, the caller resizing it instead.
+
+        Returns:
+            the final image to write to ``dst_path``, or None if the engine
+            already wrote it (oiiotool subprocess, streaming).
+        """
+        pass
+
     def run(
         self,
         src_paths: list[Path],
         dst_path: Path,
         renderer: OcioConfigRenderer,
+        engine: RenderEngine = RenderEngine.oiiotool,
     ):
-        pass
+        """
+        Generate the image to ``dst_path``.
+        """
+        buf = self.render(src_paths, dst_path, renderer, engine=engine)
+        if buf is not None:
+            export_render(buf, dst_path)
+
+    def estimate_cost(self, src_paths: list[Path]) -> float:
+        """
+        Get the relative amount of work needed to run the generator on the given sources.
+
+        Only used to order renders so the most expensive start first; default to
+        the number of source pixels.
+        """
+        return float(sum(_get_pixel_count(path) for path in src_paths))
+
+    def get_variant_heights(self) -> list[int]:
+        """
+        Get the height of the downscaled copies to write next to the generated image.
+        """
+        return []
 
     def to_dict(self) -> dict:
         asdict = dataclasses.asdict(self)
@@ -71,8 +339,10 @@ class GeneratorExposureBands(BaseGenerator):
         command += [
             "--resize:filter=box",
             "0x864",
+            # the box filter extend the data window by 1 pixel
+            "--croptofull",
             "--cut",
-            "0,0,{TOP.width},{TOP.height+100}",
+            "{TOP.width}x{TOP.height+100}+0+0",
             "--text:x=40:y={TOP.height-45}:shadow=0:size=34:color=1,1,1,1:yalign=center",
             text_left,
             "--text:x={TOP.width-40}:y={TOP.height-45}:shadow=0:size=24:color=1,1,1,1:yalign=center:xalign=right",
@@ -80,24 +350,104 @@ class GeneratorExposureBands(BaseGenerator):
         ]
         command += oiiotool_export(
             target_path=dst_path,
-            # assume dst_path is .jpg
             bitdepth="uint8",
-            compression="jpeg:98",
+            compression=ImageEncoding.from_path(dst_path).get_compression(),
         )
         LOGGER.debug(f"subprocess.run({' '.join(command)})")
         subprocess.run(command)
 
-    def run(
+    def _render_imagebuf(
+        self,
+        src_path: Path,
+        renderer: OcioConfigRenderer,
+        text_left: str,
+        text_right: str,
+        streaming: bool = False,
+        measure: Callable[[str], contextlib.AbstractContextManager] = _no_measure,
+    ) -> oiio.ImageBuf:
+        """
+        Args:
+            measure: function returning a context manager wrapping each named
+                stage ("decode", "matrix", "bands", "display", "resize", "text"),
+                used to time them. "bands" include "display".
+        """
+        if streaming:
+            # only decode and convert the band section of the source
+            buf = scanline_generate_expo_bands(
+                src_path=src_path,
+                band_number=7,
+                band_exposure_offset=2,
+                band_width=0.2,
+                band_x_offset=self.band_offset,
+                strip_callback=renderer.convert_source_array,
+                bands_callback=renderer.display_array,
+            )
+        else:
+
+            def _display(bands: numpy.ndarray) -> numpy.ndarray:
+                with measure("display"):
+                    return renderer.display_array(bands)
+
+            buf = SOURCE_IMAGES.get(src_path, renderer, measure)
+            with measure("bands"):
+                buf = imagebuf_generate_expo_bands(
+                    src_buf=buf,
+                    band_number=7,
+                    band_exposure_offset=2,
+                    band_width=0.2,
+                    band_x_offset=self.band_offset,
+                    bands_callback=_display,
+                )
+        with measure("resize"):
+            buf = imagebuf_resize(buf, height=864)
+        with measure("text"):
+            buf = imagebuf_extend(buf, bottom=100)
+            width, height = buf.spec().width, buf.spec().height
+            imagebuf_text(buf, 40, height - 45, text_left, size=34, yalign="center")
+            imagebuf_text(
+                buf,
+                width - 40,
+                height - 45,
+                text_right,
+                size=24,
+                xalign="right",
+                yalign="center",
+            )
+        return buf
+
+    def get_texts(
+        self,
+        src_path: Path,
+        renderer: OcioConfigRenderer,
+    ) -> tuple[str, str]:
+        """
+        Get the legend written on the left and right of the footer.
+        """
+        look_str = f", look='{renderer.look}'" if renderer.look else ""
+        text_left = f"{src_path.stem} - {renderer.name}"
+        text_right = f"(display='{renderer.display}', view='{renderer.view}'{look_str})"
+        return text_left, text_right
+
+    def render(
         self,
         src_paths: list[Path],
         dst_path: Path,
         renderer: OcioConfigRenderer,
-    ):
+        engine: RenderEngine = RenderEngine.oiiotool,
+        variant_paths: dict[int, Path] | None = None,
+    ) -> oiio.ImageBuf | None:
         src_path = src_paths[0]
-        look_str = f", look='{renderer.look}'" if renderer.look else ""
+        text_left, text_right = self.get_texts(src_path, renderer)
+        if engine in (RenderEngine.imagebuf, RenderEngine.scanline):
+            return self._render_imagebuf(
+                src_path=src_path,
+                renderer=renderer,
+                text_left=text_left,
+                text_right=text_right,
+                streaming=engine == RenderEngine.scanline,
+            )
+
         ocio_command = renderer.to_oiiotool_command()
-        text_left = f"{src_path.stem} - {renderer.name}"
-        text_right = f"(display='{renderer.display}', view='{renderer.view}'{look_str})"
         self._run(
             src_path=src_path,
             dst_path=dst_path,
@@ -105,6 +455,7 @@ class GeneratorExposureBands(BaseGenerator):
             text_left=text_left,
             text_right=text_right,
         )
+        return None
 
 
 @dataclasses.dataclass
@@ -115,9 +466,23 @@ class GeneratorFull(BaseGenerator):
 
     max_height: int
 
+    # heights of downscaled copies of the render, resized from the same image
+    variant_heights: list[int] = dataclasses.field(default_factory=list)
+
     shortname: ClassVar[str] = "full"
     description: ClassVar[str] = "render the whole area of the image and resize it"
 
+    def __post_init__(self):
+        for height in self.variant_heights:
+            if height >= self.max_height:
+                raise ValueError(
+                    f"variant height {height} must be smaller than "
+                    f"max_height {self.max_height}"
+                )
+
+    def get_variant_heights(self) -> list[int]:
+        return list(self.variant_heights)
+
     def _run(
         self,
         src_path: Path,
@@ -125,6 +490,7 @@ class GeneratorFull(BaseGenerator):
         ocio_command: list[str],
         text_left: tuple[str, str],
         text_right: str,
+        variant_paths: dict[int, Path],
     ):
         command = [
             str(OIIOTOOL),
@@ -136,8 +502,10 @@ class GeneratorFull(BaseGenerator):
         command += [
             "--resize:filter=box",
             f"0x{self.max_height}",
+            # the box filter extend the data window by 1 pixel
+            "--croptofull",
             "--cut",
-            "0,0,{TOP.width},{TOP.height+100}",
+            "{TOP.width}x{TOP.height+100}+0+0",
             "--text:x=40:y={TOP.height-47}:shadow=0:size=34:color=1,1,1,1:yalign=bottom",
             text_left[0],
             "--text:x=40:y={TOP.height-42}:shadow=0:size=24:color=1,1,1,1:yalign=top",
@@ -145,60 +513,187 @@ class GeneratorFull(BaseGenerator):
             "--text:x={TOP.width-40}:y={TOP.height-45}:shadow=0:size=34:color=1,1,1,1:yalign=center:xalign=right",
             text_right,
         ]
+        compression = ImageEncoding.from_path(dst_path).get_compression()
         command += oiiotool_export(
             target_path=dst_path,
-            # assume dst_path is .jpg
             bitdepth="uint8",
-            compression="jpeg:98",
+            compression=compression,
         )
+        for height, variant_path in variant_paths.items():
+            command += oiiotool_export_resized(
+                target_path=variant_path,
+                height=height,
+                bitdepth="uint8",
+                compression=compression,
+            )
         LOGGER.debug(f"subprocess.run({' '.join(command)})")
         subprocess.run(command)
 
-    def run(
+    def _render_imagebuf(
         self,
-        src_paths: list[Path],
-        dst_path: Path,
+        src_path: Path,
         renderer: OcioConfigRenderer,
-    ):
-        src_path = src_paths[0]
+        text_left: tuple[str, str],
+        text_right: str,
+        measure: Callable[[str], contextlib.AbstractContextManager] = _no_measure,
+    ) -> oiio.ImageBuf:
+        """
+        Args:
+            measure: function returning a context manager wrapping each named
+                stage ("decode", "matrix", "display", "resize", "text"), used
+                to time them.
+        """
+        buf = SOURCE_IMAGES.get(src_path, renderer, measure)
+        with measure("display"):
+            buf = renderer.display_imagebuf(buf)
+        with measure("resize"):
+            buf = oiio.ImageBufAlgo.channels(buf, ("R", "G", "B"))
+            buf = imagebuf_resize(buf, height=self.max_height)
+        with measure("text"):
+            buf = imagebuf_extend(buf, bottom=100)
+            width, height = buf.spec().width, buf.spec().height
+            imagebuf_text(buf, 40, height - 47, text_left[0], size=34, yalign="bottom")
+            imagebuf_text(buf, 40, height - 42, text_left[1], size=24, yalign="top")
+            imagebuf_text(
+                buf,
+                width - 40,
+                height - 45,
+                text_right,
+                size=34,
+                xalign="right",
+                yalign="center",
+            )
+        return buf
+
+    def get_texts(
+        self,
+        src_path: Path,
+        renderer: OcioConfigRenderer,
+    ) -> tuple[tuple[str, str], str]:
+        """
+        Get the legend written on the left (2 lines) and right of the footer.
+        """
         look_str = f", look='{renderer.look}'" if renderer.look else ""
-        ocio_command = renderer.to_oiiotool_command()
         text_left = (
             f"{renderer.name}",
             f"(display='{renderer.display}', view='{renderer.view}'{look_str})",
         )
         text_right = f"{src_path.stem}"
+        return text_left, text_right
+
+    def _run_scanline(
+        self,
+        src_path: Path,
+        dst_path: Path,
+        renderer: OcioConfigRenderer,
+        text_left: tuple[str, str],
+        text_right: str,
+        variant_paths: dict[int, Path],
+    ):
+        footer_height = 100
+
+        def _draw_footer(buf: oiio.ImageBuf):
+            width = buf.spec().width
+            imagebuf_text(
+                buf, 40, footer_height - 47, text_left[0], 34, yalign="bottom"
+            )
+            imagebuf_text(buf, 40, footer_height - 42, text_left[1], 24, yalign="top")
+            imagebuf_text(
+                buf,
+                width - 40,
+                footer_height - 45,
+                text_right,
+                size=34,
+                xalign="right",
+                yalign="center",
+            )
+
+        LOGGER.debug(f"scanline_render_resized({src_path}, {dst_path})")
+        scanline_render_resized(
+            src_path=src_path,
+            dst_path=dst_path,
+            height=self.max_height,
+            bitdepth="uint8",
+            compression=ImageEncoding.from_path(dst_path).get_compression(),
+            strip_callback=renderer.apply_array,
+            footer_height=footer_height,
+            footer_callback=_draw_footer,
+            variant_paths=variant_paths,
+        )
+
+    def render(
+        self,
+        src_paths: list[Path],
+        dst_path: Path,
+        renderer: OcioConfigRenderer,
+        engine: RenderEngine = RenderEngine.oiiotool,
+        variant_paths: dict[int, Path] | None = None,
+    ) -> oiio.ImageBuf | None:
+        src_path = src_paths[0]
+        text_left, text_right = self.get_texts(src_path, renderer)
+        if engine == RenderEngine.scanline:
+            # streamed to disk so never fully in memory
+            self._run_scanline(
+                src_path=src_path,
+                dst_path=dst_path,
+                renderer=renderer,
+                text_left=text_left,
+                text_right=text_right,
+                variant_paths=variant_paths or {},
+            )
+            return None
+
+        if engine == RenderEngine.imagebuf:
+            return self._render_imagebuf(
+                src_path=src_path,
+                renderer=renderer,
+                text_left=text_left,
+                text_right=text_right,
+            )
+
+        ocio_command = renderer.to_oiiotool_command()
         self._run(
             src_path=src_path,
             dst_path=dst_path,
             ocio_command=ocio_command,
             text_left=text_left,
             text_right=text_right,
+            variant_paths=variant_paths or {},
         )
-        return dst_path
+        return None
 
 
 @dataclasses.dataclass
 class GeneratorCombined(BaseGenerator):
     """
-    A method of generating an image with oiiotool.
+    Combine the images generated for each renderer in a single mosaic.
     """
 
+    # shortname of the generator that produced the images to combine
+    source_generator: str = ""
+
     shortname: ClassVar[str] = "__combined__"
     description: ClassVar[str] = ""
 
-    def run(
+    def render(
         self,
         src_paths: list[Path],
         dst_path: Path,
         renderer: OcioConfigRenderer | None = None,
-    ):
+        engine: RenderEngine = RenderEngine.oiiotool,
+        variant_paths: dict[int, Path] | None = None,
+    ) -> oiio.ImageBuf | None:
+        if engine in (RenderEngine.imagebuf, RenderEngine.scanline):
+            return imagebuf_auto_mosaic([imagebuf_read(path) for path in src_paths])
+
         command = oiiotool_export_auto_mosaic(
             image_paths=src_paths,
             dst_path=dst_path,
+            compression=ImageEncoding.from_path(dst_path).get_compression(),
         )
         LOGGER.debug(f"subprocess.run({command})")
         subprocess.run(command)
+        return None
 
 
 for subclass in BaseGenerator.__subclasses__():
@@ -221,18 +716,244 @@ class ComparisonRender:
     src_paths: list[Path]
     dst_path: Path
 
-    def run(self):
-        self.generator.run(self.src_paths, self.dst_path, self.renderer)
+    # how to encode the render, default to the format of dst_path
+    encoding: ImageEncoding | None = None
+
+    def __post_init__(self):
+        encoding = self.get_encoding()
+        if encoding.format != ImageEncoding.from_path(self.dst_path).format:
+            raise ValueError(
+                f"encoding format '{encoding.format.value}' doesn't match "
+                f"'{self.dst_path.name}'"
+            )
+
+    def get_encoding(self) -> ImageEncoding:
+        """
+        Get how the render and its variants are encoded to disk.
+        """
+        return self.encoding or ImageEncoding.from_path(self.dst_path)
+
+    def estimate_cost(self) -> float:
+        """
+        Get the relative amount of work needed to generate this render.
+        """
+        return self.generator.estimate_cost(self.src_paths)
+
+    def get_variant_paths(self) -> dict[int, Path]:
+        """
+        Get the filesystem path of the downscaled copies of the render, by height.
+        """
+        return {
+            height: self.dst_path.with_stem(f"{self.dst_path.stem}.{height}")
+            for height in self.generator.get_variant_heights()
+        }
+
+    def get_output_paths(self) -> list[Path]:
+        """
+        Get the filesystem path of all the files the render produces.
+        """
+        return [self.dst_path] + list(self.get_variant_paths().values())
+
+    def get_srcset(self) -> list[tuple[Path, int]]:
+        """
+        Get the render and its variants with their width, from the smallest,
+        as expected by the html ``srcset`` attribute.
+
+        The files must have been generated.
+        """
+        srcset = [(path, _get_image_size(path)[0]) for path in self.get_output_paths()]
+        return sorted(srcset, key=lambda item: item[1])
+
+    def get_cache_key(self, engine: RenderEngine = RenderEngine.oiiotool) -> str:
+        """
+        Get a hash that uniquely identify the image this render produces.
+
+        It is built from the content of the source images, the renderer and its
+        OCIO resources, the generator parameters and the OpenImageIO version.
+        """
+        renderer = None
+        if self.renderer:
+            renderer = {
+                "config": self.renderer.to_dict(),
+                "resources": [
+                    (path.name, hash_file(path))
+                    for path in self.renderer.get_resource_paths()
+                ],
+            }
+        key = {
+            "sources": [hash_file(path) for path in self.src_paths],
+            "renderer": renderer,
+            "generator": (self.generator.shortname, self.generator.to_dict()),
+            "oiio": oiio.VERSION_STRING,
+            "engine": engine.value,
+            "encoding": self.get_encoding().to_dict(),
+        }
+        return hash_object(key)
+
+    def run(
+        self,
+        engine: RenderEngine = RenderEngine.oiiotool,
+        cache: RenderCache | None = None,
+    ):
+        """
+        Generate the render to disk.
+
+        Args:
+            engine: how to execute the image processing operations.
+            cache: optional cache to reuse a previous identical render from.
+        """
+        if cache and self.fetch_cache(cache, engine):
+            return
+
+        pixels = self.generate(engine=engine)
+        if pixels is not None:
+            self.write(pixels)
+
+        if cache:
+            self.store_cache(cache, engine)
+
+    def fetch_cache(
+        self,
+        cache: RenderCache,
+        engine: RenderEngine = RenderEngine.oiiotool,
+    ) -> bool:
+        """
+        Copy a previous identical render from the cache to disk.
+
+        Returns:
+            True if the render was found in the cache.
+        """
+        cache_key = self.get_cache_key(engine)
+        if cache.fetch(cache_key, self.get_output_paths()):
+            LOGGER.debug(f"reused cached render '{cache_key}' for '{self.dst_path}'")
+            return True
+        return False
+
+    def store_cache(
+        self,
+        cache: RenderCache,
+        engine: RenderEngine = RenderEngine.oiiotool,
+        evict: bool = True,
+    ) -> int:
+        """
+        Add the render written on disk to the cache.
+
+        Args:
+            cache: cache to store the render in.
+            engine: engine the render was generated with.
+            evict: see :meth:`RenderCache.store`
+
+        Returns:
+            size in bytes of the stored files.
+        """
+        return cache.store(
+            self.get_cache_key(engine), self.get_output_paths(), evict=evict
+        )
+
+    def generate(
+        self,
+        engine: RenderEngine = RenderEngine.oiiotool,
+    ) -> numpy.ndarray | None:
+        """
+        Generate the render in memory when the engine allows it, else to disk.
+
+        Returns:
+            the uint8 pixels of the render to give to :meth:`write` or :meth:`encode`,
+            or None if the render was already written to disk.
+        """
+        encoding = self.get_encoding()
+        if encoding == ImageEncoding.from_path(self.dst_path):
+            buf = self.generator.render(
+                self.src_paths,
+                self.dst_path,
+                self.renderer,
+                engine=engine,
+                variant_paths=self.get_variant_paths(),
+            )
+            if buf is None:
+                return None
+            return buf.get_pixels(oiio.UINT8)
+
+        # engines writing to disk only know the default encoding of a format,
+        # so they write a lossless intermediate that is encoded like in-memory renders.
+        with tempfile.TemporaryDirectory(
+            prefix=".render-", dir=self.dst_path.parent
+        ) as tmp_dir:
+            render_path = Path(tmp_dir, self.dst_path.stem).with_suffix(".png")
+            buf = self.generator.render(
+                self.src_paths, render_path, self.renderer, engine=engine
+            )
+            if buf is None:
+                buf = imagebuf_read(render_path)
+        return buf.get_pixels(oiio.UINT8)
+
+    def _export(
+        self,
+        pixels: numpy.ndarray,
+        dst_path: Path,
+        variant_paths: dict[int, Path],
+    ):
+        buf = oiio.ImageBuf(pixels)
+        encoding = self.get_encoding()
+        export_render(buf, dst_path, encoding)
+        pixel_count = buf.spec().width * buf.spec().height
+        for height, variant_path in variant_paths.items():
+            variant = imagebuf_resize(buf, height=height)
+            ratio = variant.spec().width * variant.spec().height / pixel_count
+            export_render(variant, variant_path, encoding.scaled(ratio))
+
+    def write(self, pixels: numpy.ndarray):
+        """
+        Encode the pixels obtained from :meth:`generate` to disk, with its variants.
+        """
+        self._export(pixels, self.dst_path, self.get_variant_paths())
+
+    def encode(self, pixels: numpy.ndarray) -> dict[Path, bytes]:
+        """
+        Encode the pixels obtained from :meth:`generate`, with its variants,
+        without writing them to their final path yet.
+
+        The quality search of targeted encodings is the expensive part of
+        writing a render, so this allows to do it where the pixels were
+        generated, leaving only the file writing to :meth:`write_encoded`.
+
+        Returns:
+            the content of each file the render produces, by filesystem path.
+        """
+        with tempfile.TemporaryDirectory(
+            prefix=".encode-", dir=self.dst_path.parent
+        ) as tmp_dir:
+            tmp_paths = {
+                path: Path(tmp_dir, path.name) for path in self.get_output_paths()
+            }
+            self._export(
+                pixels,
+                tmp_paths[self.dst_path],
+                {
+                    height: tmp_paths[path]
+                    for height, path in self.get_variant_paths().items()
+                },
+            )
+            return {path: tmp_path.read_bytes() for path, tmp_path in tmp_paths.items()}
+
+    def write_encoded(self, files: dict[Path, bytes]):
+        """
+        Write the files obtained from :meth:`encode` to disk.
+        """
+        for path, content in files.items():
+            LOGGER.debug(f"writing '{path}'")
+            path.write_bytes(content)
 
     def to_dict(self) -> dict:
         asdict = {
             "dst_path": str(self.dst_path),
             "src_paths": [str(path) for path in self.src_paths],
-            "renderer": self.renderer.to_dict(),
+            "renderer": self.renderer.to_dict() if self.renderer else None,
             "generator": (
                 self.generator.shortname,
                 self.generator.to_dict(),
             ),
+            "encoding": self.encoding.to_dict() if self.encoding else None,
         }
         return asdict
 
@@ -240,14 +961,22 @@ class ComparisonRender:
     def from_dict(cls, as_dict: dict) -> "ComparisonRender":
         generator = _GENERATORS_BY_SHORTNAME[as_dict["generator"][0]]
         generator = generator.from_dict(as_dict["generator"][1])
-        renderer = OcioConfigRenderer.from_dict(as_dict["renderer"])
+        renderer = None
+        if as_dict["renderer"] and "lut_path" in as_dict["renderer"]:
+            renderer = BakedOcioConfigRenderer.from_dict(as_dict["renderer"])
+        elif as_dict["renderer"]:
+            renderer = OcioConfigRenderer.from_dict(as_dict["renderer"])
         src_paths = [Path(path) for path in as_dict["src_paths"]]
         dst_path = Path(as_dict["dst_path"])
+        encoding = None
+        if as_dict.get("encoding"):
+            encoding = ImageEncoding.from_dict(as_dict["encoding"])
         return cls(
             generator=generator,
             renderer=renderer,
             src_paths=src_paths,
             dst_path=dst_path,
+            encoding=encoding,
         )
 
 
@@ -1,12 +1,25 @@
+import hashlib
 import http.client
 import logging
+import shutil
+import tempfile
+import threading
 import urllib.parse
 import urllib.request
 import zipfile
 from pathlib import Path
+from typing import Callable
 
 LOGGER = logging.getLogger(__name__)
 
+DOWNLOAD_CACHE_DIR = Path.home() / ".cache" / "lxmpicturelab" / "downloads"
+"""
+Machine-wide directory where downloaded files are stored to be reused.
+"""
+
+_KEY_LOCKS: dict[str, threading.Lock] = {}
+_KEY_LOCKS_LOCK = threading.Lock()
+
 
 def extract_zip(zip_path: Path, remove_zip: bool = True):
     """
@@ -55,3 +68,125 @@ def download_file_advanced(url: str, dst_path: Path, params: dict, headers: dict
             f"Failed to download {response.status}: {response.reason}"
         )
     connection.close()
+
+
+def _get_key_lock(key: str) -> threading.Lock:
+    with _KEY_LOCKS_LOCK:
+        return _KEY_LOCKS.setdefault(key, threading.Lock())
+
+
+def _move_to_cache(src_path: Path, dst_path: Path):
+    """
+    Atomically move the given file or directory in the cache, unless another
+    process already did it.
+    """
+    try:
+        src_path.rename(dst_path)
+    except OSError:
+        if not dst_path.exists():
+            raise
+        LOGGER.debug(f"'{dst_path}' was concurrently created")
+
+
+def get_cached_download(
+    url: str,
+    extract: bool = False,
+    downloader: Callable[[str, Path], None] = download_file,
+    cache_key: str | None = None,
+    cache_dir: Path = DOWNLOAD_CACHE_DIR,
+) -> Path:
+    """
+    Download the given URL only if it was not already downloaded before.
+
+    Safe to call concurrently from multiple threads or processes: each URL is
+    fetched and extracted once.
+
+    Args:
+        url: web URL to download.
+        extract: True if the file is a zip archive to extract.
+        downloader: function downloading an url to a local file path.
+        cache_key: optional identifier of the download to use instead of the url,
+            when the url is not enough to identify the downloaded content.
+        cache_dir: filesystem path to a directory that may not exist.
+
+    Returns:
+        filesystem path to the downloaded file, or the directory with the
+        archive content if ``extract`` is True. Must be considered read-only.
+    """
+    key = hashlib.sha256((cache_key or url).encode("utf-8")).hexdigest()
+    entry_dir = cache_dir / key
+    file_path = entry_dir / "file"
+    extract_dir = entry_dir / "extracted"
+
+    with _get_key_lock(key):
+        if not entry_dir.exists():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir))
+            try:
+                downloader(url, tmp_dir / file_path.name)
+                _move_to_cache(tmp_dir, entry_dir)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            LOGGER.debug(f"found cached download for '{url}'")
+
+        if extract and not extract_dir.exists():
+            tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=entry_dir))
+            try:
+                LOGGER.debug(f"unzipping '{file_path}'")
+                with zipfile.ZipFile(file_path, "r") as zip_file:
+                    zip_file.extractall(tmp_dir)
+                _move_to_cache(tmp_dir, extract_dir)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return extract_dir if extract else file_path
+
+
+def download_file_cached(
+    url: str,
+    dst_path: Path,
+    downloader: Callable[[str, Path], None] = download_file,
+    cache_key: str | None = None,
+):
+    """
+    Download a file from a web URL to the given local path, using the download cache.
+
+    Args:
+        url: web URL to download.
+        dst_path: filesystem path to a file that may exist.
+        downloader: function downloading an url to a local file path.
+        cache_key: see :func:`get_cached_download`
+    """
+    cached_path = get_cached_download(url, downloader=downloader, cache_key=cache_key)
+    LOGGER.debug(f"copying '{url}' to '{dst_path}'")
+    shutil.copy(cached_path, dst_path)
+
+
+def download_zip(
+    url: str,
+    dst_dir: Path,
+    subdir: str | None = None,
+    downloader: Callable[[str, Path], None] = download_file,
+    cache_key: str | None = None,
+):
+    """
+    Download and extract a zip archive to the given directory, using the download cache.
+
+    Args:
+        url: web URL of a zip archive.
+        dst_dir: filesystem path to a directory that may exist.
+        subdir: optional relative path of a directory in the archive to only extract.
+        downloader: function downloading an url to a local file path.
+        cache_key: see :func:`get_cached_download`
+    """
+    extract_dir = get_cached_download(
+        url,
+        extract=True,
+        downloader=downloader,
+        cache_key=cache_key,
+    )
+    if subdir:
+        extract_dir = extract_dir / subdir
+    LOGGER.debug(f"copying '{extract_dir}' to '{dst_dir}'")
+    shutil.copytree(extract_dir, dst_dir, dirs_exist_ok=True)
@@ -0,0 +1,308 @@
+import dataclasses
+import enum
+import functools
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy
+import OpenImageIO as oiio
+
+from lxmpicturelab.imagebufio import imagebuf_export
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ImageFormat(enum.Enum):
+    """
+    Image file formats renders can be encoded to.
+    """
+
+    jpeg = "jpeg"
+    webp = "webp"
+    avif = "avif"
+    png = "png"
+
+    @property
+    def suffix(self) -> str:
+        """
+        File extension with the leading dot, as written on disk.
+        """
+        return _SUFFIXES[self][0]
+
+    @property
+    def plugin(self) -> str:
+        """
+        Name of the OpenImageIO plugin that write the format.
+        """
+        # avif is written by the libheif plugin
+        return "heif" if self == ImageFormat.avif else self.value
+
+    @property
+    def lossless(self) -> bool:
+        return self == ImageFormat.png
+
+    @property
+    def default_quality(self) -> int | None:
+        return _DEFAULT_QUALITIES.get(self)
+
+    def is_supported(self) -> bool:
+        """
+        Return True if the OpenImageIO build can write this format.
+        """
+        return self in get_supported_formats()
+
+    @classmethod
+    def from_path(cls, path: Path) -> "ImageFormat":
+        """
+        Raises:
+            ValueError: if the file extension doesn't match any format.
+        """
+        suffix = path.suffix.lower()
+        for image_format, suffixes in _SUFFIXES.items():
+            if suffix in suffixes:
+                return image_format
+        raise ValueError(f"Unsupported image format '{path.suffix}' for '{path}'")
+
+
+_SUFFIXES = {
+    ImageFormat.jpeg: (".jpg", ".jpeg"),
+    ImageFormat.webp: (".webp",),
+    ImageFormat.avif: (".avif",),
+    ImageFormat.png: (".png",),
+}
+
+_DEFAULT_QUALITIES = {
+    ImageFormat.jpeg: 98,
+    ImageFormat.webp: 90,
+    ImageFormat.avif: 80,
+}
+
+
+@functools.cache
+def get_supported_formats() -> list[ImageFormat]:
+    """
+    Get the image formats the current OpenImageIO build can write.
+    """
+    # "plugin:ext1,ext2;plugin2:ext3"
+    extension_list = oiio.get_string_attribute("extension_list")
+    plugins = {entry.split(":")[0] for entry in extension_list.split(";")}
+    return [
+        image_format for image_format in ImageFormat if image_format.plugin in plugins
+    ]
+
+
+@dataclasses.dataclass(frozen=True)
+class ImageEncoding:
+    """
+    How to encode a render to an image file.
+
+    The quality is either fixed, or automatically picked to reach a target
+    file size or a target perceptual similarity with the unencoded image.
+    """
+
+    format: ImageFormat = ImageFormat.jpeg
+
+    quality: int | None = None
+    """
+    1-100 compression quality, default to the format's default quality.
+    """
+
+    target_size: int | None = None
+    """
+    maximum size of the file in bytes; the highest quality that fits is used.
+    """
+
+    target_ssim: float | None = None
+    """
+    minimum structural similarity (0-1) with the unencoded image;
+    the lowest quality that reaches it is used.
+    """
+
+    def __post_init__(self):
+        targets = [self.quality, self.target_size, self.target_ssim]
+        if sum(target is not None for target in targets) > 1:
+            raise ValueError(
+                "only one of quality, target_size or target_ssim can be specified"
+            )
+        if self.quality is not None and not 1 <= self.quality <= 100:
+            raise ValueError(f"quality must be in 1-100 range, got {self.quality}")
+        if self.target_ssim is not None and not 0 < self.target_ssim <= 1:
+            raise ValueError(
+                f"target_ssim must be in 0-1 range, got {self.target_ssim}"
+            )
+
+    @property
+    def is_targeted(self) -> bool:
+        """
+        True if the quality must be searched by encoding multiple times.
+        """
+        if self.format.lossless:
+            return False
+        return self.target_size is not None or self.target_ssim is not None
+
+    def get_compression(self, quality: int | None = None) -> str | None:
+        """
+        Get the value of the OpenImageIO "compression" attribute.
+
+        Args:
+            quality: override the encoding quality.
+        """
+        if self.format.lossless:
+            return None
+        quality = quality or self.quality or self.format.default_quality
+        return f"{self.format.value}:{quality}"
+
+    def scaled(self, ratio: float) -> "ImageEncoding":
+        """
+        Get the encoding to use for an image with ``ratio`` times the pixels.
+
+        Only the target size is affected.
+        """
+        if self.target_size is None:
+            return self
+        return dataclasses.replace(self, target_size=int(self.target_size * ratio))
+
+    def to_dict(self) -> dict:
+        asdict = dataclasses.asdict(self)
+        asdict["format"] = self.format.value
+        return asdict
+
+    @classmethod
+    def from_dict(cls, as_dict: dict) -> "ImageEncoding":
+        as_dict = dict(as_dict)
+        as_dict["format"] = ImageFormat(as_dict["format"])
+        return cls(**as_dict)
+
+    @classmethod
+    def from_path(cls, path: Path) -> "ImageEncoding":
+        """
+        Get the default encoding for the format of the given file.
+        """
+        return cls(format=ImageFormat.from_path(path))
+
+
+def _get_luma(pixels: numpy.ndarray) -> numpy.ndarray:
+    weights = numpy.array([0.2126, 0.7152, 0.0722], dtype=numpy.float64)
+    return pixels[..., :3] @ weights
+
+
+def _box_mean(array: numpy.ndarray, window: int) -> numpy.ndarray:
+    # mean of all the ``window`` x ``window`` blocks, from an integral image
+    integral = numpy.zeros((array.shape[0] + 1, array.shape[1] + 1))
+    integral[1:, 1:] = array.cumsum(axis=0).cumsum(axis=1)
+    total = (
+        integral[window:, window:]
+        - integral[:-window, window:]
+        - integral[window:, :-window]
+        + integral[:-window, :-window]
+    )
+    return total / (window * window)
+
+
+def compute_ssim(
+    pixels_a: numpy.ndarray,
+    pixels_b: numpy.ndarray,
+    window: int = 8,
+) -> float:
+    """
+    Get the mean structural similarity between the luma of 2 images.
+
+    Args:
+        pixels_a: array of shape (height, width, channels) in 0-1 range
+        pixels_b: array of the same shape
+        window: size in pixels of the square windows statistics are computed on.
+
+    Returns:
+        similarity in 0-1 range, 1 means identical.
+    """
+    luma_a = _get_luma(pixels_a)
+    luma_b = _get_luma(pixels_b)
+    window = min(window, *luma_a.shape)
+    mean_a = _box_mean(luma_a, window)
+    mean_b = _box_mean(luma_b, window)
+    var_a = _box_mean(luma_a * luma_a, window) - mean_a * mean_a
+    var_b = _box_mean(luma_b * luma_b, window) - mean_b * mean_b
+    covariance = _box_mean(luma_a * luma_b, window) - mean_a * mean_b
+    c1 = 0.01**2
+    c2 = 0.03**2
+    ssim = ((2 * mean_a * mean_b + c1) * (2 * covariance + c2)) / (
+        (mean_a * mean_a + mean_b * mean_b + c1) * (var_a + var_b + c2)
+    )
+    return float(ssim.mean())
+
+
+def _write(buf: oiio.ImageBuf, target_path: Path, compression: str | None):
+    imagebuf_export(
+        buf, target_path=target_path, bitdepth="uint8", compression=compression
+    )
+
+
+def encode_imagebuf(
+    buf: oiio.ImageBuf,
+    target_path: Path,
+    encoding: ImageEncoding,
+) -> int | None:
+    """
+    Write the given image to disk with the given encoding.
+
+    For targeted encodings, the quality is found with a binary search, encoding
+    each candidate in a temporary directory next to ``target_path``.
+
+    Args:
+        buf: image to write, in 0-1 range.
+        target_path: filesystem path to a file that may exist.
+        encoding: how to encode the image; its format must match the target suffix.
+
+    Returns:
+        the quality the image was encoded with, None for lossless formats.
+    """
+    if not encoding.is_targeted:
+        _write(buf, target_path, encoding.get_compression())
+        if encoding.format.lossless:
+            return None
+        return encoding.quality or encoding.format.default_quality
+
+    reference = None
+    if encoding.target_ssim is not None:
+        reference = buf.get_pixels(oiio.FLOAT)
+
+    with tempfile.TemporaryDirectory(prefix=".encode-", dir=target_path.parent) as tmp:
+        candidates: dict[int, Path] = {}
+
+        def _is_acceptable(quality: int) -> bool:
+            path = Path(tmp, f"{quality}{target_path.suffix}")
+            _write(buf, path, encoding.get_compression(quality))
+            candidates[quality] = path
+            if encoding.target_size is not None:
+                return path.stat().st_size <= encoding.target_size
+            encoded = oiio.ImageBuf(str(path)).get_pixels(oiio.FLOAT)
+            return compute_ssim(reference, encoded) >= encoding.target_ssim
+
+        # size decrease with quality while similarity increase with it
+        highest = encoding.target_size is not None
+        best = None
+        low, high = 1, 100
+        while low <= high:
+            quality = (low + high) // 2
+            acceptable = _is_acceptable(quality)
+            if acceptable:
+                best = quality
+            if acceptable == highest:
+                low = quality + 1
+            else:
+                high = quality - 1
+
+        if best is None:
+            best = 1 if highest else 100
+            LOGGER.warning(
+                f"cannot reach {encoding} for '{target_path}'; using quality {best}"
+            )
+            if best not in candidates:
+                _is_acceptable(best)
+
+        LOGGER.debug(f"encoded '{target_path}' with quality {best}")
+        os.replace(candidates[best], target_path)
+
+    return best
@@ -0,0 +1,277 @@
+import logging
+import math
+from pathlib import Path
+from typing import Callable
+
+import numpy
+import OpenImageIO as oiio
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _check_imagebuf(buf: oiio.ImageBuf) -> oiio.ImageBuf:
+    """
+    Raise if the given ImageBuf has errors else return it.
+    """
+    if buf.has_error:
+        raise RuntimeError(f"(OIIO) ImageBuf has errors: {buf.geterror()}")
+    return buf
+
+
+def imagebuf_read(src_path: Path) -> oiio.ImageBuf:
+    """
+    Read the given image file fully in memory as 32bit float.
+
+    Args:
+        src_path: filesystem path to an existing image file.
+
+    Returns:
+        a new ImageBuf instance.
+    """
+    buf = oiio.ImageBuf(str(src_path))
+    # convert to float internally else we will have clamped data after operations !
+    buf.read(force=True, convert=oiio.FLOAT)
+    return _check_imagebuf(buf)
+
+
+def imagebuf_export(
+    buf: oiio.ImageBuf,
+    target_path: Path,
+    bitdepth: str,
+    compression: str = None,
+    srgb_encoded: bool = False,
+):
+    """
+    Write the given image to disk.
+
+    Mirror of :func:`lxmpicturelab.oiiotoolio.oiiotool_export`.
+
+    Args:
+        buf: image to write
+        target_path: filesystem path to a file that may exist.
+        bitdepth: depends on the image format
+        compression: depends on the image format
+        srgb_encoded: True to apply the sRGB transfer-function.
+    """
+    if srgb_encoded:
+        buf = oiio.ImageBufAlgo.colorconvert(buf, "linear", "sRGB")
+        _check_imagebuf(buf)
+    if compression:
+        buf.specmod().attribute("compression", compression)
+    if not buf.write(str(target_path), bitdepth):
+        raise RuntimeError(f"(OIIO) cannot write '{target_path}': {buf.geterror()}")
+
+
+def imagebuf_colormatrix(buf: oiio.ImageBuf, matrix: list[float]) -> oiio.ImageBuf:
+    """
+    Apply a 3x3 color matrix on the RGB channels of the given image.
+
+    Args:
+        buf: image to process
+        matrix: 3x3 matrix as a flat list of 9 numbers, in row-major order.
+
+    Returns:
+        a new ImageBuf instance.
+    """
+    matrix = numpy.array(matrix, dtype=numpy.float32).reshape(3, 3)
+    matrix44 = numpy.identity(4, dtype=numpy.float32)
+    matrix44[:3, :3] = matrix
+    # OIIO need it transposed and as a flat list
+    matrix44 = numpy.transpose(matrix44).flatten().tolist()
+    return _check_imagebuf(oiio.ImageBufAlgo.colormatrixtransform(buf, matrix44))
+
+
+def imagebuf_resize(buf: oiio.ImageBuf, height: int) -> oiio.ImageBuf:
+    """
+    Resize the image to the given height, preserving its aspect ratio.
+
+    Equivalent of oiiotool ``--resize:filter=box 0x{height}``.
+    """
+    spec = buf.spec()
+    width = int(height * spec.width / spec.height + 0.5)
+    roi = oiio.ROI(0, width, 0, height, 0, 1, 0, spec.nchannels)
+    return _check_imagebuf(oiio.ImageBufAlgo.resize(buf, filtername="box", roi=roi))
+
+
+def imagebuf_extend(buf: oiio.ImageBuf, bottom: int) -> oiio.ImageBuf:
+    """
+    Add the given amount of black pixels at the bottom of the image.
+    """
+    spec = buf.spec()
+    roi = oiio.ROI(0, spec.width, 0, spec.height + bottom, 0, 1, 0, spec.nchannels)
+    return _check_imagebuf(oiio.ImageBufAlgo.cut(buf, roi=roi))
+
+
+def imagebuf_text(
+    buf: oiio.ImageBuf,
+    x: int,
+    y: int,
+    text: str,
+    size: int,
+    shadow: int = 0,
+    xalign: str = "left",
+    yalign: str = "baseline",
+    color: tuple[float, ...] = (1.0, 1.0, 1.0, 1.0),
+):
+    """
+    Render the given text on the image, in-place.
+
+    Equivalent of oiiotool ``--text``.
+    """
+    oiio.ImageBufAlgo.render_text(
+        buf,
+        int(x),
+        int(y),
+        text,
+        fontsize=size,
+        textcolor=color,
+        alignx=xalign,
+        aligny=yalign,
+        shadow=shadow,
+    )
+    _check_imagebuf(buf)
+
+
+def imagebuf_mosaic(
+    bufs: list[oiio.ImageBuf],
+    columns: int,
+    rows: int,
+) -> oiio.ImageBuf:
+    """
+    Combine the given images to a grid, from top-left to bottom-right.
+
+    Equivalent of oiiotool ``--mosaic``.
+    """
+    cell_width = max(buf.spec().width for buf in bufs)
+    cell_height = max(buf.spec().height for buf in bufs)
+    nchannels = max(buf.spec().nchannels for buf in bufs)
+    spec = oiio.ImageSpec(
+        cell_width * columns,
+        cell_height * rows,
+        nchannels,
+        oiio.FLOAT,
+    )
+    mosaic = oiio.ImageBuf(spec)
+    for index, buf in enumerate(bufs):
+        row, column = divmod(index, columns)
+        oiio.ImageBufAlgo.paste(
+            mosaic,
+            column * cell_width,
+            row * cell_height,
+            0,
+            0,
+            buf,
+        )
+    return _check_imagebuf(mosaic)
+
+
+def imagebuf_auto_mosaic(bufs: list[oiio.ImageBuf]) -> oiio.ImageBuf:
+    """
+    Create a mosaic of the given images, automatically guessing rows/columns.
+
+    Mirror of :func:`lxmpicturelab.oiiotoolio.oiiotool_auto_mosaic`.
+    """
+    columns = math.ceil(math.sqrt(len(bufs)))
+    rows = math.ceil(len(bufs) / columns)
+    return imagebuf_mosaic(bufs, columns=columns, rows=rows)
+
+
+def array_generate_expo_bands(
+    band: numpy.ndarray,
+    band_number: int = 7,
+    band_exposure_offset: int = 2,
+    bands_callback: Callable[[numpy.ndarray], numpy.ndarray] | None = None,
+) -> oiio.ImageBuf:
+    """
+    Render the given image section with different exposure offsets.
+
+    All the exposures are computed at once by broadcasting the section against
+    the exposure gains, so memory and compute only scale with the section size.
+
+    Args:
+        band: array of shape (height, width, channels); can be a view.
+        band_number: number of band to generate.
+        band_exposure_offset: amount of exposure to change between each band.
+        bands_callback:
+            optional function to process all the bands at once (before text is
+            rendered). It receives a float32 array of shape
+            (height, band_number, width, channels) it can modify in-place.
+
+    Returns:
+        a new ImageBuf with all the bands combined horizontally.
+    """
+    if band_number % 2 == 0:
+        raise ValueError(f"band_number can only be an odd number; got {band_number}")
+
+    middle_index = math.ceil(band_number / 2)
+    limits = band_exposure_offset * (middle_index - 1)
+    bands: list[int] = list(range(limits * -1, limits + 1, band_exposure_offset))
+    gains = numpy.array([round(2**exposure, 2) for exposure in bands], numpy.float32)
+
+    height, width, nchannels = band.shape
+    # bands are stored next to each other so the array is already a mosaic
+    bands_array = numpy.empty((height, len(bands), width, nchannels), numpy.float32)
+    numpy.multiply(
+        band[:, numpy.newaxis],
+        gains[numpy.newaxis, :, numpy.newaxis, numpy.newaxis],
+        out=bands_array,
+    )
+    if bands_callback:
+        bands_array = bands_callback(bands_array)
+
+    buf = oiio.ImageBuf(bands_array.reshape(height, -1, nchannels))
+    for index, band_exposure in enumerate(bands):
+        imagebuf_text(
+            buf,
+            x=width * (index + 0.5),
+            y=height - 25,
+            text=f"{band_exposure:+}",
+            size=44,
+            shadow=4,
+        )
+    return buf
+
+
+def imagebuf_generate_expo_bands(
+    src_buf: oiio.ImageBuf,
+    band_number: int = 7,
+    band_exposure_offset: int = 2,
+    band_width: float = 0.3,
+    band_x_offset: float = 0.0,
+    bands_callback: Callable[[numpy.ndarray], numpy.ndarray] | None = None,
+) -> oiio.ImageBuf:
+    """
+    Render a width section of the given image with different exposure offsets.
+
+    Mirror of :func:`lxmpicturelab.oiiotoolio.oiiotool_generate_expo_bands`,
+    except the section is only cut once and all the bands are processed as a
+    single array.
+
+    Args:
+        src_buf: the source image, it is not modified.
+        band_number: number of band to generate.
+        band_exposure_offset: amount of exposure to change between each band.
+        band_width: percentage of the image width the band cover, 0-1 range.
+        band_x_offset:
+            percentage of the image width to offset horizontally the band by, 0-1 range.
+        bands_callback:
+            optional function to process all the bands at once (before text is
+            rendered). See :func:`array_generate_expo_bands`.
+
+    Returns:
+        a new ImageBuf with all the bands combined horizontally.
+    """
+    spec = src_buf.spec()
+    band_w = int(spec.width * band_width)
+    band_x = int(spec.width * band_x_offset)
+    band_roi = oiio.ROI(
+        band_x, band_x + band_w, 0, spec.height, 0, 1, 0, spec.nchannels
+    )
+    # only copy the pixels of the section out of the image
+    band = src_buf.get_pixels(oiio.FLOAT, roi=band_roi)
+    return array_generate_expo_bands(
+        band=band,
+        band_number=band_number,
+        band_exposure_offset=band_exposure_offset,
+        bands_callback=bands_callback,
+    )
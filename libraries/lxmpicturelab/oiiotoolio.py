@@ -40,6 +40,44 @@ def oiiotool_export(
     return command
 
 
+def oiiotool_export_resized(
+    target_path: Path,
+    height: int,
+    bitdepth: str,
+    compression: str = None,
+) -> list[str]:
+    """
+    Create the arguments required to export a downscaled copy of the current image.
+
+    The current image is left untouched on the stack so other arguments can follow.
+
+    Args:
+        target_path: filesystem path to a file that may exist.
+        height: height in pixels of the copy, width preserve aspect ratio.
+        bitdepth: depends on the image format
+        compression: depends on the image format
+
+    Returns:
+        partial oiiotool command
+    """
+    command = [
+        "--dup",
+        # resize the values as they are encoded, in the 0-1 range
+        "--clamp:min=0:max=1",
+        "--resize:filter=box",
+        f"0x{height}",
+        # the box filter extend the data window by 1 pixel
+        "--croptofull",
+    ]
+    command += oiiotool_export(
+        target_path=target_path,
+        bitdepth=bitdepth,
+        compression=compression,
+    )
+    command += ["--pop"]
+    return command
+
+
 def oiiotool_ocio_display_convert(
     config: Path,
     src_colorspace: str,
@@ -92,7 +130,7 @@ def oiiotool_generate_expo_bands(
         src_path: filesytem path to the source image.
         band_number: number of band to generate.
         band_exposure_offset: amount of exposure to change between each band.
-        band_width: width in pixels of the band.
+        band_width: percentage of the image width the band cover, 0-1 range.
         band_x_offset:
             percentage of the image width to offset horizontally the band by, 0-1 range.
         band_extra_args:
@@ -107,17 +145,27 @@ def oiiotool_generate_expo_bands(
     if band_number % 2 == 0:
         raise ValueError(f"band_number can only be an odd number; got {band_number}")
 
-    command = []
+    # same as int(width * fraction) in the in-process engines; `//1` also make
+    # sure oiiotool receive an integer geometry.
+    band_w = f"{{TOP.width*{band_width!r}//1}}"
+    band_x = f"{{TOP.width*{band_x_offset!r}//1}}"
+    # decode and cut the source only once, each band then reference it by its label
+    command = [
+        "-i",
+        str(src_path),
+        "--cut",
+        f"{band_w}x{{TOP.height}}+{band_x}+0",
+        "--label",
+        "expo_band",
+        "--pop",
+    ]
 
     middle_index = math.ceil(band_number / 2)
     limits = band_exposure_offset * (middle_index - 1)
     bands: list[int] = list(range(limits * -1, limits + 1, band_exposure_offset))
     for band_exposure in bands:
         command += [
-            "-i",
-            str(src_path),
-            "--cut",
-            f"{{TOP.width//{1 / band_width:.2f}}}x{{TOP.height}}+{{TOP.width//{1 / band_x_offset:.2f}}}+0",
+            "expo_band",
             "--mulc",
             str(round(2**band_exposure, 2)),
         ]
@@ -149,11 +197,20 @@ def oiiotool_auto_mosaic(image_number: int) -> list[str]:
     return command
 
 
-def oiiotool_export_auto_mosaic(image_paths: list[Path], dst_path: Path):
+def oiiotool_export_auto_mosaic(
+    image_paths: list[Path],
+    dst_path: Path,
+    compression: str | None = "jpeg:98",
+):
     """
     Create a mosaic of the given images, automatically guessing rows/columns.
 
-    Write as jpg to disk.
+    Write as 8bit to disk.
+
+    Args:
+        image_paths: filesystem path to existing image files.
+        dst_path: filesystem path to a file that may exist.
+        compression: depends on the image format, default for jpg.
 
     Returns:
         a full oiiotool command ready to execute.
@@ -164,7 +221,7 @@ def oiiotool_export_auto_mosaic(image_paths: list[Path], dst_path: Path):
     command += oiiotool_export(
         target_path=dst_path,
         bitdepth="uint8",
-        compression="jpeg:98",
+        compression=compression,
     )
     command.insert(0, str(OIIOTOOL))
     return command
@@ -1,7 +1,12 @@
 from ._config import OcioConfigRenderer
+from ._baked import BakedLut
+from ._baked import BakedOcioConfigRenderer
+from ._baked import bake_renderer
 from ._builders import BaseRendererBuilder
 from ._builders import RENDERER_BUILDERS
 from ._builders import RENDERER_BUILDERS_BY_ID
+from ._builders import build_renderer
+from ._builders import build_renderers
 from ._builders import AgXBuilder
 from ._builders import AgXBlenderBuilder
 from ._builders import AgXcBuilder
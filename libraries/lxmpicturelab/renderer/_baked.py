@@ -0,0 +1,329 @@
+import dataclasses
+import functools
+import logging
+from pathlib import Path
+
+import numpy
+
+from lxmpicturelab.cache import hash_file
+from lxmpicturelab.cache import hash_object
+from ._config import OcioConfigRenderer
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class BakedLut:
+    """
+    A log2 shaper followed by a 3D LUT, approximating an OCIO display transform.
+
+    The shaper encode the ``[lin_min, lin_max]`` scene-linear range to 0-1 with
+    a log2 curve offset by ``lin_offset`` so slightly negative values are preserved.
+    """
+
+    table: numpy.ndarray
+    """
+    3D LUT of shape (size, size, size, 3), indexed as [red, green, blue].
+    """
+
+    lin_min: float
+    lin_max: float
+    lin_offset: float
+
+    max_error: float
+    """
+    maximum absolute difference measured against the exact OCIO processor, in
+    display 0-1 range, including on values outside the shaper domain which are
+    clipped by the LUT.
+    """
+
+    domain_max_error: float = 0.0
+    """
+    maximum absolute difference measured only on values inside the shaper domain.
+    """
+
+    key: str = ""
+    """
+    identify the renderer configuration the LUT was baked from.
+    """
+
+    @property
+    def size(self) -> int:
+        return self.table.shape[0]
+
+    def shaper_encode(self, array: numpy.ndarray) -> numpy.ndarray:
+        """
+        Convert scene-linear values to the 0-1 LUT domain.
+        """
+        log_min = numpy.log2(self.lin_min + self.lin_offset)
+        log_max = numpy.log2(self.lin_max + self.lin_offset)
+        array = numpy.clip(array, self.lin_min, self.lin_max) + self.lin_offset
+        return (numpy.log2(array) - log_min) / (log_max - log_min)
+
+    def shaper_decode(self, array: numpy.ndarray) -> numpy.ndarray:
+        """
+        Convert 0-1 LUT domain values to scene-linear.
+        """
+        log_min = numpy.log2(self.lin_min + self.lin_offset)
+        log_max = numpy.log2(self.lin_max + self.lin_offset)
+        return numpy.exp2(array * (log_max - log_min) + log_min) - self.lin_offset
+
+    def apply(self, array: numpy.ndarray, batch_size: int = 2**20) -> numpy.ndarray:
+        """
+        Apply the LUT with tetrahedral interpolation.
+
+        Args:
+            array: scene-linear RGB values of shape (..., 3)
+            batch_size: maximum number of pixels to process at once to bound memory.
+
+        Returns:
+            a new float32 array of the same shape.
+        """
+        pixels = array.reshape(-1, 3)
+        result = numpy.empty(pixels.shape, dtype=numpy.float32)
+        for start in range(0, len(pixels), batch_size):
+            batch = pixels[start : start + batch_size]
+            coords = self.shaper_encode(batch) * (self.size - 1)
+            result[start : start + batch_size] = _tetrahedral_interpolate(
+                self.table, coords
+            )
+        return result.reshape(array.shape)
+
+    def to_file(self, path: Path):
+        numpy.savez(
+            path,
+            table=self.table,
+            domain=numpy.array([self.lin_min, self.lin_max, self.lin_offset]),
+            max_error=numpy.array(self.max_error),
+            domain_max_error=numpy.array(self.domain_max_error),
+            key=numpy.array(self.key),
+        )
+
+    @classmethod
+    def from_file(cls, path: Path) -> "BakedLut":
+        with numpy.load(path) as content:
+            lin_min, lin_max, lin_offset = content["domain"].tolist()
+            max_error = float(content["max_error"])
+            # not stored by previous bake versions
+            domain_max_error = max_error
+            if "domain_max_error" in content.files:
+                domain_max_error = float(content["domain_max_error"])
+            return cls(
+                table=content["table"],
+                lin_min=lin_min,
+                lin_max=lin_max,
+                lin_offset=lin_offset,
+                max_error=max_error,
+                domain_max_error=domain_max_error,
+                key=str(content["key"]),
+            )
+
+
+def _tetrahedral_interpolate(table: numpy.ndarray, coords: numpy.ndarray):
+    """
+    Args:
+        table: 3D LUT of shape (size, size, size, 3)
+        coords: array of shape (N, 3) of position in the table, in [0, size-1] range.
+
+    Returns:
+        array of shape (N, 3)
+    """
+    size = table.shape[0]
+    flat_table = table.reshape(-1, 3)
+    index0 = numpy.clip(numpy.floor(coords).astype(numpy.int64), 0, size - 2)
+    fraction = (coords - index0).astype(numpy.float32)
+
+    # each pixel walks the cube diagonal from its origin vertex following its
+    # fraction sorted in decreasing order, which select one of the 6 tetrahedra.
+    order = numpy.argsort(-fraction, axis=1)
+    fsorted = numpy.take_along_axis(fraction, order, axis=1)
+    rows = numpy.arange(len(coords))
+    step1 = numpy.zeros_like(index0)
+    step1[rows, order[:, 0]] = 1
+    step2 = step1.copy()
+    step2[rows, order[:, 1]] = 1
+
+    def _lookup(index: numpy.ndarray) -> numpy.ndarray:
+        return flat_table[(index[:, 0] * size + index[:, 1]) * size + index[:, 2]]
+
+    weight0 = 1.0 - fsorted[:, 0:1]
+    weight1 = fsorted[:, 0:1] - fsorted[:, 1:2]
+    weight2 = fsorted[:, 1:2] - fsorted[:, 2:3]
+    weight3 = fsorted[:, 2:3]
+    return (
+        weight0 * _lookup(index0)
+        + weight1 * _lookup(index0 + step1)
+        + weight2 * _lookup(index0 + step2)
+        + weight3 * _lookup(index0 + 1)
+    )
+
+
+# to upgrade at each change of the baking or of the LUT file content
+_BAKE_VERSION = 2
+
+
+def _get_bake_key(renderer: OcioConfigRenderer, lut_size: int) -> str:
+    resources = [(path.name, hash_file(path)) for path in renderer.get_resource_paths()]
+    return hash_object([renderer.to_dict(), resources, lut_size, _BAKE_VERSION])
+
+
+def _get_error_samples(
+    lut: BakedLut,
+    sample_number: int,
+    error_lin_min: float,
+    error_lin_max: float,
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Get random colors to measure the LUT error with.
+
+    Returns:
+        colors of shape (N, 3) uniformly distributed in the shaper domain, and
+        the same colors with a third of their components replaced by values
+        outside the domain, in the ``[error_lin_min, error_lin_max]`` range.
+    """
+    rng = numpy.random.default_rng(seed=0)
+    samples = lut.shaper_decode(rng.random((sample_number, 3)))
+    outside = samples.copy()
+    replaced = rng.random((sample_number, 3)) < 1 / 3
+    below = rng.random((sample_number, 3)) < 0.5
+    # negative out-of-gamut values
+    low = rng.uniform(error_lin_min, lut.lin_min, (sample_number, 3))
+    # highlights, log-uniform distributed
+    high = numpy.exp2(
+        rng.uniform(
+            numpy.log2(lut.lin_max), numpy.log2(error_lin_max), (sample_number, 3)
+        )
+    )
+    outside[replaced] = numpy.where(below, low, high)[replaced]
+    return samples, outside
+
+
+def bake_lut(
+    renderer: OcioConfigRenderer,
+    lut_size: int = 65,
+    lin_min: float = -(2**-8),
+    lin_max: float = 2**7,
+    lin_offset: float = 2**-7,
+    error_samples: int = 2**16,
+    error_lin_min: float = -(2**-2),
+    error_lin_max: float = 2**12,
+) -> BakedLut:
+    """
+    Sample the display transform of the given renderer into a shaper + 3D LUT.
+
+    Args:
+        renderer: renderer to bake
+        lut_size: number of samples per LUT axis
+        lin_min: minimum scene-linear value the LUT cover
+        lin_max: maximum scene-linear value the LUT cover
+        lin_offset: offset applied before the log2 encoding of the shaper
+        error_samples: number of random colors to measure the LUT error with
+        error_lin_min: minimum scene-linear value the error is measured on
+        error_lin_max: maximum scene-linear value the error is measured on
+    """
+    processor = renderer.get_cpu_processor()
+    lut = BakedLut(
+        table=numpy.empty((lut_size, lut_size, lut_size, 3), dtype=numpy.float32),
+        lin_min=lin_min,
+        lin_max=lin_max,
+        lin_offset=lin_offset,
+        max_error=0.0,
+    )
+
+    nodes = lut.shaper_decode(numpy.linspace(0.0, 1.0, lut_size))
+    grid = numpy.meshgrid(nodes, nodes, nodes, indexing="ij")
+    table = numpy.ascontiguousarray(numpy.stack(grid, axis=-1), dtype=numpy.float32)
+    processor.applyRGB(table)
+
+    lut = dataclasses.replace(lut, table=table)
+    errors = []
+    for samples in _get_error_samples(
+        lut, error_samples, error_lin_min=error_lin_min, error_lin_max=error_lin_max
+    ):
+        samples = numpy.ascontiguousarray(samples, dtype=numpy.float32)
+        expected = samples.copy()
+        processor.applyRGB(expected)
+        # renders are encoded to display range so only that range matters
+        result = numpy.clip(lut.apply(samples), 0.0, 1.0)
+        expected = numpy.clip(expected, 0.0, 1.0)
+        errors.append(float(numpy.max(numpy.abs(result - expected))))
+    domain_max_error, outside_max_error = errors
+
+    return dataclasses.replace(
+        lut,
+        max_error=max(domain_max_error, outside_max_error),
+        domain_max_error=domain_max_error,
+        key=_get_bake_key(renderer, lut_size),
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _read_lut(lut_path: Path, mtime: int) -> BakedLut:
+    # mtime is only used to invalidate the cache
+    return BakedLut.from_file(lut_path)
+
+
+@dataclasses.dataclass(frozen=True)
+class BakedOcioConfigRenderer(OcioConfigRenderer):
+    """
+    A renderer whose display transform is approximated by a pre-baked 3D LUT.
+
+    Only used by the in-process engines, oiiotool still evaluates the exact
+    OCIO transforms.
+    """
+
+    lut_path: Path = None
+
+    def get_lut(self) -> BakedLut:
+        return _read_lut(self.lut_path, self.lut_path.stat().st_mtime_ns)
+
+    def get_resource_paths(self) -> list[Path]:
+        return super().get_resource_paths() + [self.lut_path]
+
+    def display_array(
+        self, array: numpy.ndarray, batch_size: int = 2**20
+    ) -> numpy.ndarray:
+        array[..., :3] = self.get_lut().apply(array[..., :3], batch_size=batch_size)
+        return array
+
+    def to_dict(self) -> dict:
+        asdict = super().to_dict()
+        asdict["lut_path"] = str(self.lut_path)
+        return asdict
+
+    @classmethod
+    def from_dict(cls, as_dict: dict) -> "BakedOcioConfigRenderer":
+        renderer = super().from_dict(as_dict)
+        return dataclasses.replace(renderer, lut_path=Path(as_dict["lut_path"]))
+
+
+def bake_renderer(
+    renderer: OcioConfigRenderer,
+    lut_path: Path,
+    lut_size: int = 65,
+) -> BakedOcioConfigRenderer:
+    """
+    Get a baked version of the given renderer, baking its LUT if not already cached.
+
+    Args:
+        renderer: renderer to bake
+        lut_path: filesystem path to a ``.npz`` file that may exist.
+        lut_size: number of samples per LUT axis
+
+    Returns:
+        the renderer in baked mode; check ``get_lut().max_error`` to decide if
+        the approximation is acceptable.
+    """
+    key = _get_bake_key(renderer, lut_size)
+    if lut_path.exists() and BakedLut.from_file(lut_path).key == key:
+        LOGGER.debug(f"found existing baked LUT '{lut_path}'")
+    else:
+        LOGGER.debug(f"baking '{renderer.name}' to '{lut_path}'")
+        lut = bake_lut(renderer, lut_size=lut_size)
+        lut.to_file(lut_path)
+
+    fields = {
+        field.name: getattr(renderer, field.name)
+        for field in dataclasses.fields(OcioConfigRenderer)
+    }
+    return BakedOcioConfigRenderer(**fields, lut_path=lut_path)
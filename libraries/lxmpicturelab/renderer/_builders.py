@@ -1,15 +1,16 @@
 import abc
 import dataclasses
+import functools
 import logging
-import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import PyOpenColorIO as ocio
 
-from lxmpicturelab.download import download_file
 from lxmpicturelab.download import download_file_advanced
-from lxmpicturelab.download import extract_zip
+from lxmpicturelab.download import download_file_cached
+from lxmpicturelab.download import download_zip
 from ._config import OcioConfigRenderer
 
 LOGGER = logging.getLogger(__name__)
@@ -69,9 +70,7 @@ class AgXBuilder(BaseRendererBuilder):
         )
 
     def build(self):
-        repo_path = self.path / "AgX.zip"
-        download_file(self.source_url, repo_path)
-        extract_zip(repo_path, remove_zip=True)
+        download_zip(self.source_url, self.path)
         assert self.get_ocio_config_path().exists()
 
 
@@ -101,13 +100,12 @@ class AgXBlenderBuilder(BaseRendererBuilder):
         )
 
     def build(self):
-        src_dir = self.path / "blender" / "release" / "datafiles" / "colormanagement"
-        repo_path = self.path / "blender.zip"
-        download_file(self.source_url, repo_path)
-        extract_zip(repo_path, remove_zip=True)
         config_path = self.get_ocio_config_path()
-        shutil.copytree(src_dir, config_path.parent)
-        shutil.rmtree(self.path / "blender")
+        download_zip(
+            self.source_url,
+            config_path.parent,
+            subdir="blender/release/datafiles/colormanagement",
+        )
         assert config_path.exists()
 
 
@@ -142,9 +140,7 @@ class AgXcBuilder(BaseRendererBuilder):
         )
 
     def build(self):
-        repo_path = self.path / "AgXc.zip"
-        download_file(self.source_url, repo_path)
-        extract_zip(repo_path, remove_zip=True)
+        download_zip(self.source_url, self.path)
         assert self.get_ocio_config_path().exists()
 
 
@@ -171,13 +167,12 @@ class TCAMBuilder(BaseRendererBuilder):
         )
 
     def build(self):
-        repo_path = self.path / "TCAM.zip"
-        download_file_advanced(
-            self.source_url,
-            repo_path,
+        download = "colourspaces/TCS_TCAMv3.zip"
+        downloader = functools.partial(
+            download_file_advanced,
             params={
                 "access": "public",
-                "download": "colourspaces/TCS_TCAMv3.zip",
+                "download": download,
                 "last_page": "/support/customer-login/colourspaces/colourspaces.php",
                 "button.x": "9",
                 "button.y": "6",
@@ -187,7 +182,13 @@ class TCAMBuilder(BaseRendererBuilder):
                 "Content-Type": "application/x-www-form-urlencoded",
             },
         )
-        extract_zip(repo_path, remove_zip=True)
+        download_zip(
+            self.source_url,
+            self.path,
+            downloader=downloader,
+            # the url is the same for all downloads of the website
+            cache_key=f"{self.source_url}?download={download}",
+        )
         assert self.get_ocio_config_path().exists()
 
 
@@ -225,10 +226,8 @@ class ARRIBuilder(BaseRendererBuilder):
         We use the ACESv3.0.0 config as a base on which we add a new view with the ARRI Lut.
         """
         aces_config_path = self.path / self.aces_url.split("/")[-1]
-        repo_path = self.path / "arri.zip"
-        download_file(self.source_url, repo_path)
-        extract_zip(repo_path, remove_zip=True)
-        download_file(self.aces_url, aces_config_path)
+        download_zip(self.source_url, self.path)
+        download_file_cached(self.aces_url, aces_config_path)
 
         src_lut_path = list(
             self.path.rglob("ARRI_LogC4-to-Gamma24_Rec709-D65_v1-65.cube")
@@ -331,7 +330,7 @@ class ACES13gmBuilder(BaseRendererBuilder):
 
     def build(self):
         config_path = self.get_ocio_config_path()
-        download_file(self.source_url, config_path)
+        download_file_cached(self.source_url, config_path)
         assert config_path.exists()
         # noinspection PyArgumentList
         config: ocio.Config = ocio.Config.CreateFromFile(str(config_path))
@@ -373,7 +372,7 @@ class ACES2gmBuilder(BaseRendererBuilder):
 
     def build(self):
         config_path = self.get_ocio_config_path()
-        download_file(self.source_url, config_path)
+        download_file_cached(self.source_url, config_path)
         assert config_path.exists()
         # noinspection PyArgumentList
         config: ocio.Config = ocio.Config.CreateFromFile(str(config_path))
@@ -455,13 +454,12 @@ class OpenDRTBuilder(BaseRendererBuilder):
 
     def build(self):
         config_path = self.get_ocio_config_path()
-        repo_dir = self.path / "tmp"
-        repo_dir.mkdir(exist_ok=True)
-        repo_path = repo_dir / "OpenDRT-OCIO-Config.zip"
         git_ref = self.source_url.split("/")[-1].split(".zip")[0]
-        download_file(self.source_url, repo_path)
-        extract_zip(repo_path, remove_zip=True)
-        os.rename(repo_dir / f"OpenDRT-OCIO-Config-{git_ref}", self.path / "ocio")
+        download_zip(
+            self.source_url,
+            config_path.parent,
+            subdir=f"OpenDRT-OCIO-Config-{git_ref}",
+        )
         assert config_path.exists()
 
         # noinspection PyArgumentList
@@ -524,13 +522,12 @@ class DRT2499Builder(BaseRendererBuilder):
         )
 
     def build(self):
-        repo_dir = self.path / "tmp"
-        repo_dir.mkdir(exist_ok=True)
-        repo_path = repo_dir / "PixelManager.zip"
         git_ref = self.source_url.split("/")[-1].split(".zip")[0]
-        download_file(self.source_url, repo_path)
-        extract_zip(repo_path, remove_zip=True)
-        os.rename(repo_dir / f"PixelManager-{git_ref}", self.path / "ocio")
+        download_zip(
+            self.source_url,
+            self.get_ocio_config_path().parent,
+            subdir=f"PixelManager-{git_ref}",
+        )
         assert self.get_ocio_config_path().exists()
 
 
@@ -567,7 +564,7 @@ class Kodak2383Builder(BaseRendererBuilder):
         shutil.copy(src_lut_path, dst_lut_path)
 
         aces_config_path = self.path / self.aces_url.split("/")[-1]
-        download_file(self.aces_url, aces_config_path)
+        download_file_cached(self.aces_url, aces_config_path)
 
         # noinspection PyArgumentList
         config: ocio.Config = ocio.Config.CreateFromFile(str(aces_config_path))
@@ -618,3 +615,82 @@ RENDERER_BUILDERS = [
 ]
 
 RENDERER_BUILDERS_BY_ID = {b.identifier: b for b in RENDERER_BUILDERS}
+
+
+def build_renderer(
+    identifier: str,
+    target_dir: Path,
+    force_overwrite: bool = False,
+) -> OcioConfigRenderer:
+    """
+    Generate the resources of the given renderer and its configuration file.
+
+    Args:
+        identifier: identifier of the renderer builder to use.
+        target_dir: filesystem path to a directory that may not exist.
+        force_overwrite: build the renderer even if it already exists.
+
+    Returns:
+        the renderer, as serialized to its configuration file.
+    """
+    BuilderT = RENDERER_BUILDERS_BY_ID[identifier]
+    renderer_path = (
+        target_dir / f"{BuilderT(path=target_dir).get_renderer().filename}.json"
+    )
+
+    if target_dir.exists() and not force_overwrite:
+        LOGGER.debug(f"⏩ skiping existing renderer '{identifier}'")
+        return OcioConfigRenderer.from_json(renderer_path.read_text("utf-8"))
+
+    if target_dir.exists():
+        shutil.rmtree(target_dir)
+    target_dir.mkdir()
+
+    builder = BuilderT(path=target_dir)
+    LOGGER.info(f"🛠️ building renderer '{identifier}'")
+    try:
+        builder.build()
+    except Exception:
+        # don't leave a partial build that would be skipped at the next call
+        shutil.rmtree(target_dir, ignore_errors=True)
+        raise
+
+    renderer = builder.get_renderer()
+    as_json = renderer.to_json(indent=4, sort_keys=True)
+    LOGGER.info(f"💾 writing '{renderer_path}'")
+    renderer_path.write_text(as_json)
+    return renderer
+
+
+def build_renderers(
+    dst_dir: Path,
+    renderer_ids: list[str],
+    force_overwrite: bool = False,
+    max_workers: int | None = None,
+) -> list[OcioConfigRenderer]:
+    """
+    Build multiple renderers concurrently, see :func:`build_renderer`.
+
+    Args:
+        dst_dir: filesystem path to a directory that may not exist.
+            Each renderer is built in a subdirectory named after its identifier.
+        renderer_ids: identifier of the renderer builders to use.
+        force_overwrite: build the renderers even if they already exist.
+        max_workers: maximum number of threads; default to one per renderer.
+
+    Returns:
+        the renderers in the same order as the given identifiers.
+    """
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    max_workers = max_workers or max(len(renderer_ids), 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                build_renderer,
+                renderer_id,
+                dst_dir / renderer_id,
+                force_overwrite,
+            )
+            for renderer_id in renderer_ids
+        ]
+        return [future.result() for future in futures]
@@ -1,8 +1,14 @@
 import dataclasses
+import functools
 import json
 import logging
 from pathlib import Path
 
+import numpy
+import OpenImageIO as oiio
+import PyOpenColorIO as ocio
+
+from lxmpicturelab.imagebufio import imagebuf_colormatrix
 from lxmpicturelab.oiiotoolio import oiiotool_ocio_display_convert
 
 LOGGER = logging.getLogger(__name__)
@@ -10,20 +16,88 @@ LOGGER = logging.getLogger(__name__)
 
 ACES20651_COLORSPACE = "@ACES2065-1@"
 
+# file formats that an OCIO config may reference with a FileTransform
+LUT_SUFFIXES = {
+    ".3dl",
+    ".cc",
+    ".ccc",
+    ".cdl",
+    ".clf",
+    ".csp",
+    ".ctf",
+    ".cub",
+    ".cube",
+    ".hdl",
+    ".icc",
+    ".look",
+    ".lut",
+    ".mga",
+    ".spi1d",
+    ".spi3d",
+    ".spimtx",
+    ".vf",
+}
+
+# https://www.colour-science.org:8010/apps/rgb_colourspace_transformation_matrix?input-colourspace=ACES2065-1&output-colourspace=sRGB&chromatic-adaptation-transform=CAT02&formatter=str&decimals=6
+AP0_TO_SRGB = [
+    2.521649,
+    -1.136889,
+    -0.384918,
+    -0.275214,
+    1.369705,
+    -0.094392,
+    -0.015925,
+    -0.147806,
+    1.163806,
+]
+
+
+@functools.lru_cache(maxsize=8)
+def _read_config(config_path: Path, mtime: int) -> ocio.Config:
+    # mtime is only used to invalidate the cache
+    # noinspection PyArgumentList
+    return ocio.Config.CreateFromFile(str(config_path))
+
+
+@functools.lru_cache(maxsize=32)
+def _get_config_resource_paths(config_path: Path, mtime: int) -> tuple[Path, ...]:
+    config = _read_config(config_path, mtime)
+    working_dir = Path(config.getWorkingDir())
+    paths = [config_path]
+    for search_path in config.getSearchPaths():
+        search_dir = working_dir / search_path
+        if not search_dir.is_dir():
+            continue
+        paths += sorted(
+            path
+            for path in search_dir.iterdir()
+            if path.suffix.lower() in LUT_SUFFIXES and path.is_file()
+        )
+    return tuple(paths)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_cpu_processor(
+    config_path: Path,
+    mtime: int,
+    src_colorspace: str,
+    display: str,
+    view: str,
+    look: str | None,
+) -> ocio.CPUProcessor:
+    config = _read_config(config_path, mtime)
+    transforms = ocio.GroupTransform()
+    if look:
+        transforms.appendTransform(
+            ocio.LookTransform(src=src_colorspace, dst=src_colorspace, looks=look)
+        )
+    transforms.appendTransform(
+        ocio.DisplayViewTransform(src=src_colorspace, display=display, view=view)
+    )
+    return config.getProcessor(transforms).getDefaultCPUProcessor()
+
 
 def oiiotool_AP0_to_sRGB():
-    # https://www.colour-science.org:8010/apps/rgb_colourspace_transformation_matrix?input-colourspace=ACES2065-1&output-colourspace=sRGB&chromatic-adaptation-transform=CAT02&formatter=str&decimals=6
-    AP0_TO_SRGB = [
-        2.521649,
-        -1.136889,
-        -0.384918,
-        -0.275214,
-        1.369705,
-        -0.094392,
-        -0.015925,
-        -0.147806,
-        1.163806,
-    ]
     return [
         "--ccmatrix:transpose=1",
         ",".join(map(str, AP0_TO_SRGB)),
@@ -69,6 +143,126 @@ class OcioConfigRenderer:
             look=self.look,
         )
 
+    def convert_source_imagebuf(self, buf: oiio.ImageBuf) -> oiio.ImageBuf:
+        """
+        Convert the given source image to the linear-sRGB colorspace the renderer expects.
+
+        The result only depends on :attr:`src_colorspace` so it can be shared across
+        renderers that use the same source colorspace.
+
+        Returns:
+            a new ImageBuf instance.
+        """
+        if self.src_colorspace == ACES20651_COLORSPACE:
+            return imagebuf_colormatrix(buf, AP0_TO_SRGB)
+        raise NotImplementedError(
+            "Only ACES2065-1 encoded data is supported at this time."
+        )
+
+    def convert_source_array(self, array: numpy.ndarray) -> numpy.ndarray:
+        """
+        Convert the given source pixels to the linear-sRGB colorspace, in-place.
+
+        Array equivalent of :meth:`convert_source_imagebuf`.
+
+        Args:
+            array: float32 array of shape (..., channels) with at least 3 channels.
+
+        Returns:
+            the given array, for convenience.
+        """
+        if self.src_colorspace != ACES20651_COLORSPACE:
+            raise NotImplementedError(
+                "Only ACES2065-1 encoded data is supported at this time."
+            )
+        matrix = numpy.array(AP0_TO_SRGB, dtype=numpy.float32).reshape(3, 3)
+        array[..., :3] = array[..., :3] @ matrix.T
+        return array
+
+    def get_cpu_processor(self) -> ocio.CPUProcessor:
+        """
+        Get the OCIO processor converting linear-sRGB to the renderer display.
+
+        Processors are built once per config file modification time and kept in a
+        process-wide cache shared by all renderers; they are safe to use from
+        multiple threads.
+        """
+        return _get_cpu_processor(
+            self.config_path,
+            self.config_path.stat().st_mtime_ns,
+            self.srgb_lin,
+            self.display,
+            self.view,
+            self.look,
+        )
+
+    def display_array(
+        self, array: numpy.ndarray, batch_size: int = 2**20
+    ) -> numpy.ndarray:
+        """
+        Apply the image formation on the given linear-sRGB pixels, in-place.
+
+        Args:
+            array: C-contiguous float32 array of shape (..., channels)
+                with 3 (RGB) or 4 (RGBA) channels.
+            batch_size: maximum number of pixels to process at once, OCIO
+                allocates temporary buffers proportional to it.
+
+        Returns:
+            the given array, for convenience.
+        """
+        processor = self.get_cpu_processor()
+        nchannels = array.shape[-1]
+        pixels = array.reshape(-1, nchannels)
+        for start in range(0, len(pixels), batch_size):
+            batch = pixels[start : start + batch_size]
+            if nchannels == 3:
+                processor.applyRGB(batch)
+            else:
+                desc = ocio.PackedImageDesc(batch, len(batch), 1, nchannels)
+                processor.apply(desc)
+        return array
+
+    def display_imagebuf(self, buf: oiio.ImageBuf) -> oiio.ImageBuf:
+        """
+        Apply the image formation on the given linear-sRGB image, in-process.
+
+        Returns:
+            a new ImageBuf instance.
+        """
+        pixels = numpy.ascontiguousarray(buf.get_pixels(oiio.FLOAT))
+        return oiio.ImageBuf(self.display_array(pixels))
+
+    def apply_array(self, array: numpy.ndarray) -> numpy.ndarray:
+        """
+        Apply the image formation on the given source pixels, in-place.
+
+        Array equivalent of :meth:`apply_imagebuf`.
+        """
+        array = self.convert_source_array(array)
+        return self.display_array(array)
+
+    def apply_imagebuf(self, buf: oiio.ImageBuf) -> oiio.ImageBuf:
+        """
+        Apply the image formation on the given source image, in-process.
+
+        Equivalent of the operations of :meth:`to_oiiotool_command`.
+
+        Returns:
+            a new ImageBuf instance.
+        """
+        buf = self.convert_source_imagebuf(buf)
+        return self.display_imagebuf(buf)
+
+    def get_resource_paths(self) -> list[Path]:
+        """
+        Get the files the renderer depends on: its OCIO config and the LUTs it may use.
+
+        LUTs are retrieved from the search paths of the config.
+        """
+        mtime = self.config_path.stat().st_mtime_ns
+        return list(_get_config_resource_paths(self.config_path, mtime))
+
     def to_dict(self) -> dict:
         asdict = dataclasses.asdict(self)
         asdict["config_path"] = str(self.config_path)
@@ -0,0 +1,312 @@
+import logging
+from pathlib import Path
+from typing import Callable
+
+import numpy
+import OpenImageIO as oiio
+
+from lxmpicturelab.imagebufio import array_generate_expo_bands
+from lxmpicturelab.imagebufio import imagebuf_export
+from lxmpicturelab.imagebufio import imagebuf_resize
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _get_box_filter_taps(
+    src_size: int, dst_size: int
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Get which source pixels contribute to each pixel of a box-filtered downscale.
+
+    Reproduce the footprint of OpenImageIO ``resize`` with a box filter: an
+    output pixel is the plain average of the source pixels whose center falls
+    within its box, one output pixel wide. Computed in float32 like OpenImageIO
+    so the source pixels exactly on the box edges are included the same way.
+
+    Returns:
+        source pixel index and weight of each tap, arrays of shape (dst_size, taps)
+    """
+    f32 = numpy.float32
+    ratio = f32(dst_size) / f32(src_size)
+    radius = int(numpy.ceil(f32(0.5) / ratio))
+    offsets = numpy.arange(-radius, radius + 1, dtype=numpy.int64)
+
+    dst_pixel_size = f32(1.0) / f32(dst_size)
+    centers = (numpy.arange(dst_size, dtype=f32) + f32(0.5)) * dst_pixel_size
+    centers = centers * f32(src_size)
+    first = numpy.floor(centers)
+    fraction = centers - first
+
+    distance = offsets.astype(f32)[numpy.newaxis] - (fraction - f32(0.5))[:, None]
+    weights = (numpy.abs(ratio * distance) <= f32(0.5)).astype(f32)
+    weights /= weights.sum(axis=1, keepdims=True)
+    indices = first.astype(numpy.int64)[:, None] + offsets[numpy.newaxis]
+    # drop the taps outside the box of every output pixel
+    used = weights.any(axis=0)
+    return numpy.clip(indices[:, used], 0, src_size - 1), weights[:, used]
+
+
+class ScanlineBoxResize:
+    """
+    Resize an image with a box filter, processing it by horizontal strips.
+
+    Produce the same result as OpenImageIO ``resize`` with a box filter (see
+    :func:`_get_box_filter_taps`), while only keeping in memory the source rows
+    the next output row needs.
+
+    Args:
+        src_width: width in pixels of the image to resize
+        src_height: height in pixels of the image to resize
+        dst_width: width in pixels of the resized image
+        dst_height: height in pixels of the resized image
+    """
+
+    def __init__(
+        self, src_width: int, src_height: int, dst_width: int, dst_height: int
+    ):
+        self.src_width = src_width
+        self.src_height = src_height
+        self.dst_width = dst_width
+        self.dst_height = dst_height
+        self._x_indices, self._x_weights = _get_box_filter_taps(src_width, dst_width)
+        self._y_indices, self._y_weights = _get_box_filter_taps(src_height, dst_height)
+        self._dst_y = 0
+        # source rows already resized horizontally and still needed,
+        # starting at source row ``_rows_y``.
+        self._rows: numpy.ndarray | None = None
+        self._rows_y = 0
+
+    def _resize_width(self, strip: numpy.ndarray) -> numpy.ndarray:
+        resized = numpy.zeros(
+            (len(strip), self.dst_width, strip.shape[2]), dtype=numpy.float32
+        )
+        for indices, weights in zip(self._x_indices.T, self._x_weights.T):
+            resized += weights[:, numpy.newaxis] * strip[:, indices]
+        return resized
+
+    def push(self, strip: numpy.ndarray) -> numpy.ndarray:
+        """
+        Feed the next rows of the source image.
+
+        Args:
+            strip: array of shape (rows, src_width, channels)
+
+        Returns:
+            float32 array of shape (rows, dst_width, channels) with the output rows
+            that were completed by this strip; can contain zero row.
+        """
+        strip = self._resize_width(strip)
+        if self._rows is None:
+            self._rows = strip
+        else:
+            self._rows = numpy.concatenate([self._rows, strip])
+        rows_end = self._rows_y + len(self._rows)
+
+        rows = []
+        while self._dst_y < self.dst_height:
+            indices = self._y_indices[self._dst_y]
+            if indices.max() >= rows_end:
+                break
+            weights = self._y_weights[self._dst_y]
+            taps = self._rows[indices - self._rows_y]
+            rows.append(numpy.tensordot(weights, taps, axes=1))
+            self._dst_y += 1
+
+        # discard the source rows no next output row uses
+        if self._dst_y < self.dst_height:
+            first_needed = int(self._y_indices[self._dst_y].min())
+            self._rows = self._rows[max(first_needed - self._rows_y, 0) :]
+            self._rows_y = max(first_needed, self._rows_y)
+        shape = (len(rows), self.dst_width, strip.shape[2])
+        return numpy.array(rows, dtype=numpy.float32).reshape(shape)
+
+
+def scanline_render_resized(
+    src_path: Path,
+    dst_path: Path,
+    height: int,
+    bitdepth: str,
+    compression: str = None,
+    strip_callback: Callable[[numpy.ndarray], numpy.ndarray] | None = None,
+    strip_height: int = 64,
+    footer_height: int = 0,
+    footer_callback: Callable[[oiio.ImageBuf], None] | None = None,
+    variant_paths: dict[int, Path] | None = None,
+):
+    """
+    Resize the R,G,B channels of the given image to the given height, streaming it.
+
+    Only a strip of ``strip_height`` source rows is decoded in memory at a time,
+    which allows processing images larger than the available memory.
+
+    Equivalent of :func:`lxmpicturelab.imagebufio.imagebuf_read`, then
+    ``strip_callback``, :func:`lxmpicturelab.imagebufio.imagebuf_resize`,
+    :func:`lxmpicturelab.imagebufio.imagebuf_extend` and
+    :func:`lxmpicturelab.imagebufio.imagebuf_export`.
+
+    Args:
+        src_path: filesystem path to an existing image file.
+        dst_path: filesystem path to a file that may exist.
+        height: height in pixels of the resized image, width preserve aspect ratio.
+        bitdepth: depends on the image format
+        compression: depends on the image format
+        strip_callback:
+            optional function to process each source strip of shape
+            (rows, width, 3), before resizing. It can modify the array in-place.
+        strip_height: number of source rows to process at once.
+        footer_height: amount of black pixels to add at the bottom of the image.
+        footer_callback:
+            optional function to draw on the footer image, in-place.
+        variant_paths:
+            optional downscaled copies of the resized image to also write, by
+            height; resized from its unencoded pixels, which are kept in memory.
+    """
+    src_file = oiio.ImageInput.open(str(src_path))
+    if not src_file:
+        raise RuntimeError(f"(OIIO) cannot open '{src_path}': {oiio.geterror()}")
+
+    try:
+        src_spec = src_file.spec()
+        width = int(height * src_spec.width / src_spec.height + 0.5)
+        resizer = ScanlineBoxResize(src_spec.width, src_spec.height, width, height)
+
+        dst_spec = oiio.ImageSpec(width, height + footer_height, 3, bitdepth)
+        if compression:
+            dst_spec.attribute("compression", compression)
+        dst_file = oiio.ImageOutput.create(str(dst_path))
+        if not dst_file or not dst_file.open(str(dst_path), dst_spec):
+            raise RuntimeError(f"(OIIO) cannot write '{dst_path}': {oiio.geterror()}")
+
+        dst_rows = []
+        dst_y = 0
+        for src_y in range(src_spec.y, src_spec.y + src_spec.height, strip_height):
+            src_y_end = min(src_y + strip_height, src_spec.y + src_spec.height)
+            strip = src_file.read_scanlines(0, 0, src_y, src_y_end, 0, 0, 3, oiio.FLOAT)
+            if strip is None:
+                raise RuntimeError(
+                    f"(OIIO) cannot read '{src_path}': {src_file.geterror()}"
+                )
+            if strip_callback:
+                strip = strip_callback(strip)
+            rows = resizer.push(strip)
+            if len(rows):
+                dst_file.write_scanlines(dst_y, dst_y + len(rows), 0, rows)
+                dst_y += len(rows)
+                if variant_paths:
+                    dst_rows.append(rows)
+
+        if footer_height:
+            footer = oiio.ImageBuf(oiio.ImageSpec(width, footer_height, 3, oiio.FLOAT))
+            if footer_callback:
+                footer_callback(footer)
+            pixels = footer.get_pixels(oiio.FLOAT)
+            dst_file.write_scanlines(dst_y, dst_y + footer_height, 0, pixels)
+            if variant_paths:
+                dst_rows.append(pixels)
+
+        if not dst_file.close():
+            raise RuntimeError(
+                f"(OIIO) cannot write '{dst_path}': {dst_file.geterror()}"
+            )
+    finally:
+        src_file.close()
+
+    if variant_paths:
+        # resize the values as they are encoded, in the 0-1 range
+        dst_buf = oiio.ImageBuf(numpy.clip(numpy.concatenate(dst_rows), 0.0, 1.0))
+        for variant_height, variant_path in variant_paths.items():
+            variant = imagebuf_resize(dst_buf, height=variant_height)
+            imagebuf_export(variant, variant_path, bitdepth, compression)
+
+
+def _read_columns(
+    src_file: oiio.ImageInput,
+    src_path: Path,
+    x_begin: int,
+    x_end: int,
+    strip_callback: Callable[[numpy.ndarray], numpy.ndarray] | None,
+    strip_height: int,
+) -> numpy.ndarray:
+    """
+    Read the R,G,B channels of a vertical section of the given opened image.
+
+    Only a strip of ``strip_height`` source rows is decoded at a time and only
+    its section columns are kept.
+    """
+    src_spec = src_file.spec()
+    section = numpy.empty((src_spec.height, x_end - x_begin, 3), numpy.float32)
+    for src_y in range(src_spec.y, src_spec.y + src_spec.height, strip_height):
+        src_y_end = min(src_y + strip_height, src_spec.y + src_spec.height)
+        strip = src_file.read_scanlines(0, 0, src_y, src_y_end, 0, 0, 3, oiio.FLOAT)
+        if strip is None:
+            raise RuntimeError(
+                f"(OIIO) cannot read '{src_path}': {src_file.geterror()}"
+            )
+        # view on the section, no copy
+        strip = strip[:, x_begin:x_end]
+        if strip_callback:
+            strip = strip_callback(strip)
+        section[src_y - src_spec.y : src_y_end - src_spec.y] = strip
+    return section
+
+
+def scanline_generate_expo_bands(
+    src_path: Path,
+    band_number: int = 7,
+    band_exposure_offset: int = 2,
+    band_width: float = 0.3,
+    band_x_offset: float = 0.0,
+    strip_callback: Callable[[numpy.ndarray], numpy.ndarray] | None = None,
+    bands_callback: Callable[[numpy.ndarray], numpy.ndarray] | None = None,
+    strip_height: int = 64,
+) -> oiio.ImageBuf:
+    """
+    Render a width section of the given image with different exposure offsets.
+
+    Streaming equivalent of :func:`lxmpicturelab.imagebufio.imagebuf_read`
+    followed by :func:`lxmpicturelab.imagebufio.imagebuf_generate_expo_bands`;
+    only the section of the image is ever kept in memory.
+
+    Args:
+        src_path: filesystem path to an existing image file.
+        band_number: number of band to generate.
+        band_exposure_offset: amount of exposure to change between each band.
+        band_width: percentage of the image width the band cover, 0-1 range.
+        band_x_offset:
+            percentage of the image width to offset horizontally the band by, 0-1 range.
+        strip_callback:
+            optional function to process the section of each source strip, as a
+            view of shape (rows, section width, 3). It can modify the array in-place.
+        bands_callback:
+            optional function to process all the bands at once.
+            See :func:`lxmpicturelab.imagebufio.array_generate_expo_bands`.
+        strip_height: number of source rows to process at once.
+
+    Returns:
+        a new ImageBuf with all the bands combined horizontally.
+    """
+    src_file = oiio.ImageInput.open(str(src_path))
+    if not src_file:
+        raise RuntimeError(f"(OIIO) cannot open '{src_path}': {oiio.geterror()}")
+
+    try:
+        width = src_file.spec().width
+        band_w = int(width * band_width)
+        band_x = int(width * band_x_offset)
+        band = _read_columns(
+            src_file,
+            src_path,
+            x_begin=band_x,
+            x_end=band_x + band_w,
+            strip_callback=strip_callback,
+            strip_height=strip_height,
+        )
+    finally:
+        src_file.close()
+
+    return array_generate_expo_bands(
+        band=band,
+        band_number=band_number,
+        band_exposure_offset=band_exposure_offset,
+        bands_callback=bands_callback,
+    )
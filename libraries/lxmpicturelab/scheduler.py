@@ -0,0 +1,379 @@
+import concurrent.futures
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+import OpenImageIO as oiio
+
+from lxmpicturelab.cache import RenderCache
+from lxmpicturelab.comparison import ComparisonRender
+from lxmpicturelab.comparison import RenderEngine
+from lxmpicturelab.comparison import SOURCE_IMAGES
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """
+    Execute file writing tasks on dedicated threads so the caller can carry on.
+
+    The number of pending tasks is bounded: :meth:`submit` blocks until a
+    previous task finishes, so the data waiting to be written stays bounded
+    in memory.
+
+    Args:
+        max_workers: number of threads writing concurrently.
+        max_pending: maximum number of tasks submitted but not finished.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 4):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="WriteQueue",
+        )
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}"
+            f"(max_workers={self.max_workers}, max_pending={self.max_pending})"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def submit(self, function: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Schedule the given function to be executed on a writing thread.
+
+        Blocks while the queue is full.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(function, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class MemoryBudget:
+    """
+    Bound the amount of memory used by tasks running concurrently.
+
+    Each task reserves its estimated peak memory usage before starting and
+    releases it once finished; :meth:`reserve` blocks until enough of the budget
+    is available. A task estimated over the whole budget is still allowed to run,
+    but alone.
+
+    Usage::
+
+        budget = MemoryBudget(8 * 1024**3)
+        with budget.reserve(estimated_size):
+            ...  # memory-hungry work
+
+    Args:
+        max_size: total amount of memory in bytes tasks can use concurrently.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._used = 0
+        self._condition = threading.Condition()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.max_size})"
+
+    @contextlib.contextmanager
+    def reserve(self, size: int):
+        """
+        Block until ``size`` bytes of the budget are available and hold them.
+
+        Args:
+            size: estimated amount of memory in bytes the task will use.
+        """
+        size = min(size, self.max_size)
+        with self._condition:
+            self._condition.wait_for(lambda: self._used + size <= self.max_size)
+            self._used += size
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._used -= size
+                self._condition.notify_all()
+
+
+def _init_worker(shared_dir: Path):
+    # the OpenEXR thread pool of the parent process is unusable once forked
+    oiio.attribute("exr_threads", -1)
+    SOURCE_IMAGES.shared_dir = shared_dir
+
+
+def _run_render(
+    render: ComparisonRender,
+    engine: RenderEngine,
+    cache: RenderCache | None,
+) -> tuple[float, dict[Path, bytes] | None, int]:
+    """
+    Generate the given render, in a worker process.
+
+    Renders generated in memory are also encoded here, including the quality
+    search of targeted encodings, so only their writing is left to the caller.
+
+    Returns:
+        the duration of the generation, the encoded files still to be written to
+        disk if the engine generated them in memory, and the size in bytes stored
+        in the cache; the cache of the worker is a copy which doesn't evict itself.
+    """
+    LOGGER.info(f"💫 generating '{render.dst_path}'")
+    stime = time.time()
+    if cache and render.fetch_cache(cache, engine):
+        return time.time() - stime, None, 0
+
+    pixels = render.generate(engine=engine)
+    if pixels is not None:
+        return time.time() - stime, render.encode(pixels), 0
+
+    stored_size = 0
+    if cache:
+        stored_size = render.store_cache(cache, engine, evict=False)
+    return time.time() - stime, None, stored_size
+
+
+def _write_render(
+    render: ComparisonRender,
+    files: dict[Path, bytes],
+    engine: RenderEngine,
+    cache: RenderCache | None,
+) -> int:
+    render.write_encoded(files)
+    if cache:
+        # counted by the scheduler, as for the renders stored by workers
+        return render.store_cache(cache, engine, evict=False)
+    return 0
+
+
+def get_render_dependencies(renders: list[ComparisonRender]) -> list[set[int]]:
+    """
+    Find which renders must be completed before each render can start.
+
+    A render depends on another if it use its output as source.
+
+    Returns:
+        for each render, the index of the renders it depends on.
+    """
+    index_by_dst: dict[Path, int] = {
+        render.dst_path: index for index, render in enumerate(renders)
+    }
+    return [
+        {index_by_dst[path] for path in render.src_paths if path in index_by_dst}
+        for render in renders
+    ]
+
+
+def _pop_ready_render(
+    ready: list[tuple[float, int]],
+    groups: list[tuple[Path, ...]],
+    owners: dict[tuple[Path, ...], int],
+    worker: int,
+    worker_group: tuple[Path, ...] | None,
+) -> int:
+    """
+    Remove and return the ready render the given idle worker should execute next.
+
+    Renders sharing the same sources (a group) stick to the worker that started
+    the group, so each worker process only decode the sources of its own groups.
+    By priority, a worker takes a render:
+
+    - of the group it executed last, whose sources are still decoded.
+    - of another group it owns.
+    - of a group no worker started yet, which it then own.
+    - of a group owned by another worker, only to not stay idle.
+
+    Inside each priority, the most expensive render is taken first.
+
+    Args:
+        ready: (negative cost, render index) of the renders ready to start.
+        groups: for each render, the group it belongs to.
+        owners: worker index owning each group; updated in-place.
+        worker: index of the idle worker.
+        worker_group: group of the render the worker executed last.
+    """
+
+    def _get_priority(item: tuple[float, int]) -> tuple[int, float, int]:
+        group = groups[item[1]]
+        if group == worker_group:
+            rank = 0
+        elif owners.get(group) == worker:
+            rank = 1
+        elif group not in owners:
+            rank = 2
+        else:
+            rank = 3
+        return rank, *item
+
+    item = min(ready, key=_get_priority)
+    ready.remove(item)
+    index = item[1]
+    owners.setdefault(groups[index], worker)
+    return index
+
+
+def run_renders(
+    renders: list[ComparisonRender],
+    engine: RenderEngine = RenderEngine.oiiotool,
+    cache: RenderCache | None = None,
+    max_workers: int | None = None,
+    max_writers: int = 2,
+):
+    """
+    Generate all the given renders to disk, in parallel, respecting their dependencies.
+
+    Renders that are ready to start are executed from the most expensive to the
+    cheapest so the longest tasks don't end up running alone at the end.
+
+    Each worker is a dedicated process, and renders sharing the same sources are
+    preferably executed by the same worker (see :func:`_pop_ready_render`).
+    When a worker still has to help with the sources of another, it reads them
+    already decoded from a temporary directory shared by all the workers, so
+    each source is only decoded once.
+
+    Renders generated in memory are encoded by the worker processes, which also
+    search the quality of targeted encodings, then written to disk by a
+    :class:`WriteQueue` in this process so workers can start the next render
+    immediately. A render is only considered completed once written.
+
+    Args:
+        renders: renders to generate, potentially depending on each other.
+        engine: how to execute the image processing operations.
+        cache: optional cache to reuse previous identical renders from; entries
+            exceeding its max size are evicted as renders are stored, and once
+            all the renders completed.
+        max_workers: maximum number of renders running at the same time;
+            default to the number of CPU cores.
+        max_writers: number of threads writing encoded renders to disk.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    dependencies = get_render_dependencies(renders)
+    dependents: list[list[int]] = [[] for _ in renders]
+    for index, render_dependencies in enumerate(dependencies):
+        for dependency in render_dependencies:
+            dependents[dependency].append(index)
+    remaining = [len(render_dependencies) for render_dependencies in dependencies]
+
+    costs = [render.estimate_cost() for render in renders]
+    ready = [
+        (-costs[index], index) for index, count in enumerate(remaining) if not count
+    ]
+    groups = [tuple(render.src_paths) for render in renders]
+    group_remaining: dict[tuple[Path, ...], int] = {}
+    for group in groups:
+        group_remaining[group] = group_remaining.get(group, 0) + 1
+    owners: dict[tuple[Path, ...], int] = {}
+    worker_groups: list[tuple[Path, ...] | None] = [None] * max_workers
+    idle_workers = list(range(max_workers))
+
+    LOGGER.debug(f"🚦▶️ running {len(renders)} renders on {max_workers} processes")
+    completed = 0
+    writer = WriteQueue(max_workers=max_writers, max_pending=max_workers + max_writers)
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(writer)
+        shared_dir = stack.enter_context(
+            tempfile.TemporaryDirectory(prefix="lxmpicturelab-sources-")
+        )
+        SOURCE_IMAGES.shared_dir = shared_dir = Path(shared_dir)
+        stack.callback(setattr, SOURCE_IMAGES, "shared_dir", None)
+        # one single-process executor per worker to control which process
+        # execute each render
+        executors = [
+            stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(
+                    1,
+                    initializer=_init_worker,
+                    initargs=(shared_dir,),
+                )
+            )
+            for _ in range(max_workers)
+        ]
+        generating: dict[concurrent.futures.Future, tuple[int, int]] = {}
+        writing: dict[concurrent.futures.Future, int] = {}
+        while completed < len(renders):
+            while ready and idle_workers:
+                worker = idle_workers.pop(0)
+                index = _pop_ready_render(
+                    ready, groups, owners, worker, worker_groups[worker]
+                )
+                worker_groups[worker] = groups[index]
+                future = executors[worker].submit(
+                    _run_render, renders[index], engine, cache
+                )
+                generating[future] = (index, worker)
+
+            if not generating and not writing:
+                raise ValueError("circular dependencies found between renders")
+
+            done, _ = concurrent.futures.wait(
+                list(generating) + list(writing),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception:
+                    for other in list(generating) + list(writing):
+                        other.cancel()
+                    raise
+
+                if future in generating:
+                    index, worker = generating.pop(future)
+                    idle_workers.append(worker)
+                    duration, files, stored_size = result
+                    render = renders[index]
+                    LOGGER.debug(
+                        f"generated '{render.dst_path}' in {duration:.1f}s "
+                        f"on worker {worker}"
+                    )
+                    if files is not None:
+                        # block when too many renders are waiting to be written
+                        write = writer.submit(
+                            _write_render, render, files, engine, cache
+                        )
+                        writing[write] = index
+                        continue
+                else:
+                    index = writing.pop(future)
+                    stored_size = result
+                    LOGGER.debug(f"written '{renders[index].dst_path}'")
+
+                if cache and stored_size:
+                    cache.add_stored_size(stored_size)
+                completed += 1
+                group = groups[index]
+                group_remaining[group] -= 1
+                if not group_remaining[group]:
+                    for src_path in group:
+                        SOURCE_IMAGES.remove_shared(src_path)
+                for dependent in dependents[index]:
+                    remaining[dependent] -= 1
+                    if not remaining[dependent]:
+                        ready.append((-costs[dependent], dependent))
+
+    if cache:
+        # trim what was stored since the last eviction
+        cache.evict()
+    LOGGER.debug(f"🚦✅ completed {completed} renders")
@@ -1,6 +1,10 @@
+import concurrent.futures
 import contextlib
+import runpy
 import sys
 import time
+from pathlib import Path
+from typing import Any
 from typing import Callable
 
 
@@ -41,3 +45,47 @@ def patch_sysargv(new_argv: list[str] | None = None):
         yield
     finally:
         sys.argv = backup
+
+
+_SCRIPT_CONTEXT: dict[str, Any] = {}
+
+
+def _load_script(script_path: Path):
+    _SCRIPT_CONTEXT.clear()
+    _SCRIPT_CONTEXT.update(runpy.run_path(str(script_path), run_name="__passthrough__"))
+
+
+def _run_script_main(argv: list[str]):
+    _SCRIPT_CONTEXT["main"](argv)
+
+
+def run_script_batch(
+    script_path: Path,
+    argvs: list[list[str]],
+    max_workers: int | None = None,
+):
+    """
+    Call the ``main(argv)`` function of the given script for each argv, in parallel processes.
+
+    The script is only loaded once per process so anything it caches at the
+    module level is shared between the calls executed by that process.
+
+    Args:
+        script_path: filesystem path to an existing python script defining a
+            ``main(argv: list[str])`` function.
+        argvs: command line arguments of each call.
+        max_workers: maximum number of processes; default to the number of CPU cores.
+
+    Raises:
+        the first exception raised by a call, once all the calls finished.
+    """
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers,
+        initializer=_load_script,
+        initargs=(script_path,),
+    ) as executor:
+        futures = [executor.submit(_run_script_main, argv) for argv in argvs]
+        concurrent.futures.wait(futures)
+
+    for future in futures:
+        future.result()
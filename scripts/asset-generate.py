@@ -1,29 +1,96 @@
 import argparse
+import functools
 import json
 import logging
 import os
 import shutil
-import subprocess
 import sys
+import tempfile
 from pathlib import Path
 
+import OpenImageIO as oiio
+import PyOpenColorIO as ocio
+
 import lxmpicturelab
 from lxmpicturelab.browse import ASSET_DIR
 from lxmpicturelab.browse import WORKBENCH_DIR
 from lxmpicturelab.download import download_file
 from lxmpicturelab.browse import ImageAsset
+from lxmpicturelab.cache import hash_file
+from lxmpicturelab.cache import hash_object
+from lxmpicturelab.imagebufio import imagebuf_colormatrix
+from lxmpicturelab.imagebufio import imagebuf_export
+from lxmpicturelab.imagebufio import imagebuf_read
 
 # to upgrade at each code change that affect the data writen to the output image
 __version__ = f"2-{lxmpicturelab.__version__}"
 
 LOGGER = logging.getLogger(Path(__file__).stem)
 
-OIIOTOOL_PATH = Path(shutil.which("oiiotool"))
-assert OIIOTOOL_PATH.exists()
-
 WORKBENCH_DIR.mkdir(exist_ok=True)
 WORK_DIR = WORKBENCH_DIR / "asset-in-ingest"
 
+INGEST_HASH_NAME = "__ingest_hash__"
+INGEST_HASH_METADATA = f"{lxmpicturelab.METADATA_PREFIX}/{INGEST_HASH_NAME}"
+
+
+def _check_imagebuf(buf: oiio.ImageBuf) -> oiio.ImageBuf:
+    if buf.has_error:
+        raise RuntimeError(f"(OIIO) ImageBuf has errors: {buf.geterror()}")
+    return buf
+
+
+@functools.lru_cache(maxsize=4)
+def _read_ocio_config(config_path: Path, mtime: int) -> ocio.Config:
+    # mtime is only used to invalidate the cache
+    LOGGER.debug(f"reading ocio config '{config_path}'")
+    # noinspection PyArgumentList
+    return ocio.Config.CreateFromFile(str(config_path))
+
+
+@functools.lru_cache(maxsize=16)
+def _get_ocio_processor(
+    config_path: Path,
+    mtime: int,
+    src_colorspace: str,
+    dst_colorspace: str,
+) -> ocio.CPUProcessor:
+    config = _read_ocio_config(config_path, mtime)
+    processor = config.getProcessor(src_colorspace, dst_colorspace)
+    return processor.getDefaultCPUProcessor()
+
+
+def imagebuf_ocio_convert(
+    buf: oiio.ImageBuf,
+    ocio_config_path: Path,
+    src_colorspace: str,
+    dst_colorspace: str,
+    batch_size: int = 2**20,
+) -> oiio.ImageBuf:
+    """
+    Convert the given R,G,B float image between colorspaces of the given config.
+
+    The config is parsed once per process and shared by all the images converted.
+
+    Returns:
+        a new ImageBuf instance.
+    """
+    processor = _get_ocio_processor(
+        ocio_config_path,
+        ocio_config_path.stat().st_mtime_ns,
+        src_colorspace,
+        dst_colorspace,
+    )
+    pixels = buf.get_pixels(oiio.FLOAT)
+    # process by batches to bound OCIO temporary allocations
+    flat_pixels = pixels.reshape(-1, 3)
+    for start in range(0, len(flat_pixels), batch_size):
+        processor.applyRGB(flat_pixels[start : start + batch_size])
+
+    converted = oiio.ImageBuf(buf.spec())
+    converted.set_pixels(buf.roi, pixels)
+    return _check_imagebuf(converted)
+
 
 def optimize_asset(
     source_asset: ImageAsset,
@@ -34,6 +101,7 @@ def optimize_asset(
     color_matrix: list[float] = None,
     max_width: int = 2204,
     max_height: int = 1504,
+    ingest_hash: str | None = None,
 ):
     """
     Create an optimized OpenEXR out of the given source ImageryAsset.
@@ -47,6 +115,9 @@ def optimize_asset(
     - not wider than a given maximum width
     - plates are 16bit half float and CGI is 32bit float
 
+    The image is processed in the current process, equivalent to the oiiotool
+    command ``--ch R,G,B --ccmatrix:transpose=1 --colorconvert --fit:filter=cubic``.
+
     Args:
         source_asset:
         target_path:
@@ -56,36 +127,21 @@ def optimize_asset(
         color_matrix: optional 3x3 matrix to perform color-conversion
         max_width: in pixels
         max_height: in pixels
+        ingest_hash: optional identifier of the ingest inputs, stored in the
+            exr metadata; see :func:`get_ingest_hash`.
     """
     asset_metadata: dict = source_asset.metadata.to_dict()
 
-    command = [
-        str(OIIOTOOL_PATH),
-        str(source_asset.image_path),
-    ]
-
-    # call oiiotool a first time to retrieve the image width/height
-    # (we could have used --if condition with OIIO>2.4)
-    size_command = command + ["--echo", "{TOP.width}", "--echo", "{TOP.height}"]
-    LOGGER.debug(f"subprocess.run({size_command!r})")
-    asset_size = subprocess.check_output(size_command, text=True)
-    asset_size = asset_size.split("\n")
-    asset_width = int(asset_size[0])
-    asset_height = int(asset_size[1])
+    buf = imagebuf_read(source_asset.image_path)
+    # the size is read from the header, no need for a separate probe
+    asset_width, asset_height = buf.spec().width, buf.spec().height
 
     # strip alpha and other extra channels
-    command += [
-        "--ch",
-        "R,G,B",
-    ]
+    buf = _check_imagebuf(oiio.ImageBufAlgo.channels(buf, ("R", "G", "B")))
 
     if color_matrix:
-        _color_matrix = ",".join(map(str, color_matrix))
-        LOGGER.debug(f"[optimize] using color-matrix '{_color_matrix}'")
-        command += [
-            "--ccmatrix:transpose=1",
-            _color_matrix,
-        ]
+        LOGGER.debug(f"[optimize] using color-matrix '{color_matrix}'")
+        buf = imagebuf_colormatrix(buf, color_matrix)
 
     # color conversion with OCIO
     if source_ocio_colorspace:
@@ -93,72 +149,83 @@ def optimize_asset(
             f"[optimize] using color-conversion "
             f"'{source_ocio_colorspace}'>'{dst_ocio_colorspace}'"
         )
-        command += [
-            "--colorconfig",
-            str(ocio_config_path),
-            "--colorconvert",
-            source_ocio_colorspace,
-            dst_ocio_colorspace,
-        ]
+        buf = imagebuf_ocio_convert(
+            buf,
+            ocio_config_path=ocio_config_path,
+            src_colorspace=source_ocio_colorspace,
+            dst_colorspace=dst_ocio_colorspace,
+        )
 
     # rescale if larger than max_width/max_height
-    command += [
-        "--fit:filter=cubic",
-        f"{min(asset_width, max_width)}x{min(asset_height, max_height)}",
-        # reset display windows to data window
-        "--fullpixels",
-        "--origin",
-        "+0+0",
-        "--fullsize",
-        "+0+0",
-    ]
+    fit_width = min(asset_width, max_width)
+    fit_height = min(asset_height, max_height)
+    roi = oiio.ROI(0, fit_width, 0, fit_height, 0, 1, 0, 3)
+    buf = _check_imagebuf(oiio.ImageBufAlgo.fit(buf, filtername="cubic", roi=roi))
+    # reset display windows to data window, at origin
+    spec = buf.specmod()
+    spec.x = spec.y = 0
+    spec.full_x = spec.full_y = 0
+    spec.full_width = spec.width
+    spec.full_height = spec.height
 
-    # OpenEXR configuration
-    # XXX: plates being generated from integer-based data we allow a lower bitdepth
-    bitdepth = "half" if source_asset.is_plate else "float"
-    command += [
-        "-d",
-        bitdepth,
-        "--compression",
-        "zip",
-    ]
     # metadata
-    command += [
-        "--evaloff",
-        "--wildcardoff",
-        "--attrib",
-        "ColorSpace",
-        dst_ocio_colorspace,
-        "--attrib",
-        "colorspace",
-        dst_ocio_colorspace,
-        "--attrib:type=float[8]",
+    spec.attribute("ColorSpace", dst_ocio_colorspace)
+    spec.attribute("colorspace", dst_ocio_colorspace)
+    spec.attribute(
         "chromaticities",
-        "0.7347,0.2653,0.0,1.0,0.0001,-0.077,0.32168,0.33767",
-        "--attrib",
-        f"{lxmpicturelab.METADATA_PREFIX}/__version__",
-        __version__,
-    ]
+        "float[8]",
+        (0.7347, 0.2653, 0.0, 1.0, 0.0001, -0.077, 0.32168, 0.33767),
+    )
+    spec.attribute(f"{lxmpicturelab.METADATA_PREFIX}/__version__", __version__)
+    if ingest_hash:
+        spec.attribute(INGEST_HASH_METADATA, ingest_hash)
     for metadata_name, metadata_value in asset_metadata.items():
-        command += [
-            "--attrib",
+        spec.attribute(
             f"{lxmpicturelab.METADATA_PREFIX}/{metadata_name}",
             json.dumps(metadata_value),
+        )
+
+    # OpenEXR configuration
+    # XXX: plates being generated from integer-based data we allow a lower bitdepth
+    bitdepth = "half" if source_asset.is_plate else "float"
+    imagebuf_export(buf, target_path=target_path, bitdepth=bitdepth, compression="zip")
+
+
+def get_ingest_hash(
+    source_asset: ImageAsset,
+    source_ocio_colorspace: str | None,
+    color_matrix: list[float] | None,
+) -> str:
+    """
+    Identify all the inputs that affect the optimized asset: the source image and
+    json content, the conversion options and the ingest version.
+    """
+    return hash_object(
+        [
+            hash_file(source_asset.image_path),
+            hash_file(source_asset.json_path),
+            source_ocio_colorspace,
+            color_matrix,
+            __version__,
         ]
-    # output
-    command += [
-        "-o",
-        str(target_path),
-    ]
-    environ = os.environ.copy()
-    environ["OCIO"] = str(ocio_config_path)
-    LOGGER.debug(f"subprocess.run({command!r})")
-    subprocess.run(command, check=True, env=environ)
+    )
+
+
+def read_ingest_hash(asset: ImageAsset) -> str | None:
+    """
+    Get the ingest hash stored in the given optimized asset image header, if any.
+    """
+    if not asset.image_path.exists():
+        return None
+    return asset.embedded_metadata.get(INGEST_HASH_NAME) or None
 
 
 def build_ocio_config(dst_dir: Path) -> Path:
     """
     Download the OCIO config for colrospace conversion with oiiotool.
+
+    Safe to call from concurrent processes: the config is downloaded to a
+    temporary file which is atomically renamed once complete.
     """
     config_url = "https://github.com/AcademySoftwareFoundation/OpenColorIO-Config-ACES/releases/download/v2.1.0-v2.2.0/studio-config-v2.1.0_aces-v1.3_ocio-v2.1.ocio"
     config_name = config_url.split("/")[-1]
@@ -169,7 +236,13 @@ def build_ocio_config(dst_dir: Path) -> Path:
         return config_path
 
     LOGGER.debug(f"downloading config to '{config_path}'")
-    download_file(config_url, config_path)
+    tmp_fd, tmp_path = tempfile.mkstemp(prefix=f".{config_name}.", dir=dst_dir)
+    os.close(tmp_fd)
+    try:
+        download_file(config_url, Path(tmp_path))
+        os.replace(tmp_path, config_path)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
     return config_path
 
 
@@ -200,10 +273,22 @@ def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
             "Peform manual color-conversion to ACES2065-1 by using a 3x3 color matrix."
         ),
     )
+    parser.add_argument(
+        "--ocio-config",
+        type=Path,
+        default=None,
+        help=(
+            "Filesystem path to an existing ACES studio-config to use instead of "
+            "downloading it to the work directory."
+        ),
+    )
     parser.add_argument(
         "--overwrite-existing",
         action="store_true",
-        help="If specified, existing assets will be overwritten.",
+        help=(
+            "If specified, existing assets will be overwritten even if their "
+            "sources and options didn't change."
+        ),
     )
     parsed = parser.parse_args(argv)
     return parsed
@@ -216,6 +301,7 @@ def main(argv: list[str] | None = None):
     u_colorspace: str | None = cli.colorspace
     u_overwrite_existing: bool = cli.overwrite_existing
     u_color_matrix: str | None = cli.color_matrix
+    u_ocio_config: Path | None = cli.ocio_config
 
     color_matrix = None
     if u_color_matrix:
@@ -233,12 +319,26 @@ def main(argv: list[str] | None = None):
 
     prefix = f"({src_asset.identifier})"
 
-    if dst_asset.json_path.exists() and not u_overwrite_existing:
-        LOGGER.info(f"⏩ {prefix} found existing asset; skipping")
+    if not src_asset.image_path.exists() and dst_asset.json_path.exists():
+        LOGGER.warning(
+            f"⏩ {prefix} source image not found, cannot check existing asset "
+            f"is up to date; skipping"
+        )
+        return
+
+    ingest_hash = get_ingest_hash(src_asset, u_colorspace, color_matrix)
+    is_unchanged = (
+        dst_asset.json_path.exists() and read_ingest_hash(dst_asset) == ingest_hash
+    )
+    if is_unchanged and not u_overwrite_existing:
+        LOGGER.info(f"⏩ {prefix} found unchanged existing asset; skipping")
         return
 
-    LOGGER.info(f"🔨 {prefix} building ocio config to '{WORK_DIR}'")
-    ocio_config_path = build_ocio_config(dst_dir=WORK_DIR)
+    if u_ocio_config:
+        ocio_config_path = u_ocio_config
+    else:
+        LOGGER.info(f"🔨 {prefix} building ocio config to '{WORK_DIR}'")
+        ocio_config_path = build_ocio_config(dst_dir=WORK_DIR)
 
     if dst_dir.exists():
         LOGGER.debug(f"rmtree({dst_dir})")
@@ -253,6 +353,7 @@ def main(argv: list[str] | None = None):
         ocio_config_path=ocio_config_path,
         source_ocio_colorspace=u_colorspace,
         color_matrix=color_matrix,
+        ingest_hash=ingest_hash,
     )
     LOGGER.debug(f"copy({src_asset.json_path}, {dst_asset.json_path})")
     shutil.copy(src_asset.json_path, dst_asset.json_path)
@@ -0,0 +1,384 @@
+"""
+Measure the duration of each stage of the comparison generation pipeline.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy
+import OpenImageIO as oiio
+import PyOpenColorIO as ocio
+
+import lxmpicturelab
+from lxmpicturelab.browse import REPO_ROOT
+from lxmpicturelab.browse import WORKBENCH_DIR
+from lxmpicturelab.comparison import BaseGenerator
+from lxmpicturelab.comparison import GeneratorExposureBands
+from lxmpicturelab.comparison import GeneratorFull
+from lxmpicturelab.comparison import RenderEngine
+from lxmpicturelab.comparison import SOURCE_IMAGES
+from lxmpicturelab.comparison import export_render
+from lxmpicturelab.imagebufio import imagebuf_read
+from lxmpicturelab.renderer import OcioConfigRenderer
+from lxmpicturelab.renderer import RENDERER_BUILDERS_BY_ID
+from lxmpicturelab.renderer import build_renderers
+
+LOGGER = logging.getLogger(Path(__file__).stem)
+
+WORK_DIR = WORKBENCH_DIR / "benchmark"
+RESULTS_DIR = WORKBENCH_DIR / "benchmark-results"
+
+# maximum mean absolute difference allowed between the output of 2 engines
+ENGINE_PARITY_TOLERANCE = 0.5 / 255
+# maximum absolute difference allowed on any pixel between the output of 2
+# engines; jpeg encoding alone can turn 1 code value of difference into 4.
+ENGINE_PARITY_MAX_TOLERANCE = 8 / 255
+
+
+class StageTimings:
+    """
+    Accumulate the duration of multiple named stages.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.durations[stage] = self.durations.get(stage, 0.0) + duration
+
+
+def generate_synthetic_image(width: int, height: int, dst_path: Path):
+    """
+    Write an ACES2065-1 OpenEXR with an exposure ramp horizontally and a hue
+    sweep vertically, covering the range of values of real assets.
+    """
+    exposure = 0.18 * 2 ** numpy.linspace(-8.0, 8.0, width, dtype=numpy.float32)
+    hue = numpy.linspace(0.0, 1.0, height, dtype=numpy.float32)[:, numpy.newaxis]
+    phases = numpy.array([0.0, 1 / 3, 2 / 3], dtype=numpy.float32)
+    # saturated but not pure primaries so all the renderers have work to do
+    colors = 0.5 + 0.45 * numpy.cos(2 * numpy.pi * (hue - phases))
+    pixels = colors[:, numpy.newaxis, :] * exposure[numpy.newaxis, :, numpy.newaxis]
+
+    buf = oiio.ImageBuf(pixels.astype(numpy.float32))
+    buf.specmod().attribute("compression", "zip")
+    buf.specmod().attribute("colorspace", "ACES2065-1")
+    LOGGER.debug(f"writing synthetic image to '{dst_path}'")
+    if not buf.write(str(dst_path), "half"):
+        raise RuntimeError(f"(OIIO) cannot write '{dst_path}': {buf.geterror()}")
+
+
+def benchmark_stages(
+    generator: GeneratorFull | GeneratorExposureBands,
+    src_path: Path,
+    dst_path: Path,
+    renderer: OcioConfigRenderer,
+) -> dict[str, float]:
+    """
+    Run the imagebuf pipeline of the generator with each of its stages timed.
+
+    The "bands" stage of the exposures generator exclude the display transform
+    applied on the bands.
+    """
+    # start from a cold decode like the first renderer of a real run
+    SOURCE_IMAGES.clear()
+    timings = StageTimings()
+    text_left, text_right = generator.get_texts(src_path, renderer)
+    buf = generator._render_imagebuf(
+        src_path=src_path,
+        renderer=renderer,
+        text_left=text_left,
+        text_right=text_right,
+        measure=timings.measure,
+    )
+    with timings.measure("encode"):
+        export_render(buf, dst_path)
+    if "bands" in timings.durations:
+        timings.durations["bands"] -= timings.durations["display"]
+    return timings.durations
+
+
+def benchmark_engine(
+    generator: BaseGenerator,
+    src_path: Path,
+    dst_path: Path,
+    renderer: OcioConfigRenderer,
+    engine: RenderEngine,
+) -> float:
+    """
+    Measure the whole generation of the given render with the given engine.
+    """
+    # start from a cold decode like the first renderer of a real run
+    SOURCE_IMAGES.clear()
+    start = time.perf_counter()
+    generator.run([src_path], dst_path, renderer, engine=engine)
+    return time.perf_counter() - start
+
+
+def get_image_difference(path_a: Path, path_b: Path) -> dict[str, float] | None:
+    """
+    Get the mean and maximum absolute difference between the pixels of 2 images.
+
+    Returns:
+        None if the images have different dimensions.
+    """
+    pixels_a = imagebuf_read(path_a).get_pixels(oiio.FLOAT)
+    pixels_b = imagebuf_read(path_b).get_pixels(oiio.FLOAT)
+    if pixels_a.shape != pixels_b.shape:
+        return None
+    difference = numpy.abs(pixels_a - pixels_b)
+    return {"mean": float(difference.mean()), "max": float(difference.max())}
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    sizes: list[tuple[int, int]],
+    generators: list[BaseGenerator],
+    renderers: list[OcioConfigRenderer],
+    engines: list[RenderEngine],
+    work_dir: Path,
+    repeat: int,
+) -> list[dict]:
+    """
+    Measure every generator x renderer combination on synthetic images of each size.
+
+    The minimum duration of all repetitions is kept for each measure. The output
+    of each engine is also compared to the output of the first engine.
+    """
+    results = []
+    for width, height in sizes:
+        src_path = work_dir / f"synthetic.{width}x{height}.exr"
+        if not src_path.exists():
+            generate_synthetic_image(width, height, src_path)
+
+        for generator in generators:
+            for renderer in renderers:
+                LOGGER.info(
+                    f"⏱️ {width}x{height} {generator.shortname} '{renderer.filename}'"
+                )
+                dst_name = f"{generator.shortname}.{renderer.filename}"
+                dst_path = work_dir / f"{dst_name}.jpg"
+                engine_paths = {
+                    engine: work_dir / f"{dst_name}.{engine.value}.jpg"
+                    for engine in engines
+                }
+                stages: dict[str, float] = {}
+                engine_totals: dict[str, float] = {}
+                for _ in range(repeat):
+                    durations = benchmark_stages(
+                        generator, src_path, dst_path, renderer
+                    )
+                    for stage, duration in durations.items():
+                        stages[stage] = min(stages.get(stage, duration), duration)
+                    for engine, engine_path in engine_paths.items():
+                        duration = benchmark_engine(
+                            generator, src_path, engine_path, renderer, engine
+                        )
+                        engine_totals[engine.value] = min(
+                            engine_totals.get(engine.value, duration), duration
+                        )
+
+                engine_differences: dict[str, dict[str, float] | None] = {}
+                for engine in engines[1:]:
+                    difference = get_image_difference(
+                        engine_paths[engines[0]], engine_paths[engine]
+                    )
+                    engine_differences[engine.value] = difference
+                    if (
+                        difference is None
+                        or difference["mean"] > ENGINE_PARITY_TOLERANCE
+                        or difference["max"] > ENGINE_PARITY_MAX_TOLERANCE
+                    ):
+                        LOGGER.warning(
+                            f"{engine.value} engine output differ from "
+                            f"{engines[0].value} engine: {difference=}"
+                        )
+
+                LOGGER.debug(f"{stages=}")
+                LOGGER.debug(f"{engine_totals=}")
+                LOGGER.debug(f"{engine_differences=}")
+                results.append(
+                    {
+                        "size": [width, height],
+                        "generator": generator.shortname,
+                        "generator_config": generator.to_dict(),
+                        "renderer": renderer.filename,
+                        "stages": stages,
+                        "engines": engine_totals,
+                        "engine_differences": engine_differences,
+                    }
+                )
+    return results
+
+
+def _parse_size(size: str) -> tuple[int, int]:
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
+    argv = argv or sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure the duration of each stage of the comparison generation, "
+            "on synthetic images, and write the results to json."
+        ),
+    )
+    parser.add_argument(
+        "--sizes",
+        type=_parse_size,
+        nargs="+",
+        default=[(1920, 1080), (4096, 2160)],
+        help="width x height of the synthetic images to generate, like '1920x1080'.",
+    )
+    parser.add_argument(
+        "--renderers",
+        type=str,
+        default=list(RENDERER_BUILDERS_BY_ID.keys()),
+        nargs="+",
+        choices=list(RENDERER_BUILDERS_BY_ID.keys()),
+        help="list of renderer identifier to benchmark.",
+    )
+    parser.add_argument(
+        "--renderer-dir",
+        type=Path,
+        default=WORKBENCH_DIR / "renderers",
+        help="filesystem path to a directory that may not exist.",
+    )
+    parser.add_argument(
+        "--generator-exposures",
+        type=float,
+        default=0.3,
+        help="band offset of the exposures generator.",
+    )
+    parser.add_argument(
+        "--generator-full",
+        type=int,
+        default=864,
+        help="height of the full generator.",
+    )
+    parser.add_argument(
+        "--engines",
+        type=str,
+        default=[engine.value for engine in RenderEngine],
+        nargs="*",
+        choices=[engine.value for engine in RenderEngine],
+        help="engines to measure the end-to-end duration of each render with.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of time to run each measure; the fastest is kept.",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=WORK_DIR,
+        help="filesystem path to a directory that may not exist, for intermediate files.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help=(
+            "filesystem path to the json file to write the results to; "
+            f"default to a file named after the date and commit in '{RESULTS_DIR}'."
+        ),
+    )
+    parsed = parser.parse_args(argv)
+    return parsed
+
+
+def main(argv: list[str] | None = None):
+    cli = get_cli(argv)
+    stime = time.time()
+
+    sizes: list[tuple[int, int]] = cli.sizes
+    renderer_ids: list[str] = cli.renderers
+    renderer_dir: Path = cli.renderer_dir
+    generator_exposures: float = cli.generator_exposures
+    generator_full: int = cli.generator_full
+    engines = [RenderEngine(engine) for engine in cli.engines]
+    repeat: int = cli.repeat
+    work_dir: Path = cli.work_dir
+    output_path: Path | None = cli.output
+
+    LOGGER.debug(f"{sizes=}")
+    LOGGER.debug(f"{renderer_ids=}")
+    LOGGER.debug(f"{engines=}")
+    LOGGER.debug(f"{repeat=}")
+    LOGGER.debug(f"{work_dir=}")
+
+    date = datetime.datetime.now()
+    commit = get_git_commit()
+    if not output_path:
+        output_name = f"{date:%Y%m%d-%H%M%S}.{(commit or 'unknown')[:8]}.json"
+        output_path = RESULTS_DIR / output_name
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+    LOGGER.info(f"🛠️ building {len(renderer_ids)} renderers to '{renderer_dir}'")
+    renderers = build_renderers(dst_dir=renderer_dir, renderer_ids=renderer_ids)
+    generators = [
+        GeneratorFull(generator_full),
+        GeneratorExposureBands(generator_exposures),
+    ]
+
+    results = run_benchmark(
+        sizes=sizes,
+        generators=generators,
+        renderers=renderers,
+        engines=engines,
+        work_dir=work_dir,
+        repeat=repeat,
+    )
+    report = {
+        "metadata": {
+            "date": date.isoformat(timespec="seconds"),
+            "commit": commit,
+            "lxmpicturelab": lxmpicturelab.__version__,
+            "oiio": oiio.VERSION_STRING,
+            "ocio": ocio.__version__,
+            "numpy": numpy.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    LOGGER.info(f"💾 writing results to '{output_path}'")
+    output_path.write_text(json.dumps(report, indent=4), encoding="utf-8")
+
+    LOGGER.info(f"✅ finished in {time.time() - stime:.1f}s")
+
+
+if __name__ == "__main__":
+    lxmpicturelab.configure_logging()
+    main()
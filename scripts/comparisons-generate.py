@@ -1,60 +1,183 @@
 import argparse
 import logging
-import runpy
+import os
 import shutil
 import sys
 import time
 from pathlib import Path
 
 import lxmpicturelab
-from lxmpicturelab import patch_sysargv
 from lxmpicturelab.browse import WORKBENCH_DIR
+from lxmpicturelab.asset import ImageAsset
 from lxmpicturelab.browse import find_asset
+from lxmpicturelab.cache import RenderCache
 from lxmpicturelab.comparison import BaseGenerator
 from lxmpicturelab.comparison import ComparisonRender
 from lxmpicturelab.comparison import ComparisonSession
+from lxmpicturelab.comparison import GeneratorCombined
 from lxmpicturelab.comparison import GeneratorExposureBands
 from lxmpicturelab.comparison import GeneratorFull
+from lxmpicturelab.comparison import RenderEngine
+from lxmpicturelab.encoding import ImageEncoding
+from lxmpicturelab.encoding import ImageFormat
 from lxmpicturelab.renderer import OcioConfigRenderer
 from lxmpicturelab.renderer import RENDERER_BUILDERS_BY_ID
+from lxmpicturelab.renderer import bake_renderer
+from lxmpicturelab.renderer import build_renderers
+from lxmpicturelab.scheduler import run_renders
 
 LOGGER = logging.getLogger(Path(__file__).stem)
 
 THISDIR = Path(__file__).parent
 
-RENDERER_SCRIPT = THISDIR / "renderer-build.py"
-
 WORKBENCH_DIR.mkdir(exist_ok=True)
 WORK_DIR = WORKBENCH_DIR / "comparisons"
 WORK_DIR.mkdir(exist_ok=True)
+CACHE_DIR = WORKBENCH_DIR / "render-cache"
 
 
-def build_renderers(
-    dst_dir: Path,
+def bake_renderers(
+    renderers: list[OcioConfigRenderer],
     renderer_ids: list[str],
-    overwrite: bool = False,
+    renderers_dir: Path,
+    max_error: float,
 ) -> list[OcioConfigRenderer]:
     """
+    Swap the given renderers to their baked LUT mode if their error is acceptable.
+
+    Args:
+        renderers: renderers as returned by build_renderers
+        renderer_ids: identifier of the renderers to try baking
+        renderers_dir: same directory given to build_renderers
+        max_error: maximum absolute error tolerated for the baked LUT.
+    """
+    baked_renderers = []
+    for renderer in renderers:
+        if renderer.filename not in renderer_ids:
+            baked_renderers.append(renderer)
+            continue
+
+        lut_path = renderers_dir / renderer.filename / f"{renderer.filename}.lut.npz"
+        baked = bake_renderer(renderer, lut_path=lut_path)
+        error = baked.get_lut().max_error
+        if error > max_error:
+            domain_error = baked.get_lut().domain_max_error
+            LOGGER.warning(
+                f"baked LUT of '{renderer.filename}' has an error of {error:.5f} "
+                f"({domain_error:.5f} inside its domain) above {max_error}; "
+                f"using exact OCIO transforms."
+            )
+            baked_renderers.append(renderer)
+        else:
+            LOGGER.info(f"🧊 using baked LUT for '{renderer.filename}' ({error=:.5f})")
+            baked_renderers.append(baked)
+
+    return baked_renderers
+
+
+def get_generators(
+    generator_exposure: float | None,
+    generator_full: int | None,
+    generator_full_variants: list[int] | None = None,
+) -> list[BaseGenerator]:
+    generators: list[BaseGenerator] = []
+    if generator_exposure is not None:
+        generators.append(GeneratorExposureBands(generator_exposure))
+    if generator_full is not None:
+        generators.append(
+            GeneratorFull(generator_full, variant_heights=generator_full_variants or [])
+        )
+
+    if not generators:
+        LOGGER.warning("no generator created; did you forget --generator-XXX options ?")
+    return generators
+
+
+def plan_comparisons(
+    asset: ImageAsset,
+    renderers: list[OcioConfigRenderer],
+    generators: list[BaseGenerator],
+    target_dir: Path,
+    combined_renderers: bool = False,
+    encoding: ImageEncoding | None = None,
+) -> ComparisonSession:
+    """
+    Create all the renders to generate for the given asset, without running them.
+
     Args:
-        dst_dir: filesystem path to a directory that may exist
-        renderer_ids: list of renderer identifier to build and return
-        overwrite: still build the render even if it exists.
+        asset: asset to generate comparison for
+        renderers: renderers to process the asset with
+        generators: methods of generating the images
+        target_dir: filesystem path to a directory to write the renders to
+        combined_renderers: create an additional render for each generator which
+            combine the renders of all the renderers.
+        encoding: how to encode the renders, default to jpg.
+    """
+    session = ComparisonSession(asset=asset)
+    encoding = encoding or ImageEncoding()
+    suffix = encoding.format.suffix
+
+    for generator in generators:
+        generator_results: list[Path] = []
+        generator_name = generator.shortname
+        comparison_src_path = asset.image_path
+
+        for renderer in renderers:
+            generation_dst_name = (
+                f"{asset.identifier}.{generator_name}.{renderer.filename}{suffix}"
+            )
+            comparison_dst_path = target_dir / generation_dst_name
+            comparison = ComparisonRender(
+                generator=generator,
+                renderer=renderer,
+                src_paths=[comparison_src_path],
+                dst_path=comparison_dst_path,
+                encoding=encoding,
+            )
+            session.add_render(comparison)
+            generator_results.append(comparison_dst_path)
+
+        # this is an extra comparison but without renderer
+        if combined_renderers:
+            combined_name = f"{asset.identifier}.{generator_name}.__combined__{suffix}"
+            combined_path = target_dir / combined_name
+            comparison = ComparisonRender(
+                generator=GeneratorCombined(source_generator=generator_name),
+                renderer=None,
+                src_paths=generator_results,
+                dst_path=combined_path,
+                # the mosaic has as many pixels as all its sources combined
+                encoding=encoding.scaled(len(generator_results)),
+            )
+            session.add_render(comparison)
+
+    return session
+
+
+def get_encoding(cli: argparse.Namespace) -> ImageEncoding:
+    """
+    Get the encoding of the renders from the parsed command line.
     """
-    renderers: list[OcioConfigRenderer] = []
-    for renderer_id in renderer_ids:
-        renderer_dir = dst_dir / renderer_id
-        command = [renderer_id, str(renderer_dir)]
-        if overwrite:
-            command.append("--force-overwrite")
-        with patch_sysargv([str(RENDERER_SCRIPT)] + command):
-            runpy.run_path(str(RENDERER_SCRIPT), run_name="__main__")
+    return ImageEncoding(
+        format=ImageFormat(cli.format),
+        quality=cli.quality,
+        target_size=cli.target_size,
+        target_ssim=cli.target_ssim,
+    )
 
-        renderer_file = next(renderer_dir.glob("*.json"))
-        renderer_txt = renderer_file.read_text("utf-8")
-        renderer = OcioConfigRenderer.from_json(renderer_txt)
-        renderers.append(renderer)
 
-    return renderers
+def write_session(session: ComparisonSession, target_dir: Path) -> Path:
+    """
+    Write the metadata of the given session to the given directory.
+
+    Returns:
+        filesystem path to the written json file.
+    """
+    metadata: str = session.to_json(indent=4)
+    metadata_path = target_dir / f"{session.asset.identifier}.metadata.json"
+    LOGGER.info(f"writing metadata to '{metadata_path}'")
+    metadata_path.write_text(metadata, encoding="utf-8")
+    return metadata_path
 
 
 def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
@@ -93,6 +216,17 @@ def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
             "its height to the given size (in pixels)."
         ),
     )
+    parser.add_argument(
+        "--generator-full-variants",
+        type=int,
+        nargs="*",
+        default=[],
+        help=(
+            "Heights (in pixels) of additional downscaled copies of the "
+            "--generator-full images, resized from the same render. "
+            "Must be smaller than --generator-full."
+        ),
+    )
     parser.add_argument(
         "--combined-renderers",
         action="store_true",
@@ -101,6 +235,41 @@ def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
             "generated for each renderer."
         ),
     )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default=ImageFormat.jpeg.value,
+        choices=[image_format.value for image_format in ImageFormat],
+        help=(
+            "Image format to encode the renders to; 'avif' requires an "
+            "OpenImageIO build with libheif."
+        ),
+    )
+    encoding_group = parser.add_mutually_exclusive_group()
+    encoding_group.add_argument(
+        "--quality",
+        type=int,
+        default=None,
+        help="1-100 compression quality, default to the format's default.",
+    )
+    encoding_group.add_argument(
+        "--target-size",
+        type=int,
+        default=None,
+        help=(
+            "Automatically pick the highest quality whose file is under "
+            "the given size (in bytes)."
+        ),
+    )
+    encoding_group.add_argument(
+        "--target-ssim",
+        type=float,
+        default=None,
+        help=(
+            "Automatically pick the lowest quality whose structural similarity "
+            "with the unencoded render is above the given value (0-1 range)."
+        ),
+    )
     parser.add_argument(
         "--target-dir",
         type=Path,
@@ -118,6 +287,65 @@ def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
         action="store_true",
         help=("If specified, still build the render even if they exists."),
     )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default=RenderEngine.oiiotool.value,
+        choices=[engine.value for engine in RenderEngine],
+        help=(
+            "How to execute the image processing: 'oiiotool' spawn a subprocess "
+            "for each image; 'imagebuf' process them in the current python process; "
+            "'scanline' is like 'imagebuf' but stream the source images by strips "
+            "to bound memory usage."
+        ),
+    )
+    parser.add_argument(
+        "--baked-renderers",
+        type=str,
+        default=[],
+        nargs="+",
+        choices=list(RENDERER_BUILDERS_BY_ID.keys()),
+        help=(
+            "list of renderer identifier to approximate with a baked 3D LUT. "
+            "Only used with the 'imagebuf' and 'scanline' engines."
+        ),
+    )
+    parser.add_argument(
+        "--baked-max-error",
+        type=float,
+        default=round(1 / 255, 4),
+        help=(
+            "maximum absolute error, in display 0-1 range, of a baked LUT against "
+            "the exact OCIO transforms for it to be used instead of them. "
+            "Default to one 8-bit code value. As reference, views made of simple "
+            "curves and matrices bake with an error under 0.001, while ACES 1.0 SDR "
+            "measures ~0.02 inside the LUT domain and ~0.5 on strongly negative "
+            "out-of-gamut values the LUT clips; so it is always rejected."
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=CACHE_DIR,
+        help="filesystem path to a directory that may not exist, to cache renders in.",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=float,
+        default=5.0,
+        help="maximum size in GiB of the render cache before older renders are evicted.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="If specified, do not reuse previous renders and regenerate them all.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="maximum number of renders to generate in parallel.",
+    )
     parsed = parser.parse_args(argv)
     return parsed
 
@@ -131,22 +359,48 @@ def main(argv: list[str] | None = None):
     target_dir: Path | None = cli.target_dir
     generator_exposure: float | None = cli.generator_exposures
     generator_full: int | None = cli.generator_full
+    generator_full_variants: list[int] = cli.generator_full_variants
     combined_renderers: bool = cli.combined_renderers
     renderer_ids: list[str] = cli.renderers
     overwrite_renderers: bool = cli.overwrite_renderers
+    engine = RenderEngine(cli.engine)
+    baked_renderers: list[str] = cli.baked_renderers
+    baked_max_error: float = cli.baked_max_error
+    cache_dir: Path = cli.cache_dir
+    cache_max_size: float = cli.cache_max_size
+    no_cache: bool = cli.no_cache
+    jobs: int = cli.jobs
+    encoding = get_encoding(cli)
 
     LOGGER.debug(f"{asset_id=}")
     LOGGER.debug(f"{target_dir=}")
     LOGGER.debug(f"{renderer_work_dir=}")
     LOGGER.debug(f"{combined_renderers=}")
+    LOGGER.debug(f"{engine=}")
+    LOGGER.debug(f"{encoding=}")
+    LOGGER.debug(f"{cache_dir=}")
+    LOGGER.debug(f"{jobs=}")
 
     renderer_work_dir.mkdir(exist_ok=True)
     LOGGER.info(f"🛠️ building {len(renderer_ids)} renderers to '{renderer_work_dir}'")
     renderers = build_renderers(
         dst_dir=renderer_work_dir,
         renderer_ids=renderer_ids,
-        overwrite=overwrite_renderers,
+        force_overwrite=overwrite_renderers,
     )
+    if baked_renderers and engine == RenderEngine.oiiotool:
+        LOGGER.warning("baked renderers are ignored by the 'oiiotool' engine")
+    elif baked_renderers:
+        renderers = bake_renderers(
+            renderers=renderers,
+            renderer_ids=baked_renderers,
+            renderers_dir=renderer_work_dir,
+            max_error=baked_max_error,
+        )
+
+    if not encoding.format.is_supported():
+        LOGGER.error(f"'{encoding.format.value}' is not supported by OpenImageIO.")
+        sys.exit(1)
 
     asset = find_asset(asset_id)
     if not asset:
@@ -159,55 +413,24 @@ def main(argv: list[str] | None = None):
         shutil.rmtree(target_dir)
     target_dir.mkdir(exist_ok=True, parents=True)
 
-    generators: list[BaseGenerator] = []
-    if generator_exposure is not None:
-        generators.append(GeneratorExposureBands(generator_exposure))
-    if generator_full is not None:
-        generators.append(GeneratorFull(generator_full))
-
-    if not generators:
-        LOGGER.warning("no generator created; did you forget --generator-XXX options ?")
-
-    session = ComparisonSession(asset=asset)
-
-    for generator in generators:
-        generator_results: dict[str, Path] = {}
-        generator_name = generator.shortname
-        comparison_src_path = asset.image_path
-
-        for renderer in renderers:
-            generation_dst_name = (
-                f"{asset.identifier}.{generator_name}.{renderer.filename}.jpg"
-            )
-            comparison_dst_path = target_dir / generation_dst_name
-            comparison = ComparisonRender(
-                generator=generator,
-                renderer=renderer,
-                src_paths=[comparison_src_path],
-                dst_path=comparison_dst_path,
-            )
-            LOGGER.info(f"💫 generating '{comparison_dst_path}'")
-            comparison.run()
-            session.add_render(comparison)
+    generators = get_generators(
+        generator_exposure, generator_full, generator_full_variants
+    )
 
-        # this is an extra comparison but without renderer
-        if combined_renderers:
-            combined_name = f"{asset.identifier}.{generator_name}.__combined__.jpg"
-            combined_path = target_dir / combined_name
-            comparison = ComparisonRender(
-                generator=generator,
-                renderer=None,
-                src_paths=list(generator_results.values()),
-                dst_path=combined_path,
-            )
-            LOGGER.info(f"💫 generating combined image to '{combined_path}'")
-            comparison.run()
-            session.add_render(comparison)
+    cache = None
+    if not no_cache:
+        cache = RenderCache(cache_dir, max_size=int(cache_max_size * 1024**3))
 
-    metadata: str = session.to_json(indent=4)
-    metadata_path = target_dir / f"{asset.identifier}.metadata.json"
-    LOGGER.info(f"writing metadata to '{metadata_path}'")
-    metadata_path.write_text(metadata, encoding="utf-8")
+    session = plan_comparisons(
+        asset=asset,
+        renderers=renderers,
+        generators=generators,
+        target_dir=target_dir,
+        combined_renderers=combined_renderers,
+        encoding=encoding,
+    )
+    run_renders(session.renders, engine=engine, cache=cache, max_workers=jobs)
+    write_session(session, target_dir)
 
     LOGGER.info(f"✅ finished in {time.time() - stime:.1f}s")
 
@@ -1,10 +1,12 @@
 import logging
+import os
 import runpy
 from pathlib import Path
 
-from lxmpicturelab import patch_sysargv
+import lxmpicturelab
 from lxmpicturelab.browse import ASSET_IN_DIR
 from lxmpicturelab.browse import SCRIPTS_DIR
+from lxmpicturelab.utils import run_script_batch
 
 LOGGER = logging.getLogger(__name__)
 
@@ -12,6 +14,9 @@ ASSET_SCRIPT = SCRIPTS_DIR / "asset-generate.py"
 
 OVERWRITE: bool = False
 
+# maximum number of assets ingested in parallel
+JOBS: int = os.cpu_count() or 1
+
 # - file without colorspace are assumed to be already ACES2065-1
 # - colorspace value must be a name found in the ACES studio-config v2.0.0
 ASSETS_IN: dict[Path, list[str]] = {
@@ -51,9 +56,24 @@ ASSETS_IN: dict[Path, list[str]] = {
     ],
 }
 
-for asset_path, extra_args in ASSETS_IN.items():
-    command = [str(asset_path)] + extra_args
-    if OVERWRITE:
-        command += ["--overwrite-existing"]
-    with patch_sysargv([str(ASSET_SCRIPT)] + command):
-        runpy.run_path(str(ASSET_SCRIPT), run_name="__main__")
+
+def main():
+    # download the config once, before the assets need it concurrently
+    asset_script = runpy.run_path(str(ASSET_SCRIPT), run_name="__passthrough__")
+    ocio_config_path = asset_script["build_ocio_config"](asset_script["WORK_DIR"])
+
+    commands = []
+    for asset_path, extra_args in ASSETS_IN.items():
+        command = [str(asset_path)] + extra_args
+        command += ["--ocio-config", str(ocio_config_path)]
+        if OVERWRITE:
+            command += ["--overwrite-existing"]
+        commands.append(command)
+
+    LOGGER.info(f"ingesting {len(commands)} assets on {JOBS} processes")
+    run_script_batch(ASSET_SCRIPT, commands, max_workers=JOBS)
+
+
+if __name__ == "__main__":
+    lxmpicturelab.configure_logging()
+    main()
@@ -1,6 +1,5 @@
 import argparse
 import logging
-import shutil
 import sys
 import time
 from pathlib import Path
@@ -8,6 +7,7 @@ from pathlib import Path
 from lxmpicturelab import configure_logging
 from lxmpicturelab.renderer import RENDERER_BUILDERS
 from lxmpicturelab.renderer import RENDERER_BUILDERS_BY_ID
+from lxmpicturelab.renderer import build_renderer
 
 LOGGER = logging.getLogger(Path(__file__).stem)
 
@@ -58,24 +58,11 @@ def main(argv: list[str] | None = None):
         )
         sys.exit(1)
 
-    if u_target_dir.exists() and not u_force_overwrite:
-        LOGGER.debug(f"⏩ skiping existing renderer '{u_identifier}'")
-        return
-
-    if u_target_dir.exists():
-        shutil.rmtree(u_target_dir)
-    u_target_dir.mkdir()
-
-    builder = BuilderT(path=u_target_dir)
-
-    LOGGER.info(f"🛠️ building renderer '{u_identifier};")
-    builder.build()
-
-    renderer = builder.get_renderer()
-    as_json = renderer.to_json(indent=4, sort_keys=True)
-    renderer_path = u_target_dir / f"{renderer.filename}.json"
-    LOGGER.info(f"💾 writing '{renderer_path}'")
-    renderer_path.write_text(as_json)
+    build_renderer(
+        identifier=u_identifier,
+        target_dir=u_target_dir,
+        force_overwrite=u_force_overwrite,
+    )
 
     LOGGER.info(f"✅ finished in {time.time() - stime:.1f}s")
 
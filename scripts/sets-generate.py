@@ -3,35 +3,40 @@ Generates sets which are combination of multiple assets.
 """
 
 import abc
+import concurrent.futures
 import dataclasses
 import json
 import logging
 import math
+import os
 import runpy
 import shutil
-import subprocess
+import threading
 from pathlib import Path
-from typing import Any
-from typing import Callable
+
+import numpy
+import OpenImageIO as oiio
 
 import lxmpicturelab
 from lxmpicturelab.browse import ASSET_DIR
 from lxmpicturelab.browse import SETS_DIR
-from lxmpicturelab.browse import get_asset
+from lxmpicturelab.browse import get_catalog
 from lxmpicturelab.asset import AssetMetadata
 from lxmpicturelab.asset import ImageAsset
 from lxmpicturelab.asset import AssetPrimaryColor
 from lxmpicturelab.asset import AssetType
-from lxmpicturelab.oiiotoolio import oiiotool_export
+from lxmpicturelab.cache import hash_file
+from lxmpicturelab.imagebufio import imagebuf_export
+from lxmpicturelab.imagebufio import imagebuf_read
+from lxmpicturelab.imagebufio import imagebuf_text
+from lxmpicturelab.scheduler import MemoryBudget
+from lxmpicturelab.scheduler import WriteQueue
 from lxmpicturelab.utils import timeit
 
 THISDIR = Path(__file__).parent
 
 LOGGER = logging.getLogger(Path(__file__).stem)
 
-OIIOTOOL_PATH = Path(shutil.which("oiiotool"))
-assert OIIOTOOL_PATH.exists()
-
 ASSET_INGEST_PATH = THISDIR / "asset-generate.py"
 _ASSET_INGEST = runpy.run_path(str(ASSET_INGEST_PATH), run_name="__passthrough__")
 # to upgrade at each code change that affect the data writen to the output image
@@ -39,6 +44,11 @@ __version__ = f"8-{_ASSET_INGEST['__version__']}"
 
 OVERWRITE_EXISTING = True
 
+PREVIEW_JPEG_QUALITY = 70
+
+# maximum amount of memory in bytes the set variants generated concurrently can use
+MEMORY_BUDGET = 8 * 1024**3
+
 
 @dataclasses.dataclass
 class SetVariant(abc.ABC):
@@ -47,17 +57,20 @@ class SetVariant(abc.ABC):
     description: str
     bg_color: tuple[float, float, float]
     asset_ids: list[str]
-    asset_sorter: Callable[[ImageAsset], Any] | None = None
+    # name of the AssetIndex fields to sort the assets by, else keep asset_ids order
+    asset_sort_by: tuple[str, ...] = ()
 
     def get_assets(self, root_dir: Path) -> list[ImageAsset]:
-        assets = [get_asset(assetid, root_dir) for assetid in self.asset_ids]
-        if self.asset_sorter:
-            assets = sorted(assets, key=self.asset_sorter)
+        index = get_catalog(root_dir).get_index()
+        assets = index.query(sort_by=self.asset_sort_by, identifier=self.asset_ids)
+        if len(assets) != len(self.asset_ids):
+            found = {asset.identifier for asset in assets}
+            missing = [asset_id for asset_id in self.asset_ids if asset_id not in found]
+            raise ValueError(f"assets not found in '{root_dir}': {missing}")
         return assets
 
 
-def _sort_assets_color(asset: ImageAsset):
-    return asset.metadata.type.value, asset.metadata.primary_color, asset.identifier
+SORT_BY_COLOR = ("type", "primary_color", "identifier")
 
 
 ALL_ASSETS = [
@@ -95,7 +108,7 @@ SET_VARIANTS = [
         description="A collection of heterogeneous images from various physical or virtual capture devices.",
         bg_color=(0, 0, 0),
         asset_ids=ALL_ASSETS,
-        asset_sorter=_sort_assets_color,
+        asset_sort_by=SORT_BY_COLOR,
     ),
     SetVariant(
         identifier="lxmpicturelab.al.sorted-color.bg-midgrey",
@@ -105,11 +118,157 @@ SET_VARIANTS = [
         ),
         bg_color=(0.18, 0.18, 0.18),
         asset_ids=ALL_ASSETS,
-        asset_sorter=_sort_assets_color,
+        asset_sort_by=SORT_BY_COLOR,
     ),
 ]
 
 
+def _check_imagebuf(buf: oiio.ImageBuf) -> oiio.ImageBuf:
+    if buf.has_error:
+        raise RuntimeError(f"(OIIO) ImageBuf has errors: {buf.geterror()}")
+    return buf
+
+
+_TILES: dict[tuple[str, str, int, int, str], tuple[numpy.ndarray, int, int]] = {}
+"""
+Process-wide cache of the assets fitted to a tile, shared by all the set variants.
+
+Keyed by (image content hash, identifier, tile width, tile height, filter name).
+"""
+
+_TILES_LOCK = threading.Lock()
+# ensure a tile is only fitted once when requested by concurrent variants
+_TILE_LOCKS: dict[tuple[str, str, int, int, str], threading.Lock] = {}
+
+
+def get_tile(
+    asset: ImageAsset,
+    tile_width: int,
+    tile_height: int,
+    filtername: str = "cubic",
+) -> tuple[numpy.ndarray, int, int]:
+    """
+    Fit the given asset in a tile, preserving its aspect ratio, with its identifier
+    written at the bottom-left.
+
+    Equivalent of oiiotool ``--fit:filter={filtername} --ch R,G,B,A=1.0 --text``.
+
+    The result is cached for the lifetime of the process, as long as the image
+    content doesn't change.
+
+    Returns:
+        the R,G,B,A pixels of the fitted image, and its x, y offset in the tile.
+    """
+    image_path = asset.image_path
+    key = (
+        hash_file(image_path),
+        asset.identifier,
+        tile_width,
+        tile_height,
+        filtername,
+    )
+    with _TILES_LOCK:
+        tile_lock = _TILE_LOCKS.setdefault(key, threading.Lock())
+
+    with tile_lock:
+        if key in _TILES:
+            LOGGER.debug(f"reusing fitted tile of '{image_path}'")
+            return _TILES[key]
+        _TILES[key] = _fit_tile(
+            asset, tile_width=tile_width, tile_height=tile_height, filtername=filtername
+        )
+    return _TILES[key]
+
+
+def _fit_tile(
+    asset: ImageAsset,
+    tile_width: int,
+    tile_height: int,
+    filtername: str,
+) -> tuple[numpy.ndarray, int, int]:
+    image_path = asset.image_path
+    LOGGER.debug(f"fitting '{image_path}' to {tile_width}x{tile_height}")
+    buf = imagebuf_read(image_path)
+    roi = oiio.ROI(0, tile_width, 0, tile_height, 0, 1, 0, buf.spec().nchannels)
+    buf = oiio.ImageBufAlgo.fit(buf, filtername=filtername, roi=roi)
+    x, y = buf.spec().x, buf.spec().y
+    pixels = numpy.ones((buf.spec().height, buf.spec().width, 4), numpy.float32)
+    pixels[..., :3] = buf.get_pixels(oiio.FLOAT)[..., :3]
+
+    tile = oiio.ImageBuf(pixels)
+    # bottom-left text with 30px margin
+    imagebuf_text(
+        tile, 30, tile.spec().height - 15, asset.identifier, size=20, shadow=4
+    )
+    return tile.get_pixels(oiio.FLOAT), x, y
+
+
+def composite_mosaic(
+    tiles: list[tuple[numpy.ndarray, int, int]],
+    columns: int,
+    rows: int,
+    tile_width: int,
+    tile_height: int,
+    mosaic_gap_size: int,
+    margins: int,
+    header_height: int,
+    background_color: tuple[float, float, float],
+) -> numpy.ndarray:
+    """
+    Composite the given tiles in a grid, from top-left to bottom-right, over a
+    background.
+
+    Returns:
+        R,G,B,A pixels of the mosaic, fully opaque.
+    """
+    width = columns * tile_width + (columns - 1) * mosaic_gap_size + 2 * margins
+    height = rows * tile_height + (rows - 1) * mosaic_gap_size + 2 * margins
+    height += header_height
+    canvas = numpy.empty((height, width, 4), numpy.float32)
+    canvas[..., :3] = background_color
+    canvas[..., 3] = 1.0
+
+    for index, (pixels, x, y) in enumerate(tiles):
+        row, column = divmod(index, columns)
+        x += margins + column * (tile_width + mosaic_gap_size)
+        y += margins + header_height + row * (tile_height + mosaic_gap_size)
+        region = canvas[y : y + pixels.shape[0], x : x + pixels.shape[1]]
+        # premultiplied "over" the opaque background, the text shadow is transparent
+        region *= 1.0 - pixels[..., 3:]
+        region += pixels
+
+    return canvas
+
+
+def estimate_mosaic_memory(
+    tile_count: int,
+    mosaic_columns: int = 5,
+    tile_width: int = 1102,
+    tile_height: int = 752,
+    channels: int = 4,
+    channel_bytes: int = 4,
+) -> int:
+    """
+    Estimate the peak amount of memory in bytes used to generate a mosaic and its preview.
+
+    Accounts for the fitted tiles, the canvas, its copy to an ImageBuf for
+    writing, and the preview converted from it. Gaps, margins
+    and header are neglected.
+
+    Args:
+        tile_count: number of assets in the mosaic
+        mosaic_columns: max number of columns
+        tile_width: width each image (tile) is fitted in
+        tile_height: height each image (tile) is fitted in
+        channels: number of channels of the mosaic
+        channel_bytes: size in bytes of a single channel value
+    """
+    rows = math.ceil(tile_count / mosaic_columns)
+    columns = min(tile_count, mosaic_columns)
+    tile_size = tile_width * tile_height * channels * channel_bytes
+    return tile_count * tile_size + 3 * rows * columns * tile_size
+
+
 def generate_mosaic(
     dst_asset: ImageAsset,
     src_assets: list[ImageAsset],
@@ -120,9 +279,15 @@ def generate_mosaic(
     mosaic_gap_size: int = 20,
     margins: int = 20,
     background_color: tuple[float, float, float] = (0, 0, 0),
+    tile_filter: str = "cubic",
+    preview_path: Path | None = None,
 ):
     """
 
+    The assets are fitted to their tile only once per process (see :func:`get_tile`),
+    so generating the same assets with another background only composite and
+    encode them again.
+
     Args:
         dst_asset: the asset configuration of the mosaic to create
         src_assets: list of image asset to build the mosaic with
@@ -133,11 +298,14 @@ def generate_mosaic(
         mosaic_gap_size: internal gap in pixels between each tile of the mosaic
         margins: space in pixels between the border of the image and the tiles
         background_color:
+        tile_filter: name of the OpenImageIO filter to fit the images with
+        preview_path:
+            optional filesystem path to a jpeg file that may exist, to write a
+            preview of the mosaic to, concurrently with the mosaic itself.
     """
     header_height = 150
     header_title = f"{dst_asset.image_path.stem} v{__version__}"
     header_disclaimer_txt = "all images belongs to their respective owner, credits viewable in the metadata."
-    bg_color = ",".join(map(str, background_color))
 
     if len(src_assets) <= mosaic_columns:
         tiles_w, tiles_h = (len(src_assets), 1)
@@ -145,46 +313,32 @@ def generate_mosaic(
         tiles_w = mosaic_columns
         tiles_h = math.ceil(len(src_assets) / mosaic_columns)
 
-    command: list[str] = [str(OIIOTOOL_PATH)]
-    for src_asset in src_assets:
-        command += [
-            "-i",
-            str(src_asset.image_path),
-            "--fit:filter=cubic",
-            f"{tile_width}x{tile_height}",
-            "--ch",
-            "R,G,B,A=1.0",
-            # bottom-left text with 30px margin
-            "--text:x={TOP.x+30}:y={TOP.height+TOP.y-15}:shadow=4:size=20",
-            f"{src_asset.identifier}",
-            # have the data-window cover the display-window
-            "--croptofull",
-        ]
-
-    # processing
-    command += [
-        f"--mosaic:pad={mosaic_gap_size}",
-        f"{tiles_w}x{tiles_h}",
-        f"--cut",
-        f"{{TOP.width+{margins * 2}}}x{{TOP.height+{margins * 2 + header_height}}}-{margins}-{margins + header_height}",
-        "--ch",
-        "R,G,B,A",
-    ]
-    command += [
-        "--create",
-        "{TOP.width}x{TOP.height}",
-        "4",
-        f"--fill:color={bg_color},1.0",
-        "{TOP.width}x{TOP.height}",
-        "--over",
+    tiles = [
+        get_tile(asset, tile_width, tile_height, filtername=tile_filter)
+        for asset in src_assets
     ]
+    canvas = composite_mosaic(
+        tiles,
+        columns=tiles_w,
+        rows=tiles_h,
+        tile_width=tile_width,
+        tile_height=tile_height,
+        mosaic_gap_size=mosaic_gap_size,
+        margins=margins,
+        header_height=header_height,
+        background_color=background_color,
+    )
+    buf = oiio.ImageBuf(canvas)
     # text header
-    command += [
-        f"--text:x={margins}:y=60:size=45",
-        header_title,
-        f"--text:x={margins}:y=95:size=25:color=0.4,0.4,0.4",
+    imagebuf_text(buf, margins, 60, header_title, size=45)
+    imagebuf_text(
+        buf,
+        margins,
+        95,
         header_disclaimer_txt,
-    ]
+        size=25,
+        color=(0.4, 0.4, 0.4, 1.0),
+    )
 
     # metadata
     authors: dict[str, list[str]] = {}
@@ -206,115 +360,149 @@ def generate_mosaic(
     LOGGER.debug(f"writing metadata to '{dst_asset.json_path}'")
     metadata.to_json_file(dst_asset.json_path, indent=4)
 
-    command += [
-        "--evaloff",
-        "--wildcardoff",
-        "--attrib",
-        f"{lxmpicturelab.METADATA_PREFIX}/__version__",
-        __version__,
-        "--attrib",
-        "ColorSpace",
-        "ACES2065-1",
-        "--attrib",
-        "colorspace",
-        "ACES2065-1",
-        "--attrib:type=float[8]",
+    spec = buf.specmod()
+    spec.channelnames = ("R", "G", "B", "A")
+    spec.alpha_channel = 3
+    spec.attribute(f"{lxmpicturelab.METADATA_PREFIX}/__version__", __version__)
+    spec.attribute("ColorSpace", "ACES2065-1")
+    spec.attribute("colorspace", "ACES2065-1")
+    spec.attribute(
         "chromaticities",
-        "0.7347,0.2653,0.0,1.0,0.0001,-0.077,0.32168,0.33767",
-    ]
+        "float[8]",
+        (0.7347, 0.2653, 0.0, 1.0, 0.0001, -0.077, 0.32168, 0.33767),
+    )
     for metadata_name, metadata_value in metadata.to_dict().items():
-        command += [
-            "--attrib",
+        spec.attribute(
             f"{lxmpicturelab.METADATA_PREFIX}/{metadata_name}",
             json.dumps(metadata_value),
-        ]
+        )
+
+    # the preview is converted before the export modify the mosaic spec
+    preview = generate_preview(buf) if preview_path else None
 
     # export
-    command += oiiotool_export(
-        dst_asset.image_path,
-        bitdepth="float",
-        compression="zips",
-    )
-    LOGGER.debug(f"subprocess.run({' '.join(command)})")
-    subprocess.run(command)
+    with WriteQueue(max_workers=2) as writer:
+        LOGGER.debug(f"imagebuf_export({dst_asset.image_path})")
+        futures = [
+            writer.submit(
+                imagebuf_export,
+                buf,
+                target_path=dst_asset.image_path,
+                bitdepth="float",
+                compression="zips",
+            )
+        ]
+        if preview:
+            LOGGER.debug(f"imagebuf_export({preview_path})")
+            futures.append(
+                writer.submit(
+                    imagebuf_export,
+                    preview,
+                    target_path=preview_path,
+                    bitdepth="uint8",
+                    compression=f"jpeg:{PREVIEW_JPEG_QUALITY}",
+                )
+            )
+    for future in futures:
+        future.result()
 
 
 def generate_preview(
-    mosaic_path: Path,
-    target_path: Path,
-    jpeg_compression: int = 70,
+    mosaic: oiio.ImageBuf,
     jpeg_subsampling: str = "4:4:4",
-):
-    command: list[str] = [
-        str(OIIOTOOL_PATH),
-        str(mosaic_path),
-    ]
-    command += [
-        # we assume OpenImageIO has been compiled with OCIO support
-        "--colorconvert",
-        "aces2065_1",
-        "g22_encoded_rec709",
-    ]
-    command += [
-        "--ch",
-        "R,G,B",
-        "--attrib",
-        "jpeg:subsampling",
-        jpeg_subsampling,
-    ]
-    command += oiiotool_export(
-        target_path,
-        bitdepth="uint8",
-        compression=f"jpeg:{jpeg_compression}",
+) -> oiio.ImageBuf:
+    """
+    Convert the given mosaic to a display-referred R,G,B image suitable for a jpeg.
+
+    Args:
+        mosaic: R,G,B,A image encoded in ACES2065-1.
+        jpeg_subsampling: chroma subsampling of the jpeg the preview is written to.
+
+    Returns:
+        a new ImageBuf instance.
+    """
+    # we assume OpenImageIO has been compiled with OCIO support
+    preview = oiio.ImageBufAlgo.colorconvert(mosaic, "aces2065_1", "g22_encoded_rec709")
+    _check_imagebuf(preview)
+    preview = _check_imagebuf(oiio.ImageBufAlgo.channels(preview, ("R", "G", "B")))
+    preview.specmod().attribute("jpeg:subsampling", jpeg_subsampling)
+    return preview
+
+
+def generate_variant(variant: SetVariant, variant_dir: Path, prefix: str):
+    """
+    Generate the mosaic and its preview for the given set variant.
+    """
+    assets = variant.get_assets(ASSET_DIR)
+    mosaic_path = variant_dir / f"{variant.identifier}.json"
+    mosaic_asset = ImageAsset(mosaic_path)
+
+    LOGGER.info(
+        f"💫 generating mosaic from {len(assets)} assets to '{mosaic_asset.image_path}'"
     )
-    LOGGER.debug(f"subprocess.run({' '.join(command)})")
-    subprocess.run(command, check=True)
+    with timeit(f"{prefix} ✅ generation took ", LOGGER.info):
+        generate_mosaic(
+            dst_asset=mosaic_asset,
+            src_assets=assets,
+            background_color=variant.bg_color,
+            description=variant.description,
+            preview_path=mosaic_path.with_suffix(".preview.jpg"),
+        )
 
 
 def main(
     dst_dir: Path,
     variants: list[SetVariant],
     overwrite_existing: bool = False,
+    memory_budget: int = MEMORY_BUDGET,
+    max_workers: int | None = None,
 ):
+    """
+    Generate the given set variants concurrently.
+
+    Variants run in threads so they share the fitted tiles cache; a variant
+    only starts once its estimated peak memory fits in the remaining budget.
 
+    Args:
+        dst_dir: filesystem path to a directory that may exist.
+        variants: set variants to generate.
+        overwrite_existing: True to delete and regenerate all the existing sets.
+        memory_budget: maximum amount of memory in bytes used by concurrent variants.
+        max_workers: maximum number of concurrent variants; default to the number
+            of CPU cores.
+    """
     if overwrite_existing and dst_dir.exists():
         LOGGER.debug(f"rmtree({dst_dir})")
         shutil.rmtree(dst_dir)
     dst_dir.mkdir(exist_ok=True)
 
-    for index, variant in enumerate(variants):
+    budget = MemoryBudget(memory_budget)
+    max_workers = max_workers or os.cpu_count() or 1
 
-        prefix = f"[{index + 1:0>2}/{len(variants):0>2}]"
+    def _generate(variant: SetVariant, variant_dir: Path, prefix: str):
+        size = estimate_mosaic_memory(len(variant.asset_ids))
+        LOGGER.debug(f"{prefix} reserving {size / 1024**3:.2f}GiB of {budget}")
+        with budget.reserve(size):
+            generate_variant(variant, variant_dir=variant_dir, prefix=prefix)
 
-        assets = variant.get_assets(ASSET_DIR)
-        bg_color = variant.bg_color
-        variant_name = variant.identifier
-        variant_dir = dst_dir / variant_name
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = []
+        for index, variant in enumerate(variants):
 
-        if variant_dir.exists() and not overwrite_existing:
-            LOGGER.info(f"{prefix} ❎ skipping existing set '{variant_name}'")
-            continue
+            prefix = f"[{index + 1:0>2}/{len(variants):0>2}]"
 
-        variant_dir.mkdir(exist_ok=True)
+            variant_name = variant.identifier
+            variant_dir = dst_dir / variant_name
 
-        mosaic_path = variant_dir / f"{variant_name}.json"
-        mosaic_asset = ImageAsset(mosaic_path)
+            if variant_dir.exists() and not overwrite_existing:
+                LOGGER.info(f"{prefix} ❎ skipping existing set '{variant_name}'")
+                continue
 
-        LOGGER.info(
-            f"💫 generating mosaic from {len(assets)} assets to '{mosaic_asset.image_path}'"
-        )
-        with timeit(f"{prefix} ✅ generation took ", LOGGER.info):
-            generate_mosaic(
-                dst_asset=mosaic_asset,
-                src_assets=assets,
-                background_color=bg_color,
-                description=variant.description,
-            )
-            preview_path = mosaic_path.with_suffix(".preview.jpg")
-            generate_preview(
-                mosaic_path=mosaic_asset.image_path,
-                target_path=preview_path,
-            )
+            variant_dir.mkdir(exist_ok=True)
+            futures.append(executor.submit(_generate, variant, variant_dir, prefix))
+
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
 
 
 if __name__ == "__main__":
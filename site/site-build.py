@@ -8,7 +8,6 @@ import runpy
 import shutil
 import sys
 import time
-from multiprocessing import Pool
 from typing import Any
 
 import unicodedata
@@ -18,12 +17,21 @@ from typing import Callable
 import jinja2
 
 import lxmpicturelab.renderer
-from lxmpicturelab import patch_sysargv
+from lxmpicturelab.asset import ImageAsset
 from lxmpicturelab.browse import SCRIPTS_DIR
+from lxmpicturelab.browse import find_asset
+from lxmpicturelab.cache import BuildManifest
+from lxmpicturelab.cache import RenderCache
+from lxmpicturelab.cache import hash_file
+from lxmpicturelab.cache import hash_object
 from lxmpicturelab.comparison import ComparisonRender
 from lxmpicturelab.comparison import ComparisonSession
 from lxmpicturelab.comparison import GeneratorCombined
+from lxmpicturelab.comparison import RenderEngine
+from lxmpicturelab.encoding import ImageEncoding
+from lxmpicturelab.encoding import ImageFormat
 from lxmpicturelab.renderer import OcioConfigRenderer
+from lxmpicturelab.scheduler import run_renders
 
 LOGGER = logging.getLogger(Path(__file__).stem)
 
@@ -31,26 +39,110 @@ THISDIR = Path(__file__).parent
 BUILDIR = THISDIR / ".build"
 WORKDIR = THISDIR / ".workbench"
 
-RENDERER_SCRIPT_PATH = SCRIPTS_DIR / "renderer-build.py"
 IMAGEGEN_SCRIPT_PATH = SCRIPTS_DIR / "comparisons-generate.py"
 __gen_ctx = runpy.run_path(str(IMAGEGEN_SCRIPT_PATH), run_name="__ignore__")
-IMAGEGEN_SCRIPT: Callable[[list[str]], None] = __gen_ctx["main"]
+IMAGEGEN_GET_CLI: Callable[[list[str]], argparse.Namespace] = __gen_ctx["get_cli"]
+IMAGEGEN_GET_GENERATORS = __gen_ctx["get_generators"]
+IMAGEGEN_PLAN = __gen_ctx["plan_comparisons"]
+IMAGEGEN_GET_ENCODING = __gen_ctx["get_encoding"]
+IMAGEGEN_WRITE_SESSION = __gen_ctx["write_session"]
+IMAGEGEN_CACHE_DIR: Path = __gen_ctx["CACHE_DIR"]
 
 ASSETS = {
-    "lxmpicturelab.al.sorted-color.bg-black": ["--generator-full", "2048"],
-    "CGts-W0L-sweep": ["--generator-full", "864"],
-    "CAlc-D8T-dragon": ["--generator-exposures", "0.45", "--generator-full", "864"],
-    "CAtm-FGH-specbox": ["--generator-full", "1080"],
-    "PAmsk-R65-christmas": ["--generator-exposures", "0.3", "--generator-full", "864"],
-    "PAfm-SWE-neongirl": ["--generator-exposures", "0.3", "--generator-full", "864"],
-    "PAkp-4DO-bluehand": ["--generator-full", "864"],
-    "PAtm-2QQ-space": ["--generator-exposures", "0.3", "--generator-full", "864"],
-    "PWarr-VWE-helenjohn": ["--generator-exposures", "0.1", "--generator-full", "864"],
-    "PAac-B01-skins": ["--generator-exposures", "0.01", "--generator-full", "864"],
-    "Pbri-H34-sunflower": ["--generator-exposures", "0.15", "--generator-full", "864"],
-    "Pgra-O1K-snowfire": ["--generator-exposures", "0.3", "--generator-full", "864"],
+    "lxmpicturelab.al.sorted-color.bg-black": [
+        "--generator-full",
+        "2048",
+        "--generator-full-variants",
+        "512",
+        "1024",
+    ],
+    "CGts-W0L-sweep": ["--generator-full", "864", "--generator-full-variants", "432"],
+    "CAlc-D8T-dragon": [
+        "--generator-exposures",
+        "0.45",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "CAtm-FGH-specbox": [
+        "--generator-full",
+        "1080",
+        "--generator-full-variants",
+        "540",
+    ],
+    "PAmsk-R65-christmas": [
+        "--generator-exposures",
+        "0.3",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "PAfm-SWE-neongirl": [
+        "--generator-exposures",
+        "0.3",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "PAkp-4DO-bluehand": [
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "PAtm-2QQ-space": [
+        "--generator-exposures",
+        "0.3",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "PWarr-VWE-helenjohn": [
+        "--generator-exposures",
+        "0.1",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "PAac-B01-skins": [
+        "--generator-exposures",
+        "0.01",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "Pbri-H34-sunflower": [
+        "--generator-exposures",
+        "0.15",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
+    "Pgra-O1K-snowfire": [
+        "--generator-exposures",
+        "0.3",
+        "--generator-full",
+        "864",
+        "--generator-full-variants",
+        "432",
+    ],
 }
 
+# preferred encodings of the comparison images, the first supported by the
+# OpenImageIO build is used; quality is picked per image to stay visually lossless.
+SITE_ENCODINGS = [
+    ImageEncoding(format=ImageFormat.avif, target_ssim=0.995),
+    ImageEncoding(format=ImageFormat.webp, target_ssim=0.995),
+    ImageEncoding(format=ImageFormat.jpeg),
+]
+
 # orders define visual order in which comparison are presented on the site
 RENDERERS = [
     lxmpicturelab.renderer.NativeBuilder,
@@ -136,13 +228,19 @@ class CtxRender:
     renderer_name: str
     renderer_id: str
     path: str
+    # (path, width) of all the available resolutions, including ``path``
+    srcset: list[tuple[str, int]] = dataclasses.field(default_factory=list)
 
     @classmethod
     def from_comparison(cls, comparison: ComparisonRender) -> "CtxRender":
+        srcset = []
+        if comparison.generator.get_variant_heights():
+            srcset = [(str(path), width) for path, width in comparison.get_srcset()]
         return cls(
-            renderer_name=comparison.renderer.name,
-            renderer_id=comparison.renderer.filename,
+            renderer_name=comparison.renderer.name if comparison.renderer else "",
+            renderer_id=comparison.renderer.filename if comparison.renderer else "",
             path=str(comparison.dst_path),
+            srcset=srcset,
         )
 
 
@@ -178,7 +276,8 @@ class CtxComparison:
         for render in session.renders:
             generator_name = render.generator.shortname
             if generator_name == GeneratorCombined.shortname:
-                combined_by_generators[generator_name] = CtxRender.from_comparison(
+                source_generator = render.generator.source_generator
+                combined_by_generators[source_generator] = CtxRender.from_comparison(
                     render
                 )
             else:
@@ -206,6 +305,9 @@ class CtxComparison:
         for generator in self.generators:
             for render in generator.renders:
                 render.path = callback(render.path)
+                render.srcset = [
+                    (callback(path), width) for path, width in render.srcset
+                ]
 
     def sort_renders(self, callback: Callable[[CtxRender], Any]):
         for generator in self.generators:
@@ -221,25 +323,60 @@ def build_renderers(
         dst_dir: filesystem path to a directory that may exist
         renderer_ids: list of renderer identifier to build and return
     """
-    renderers: list[CtxRenderer] = []
-    for renderer_id in renderer_ids:
-        renderer_dir = dst_dir / renderer_id
-        command = [renderer_id, str(renderer_dir)]
-        with patch_sysargv([str(RENDERER_SCRIPT_PATH)] + command):
-            runpy.run_path(str(RENDERER_SCRIPT_PATH), run_name="__main__")
-
-        renderer_file = next(renderer_dir.glob("*.json"))
-        renderer_txt = renderer_file.read_text("utf-8")
-        renderer = OcioConfigRenderer.from_json(renderer_txt)
-        ctxrenderer = CtxRenderer.from_renderer(renderer)
-        renderers.append(ctxrenderer)
-
+    renderers = lxmpicturelab.renderer.build_renderers(
+        dst_dir=dst_dir,
+        renderer_ids=renderer_ids,
+    )
+    renderers = [CtxRenderer.from_renderer(renderer) for renderer in renderers]
     return renderers
 
 
-def _build_comparison(asset_id: str, argv: list[str]):
-    LOGGER.info(f"🔨 building comparisons for '{asset_id}'")
-    IMAGEGEN_SCRIPT(argv)
+def _get_comparison_hash(
+    asset: ImageAsset,
+    asset_args: list[str],
+    renderers: list[OcioConfigRenderer],
+    engine: RenderEngine,
+    encoding: ImageEncoding,
+) -> str:
+    """
+    Identify all the inputs used to generate the comparison images of an asset.
+    """
+    renderers_hash = [
+        (
+            renderer.to_dict(),
+            [(path.name, hash_file(path)) for path in renderer.get_resource_paths()],
+        )
+        for renderer in renderers
+    ]
+    source_hash = hash_file(asset.image_path)
+    return hash_object(
+        [asset_args, source_hash, renderers_hash, engine.value, encoding.to_dict()]
+    )
+
+
+def get_comparison_encoding(asset_args: list[str], gen_cli) -> ImageEncoding:
+    """
+    Get how the comparison images of an asset are encoded.
+
+    Assets can request an explicit ``--format``, else the first of
+    ``SITE_ENCODINGS`` supported by OpenImageIO is used.
+    """
+    if "--format" in asset_args:
+        return IMAGEGEN_GET_ENCODING(gen_cli)
+    return next(
+        encoding for encoding in SITE_ENCODINGS if encoding.format.is_supported()
+    )
+
+
+def copy_file(src_path: Path, dst_path: Path, manifest: BuildManifest):
+    """
+    Copy the given file only if it changed since the last build.
+    """
+    if manifest.is_outdated(dst_path, hash_file(src_path)):
+        LOGGER.debug(f"shutil.copy({src_path}, {dst_path})")
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(src_path, dst_path)
+        manifest.update(dst_path, hash_file(src_path))
 
 
 def build_comparisons(
@@ -247,37 +384,71 @@ def build_comparisons(
     comparisons_dir: Path,
     renderers_dir: Path,
     dst_dir: Path,
+    manifest: BuildManifest,
     overwrite_existing: bool = False,
+    engine: RenderEngine = RenderEngine.oiiotool,
 ) -> list[CtxComparison]:
     """
     Generate the comparison images and their metadata.
+
+    The renders of all the assets are generated in a single parallel run. Assets
+    whose source image, options and renderers didn't change since the last build
+    are skipped.
     """
     sessions: list[ComparisonSession] = []
 
-    comparison_ctx: list[tuple[str, list[str]]] = []
+    planned_sessions: list[tuple[ComparisonSession, Path]] = []
     comparison_dirs: list[Path] = []
 
+    comparison_hashes: list[tuple[Path, str]] = []
+
     for asset_id, asset_args in assets.items():
         asset_dst_dir = comparisons_dir / asset_id
         comparison_dirs.append(asset_dst_dir)
-        is_existing = bool(list(asset_dst_dir.glob("*.json")))
-        if is_existing and not overwrite_existing:
-            LOGGER.info(f"⏩ skipping building for '{asset_id}': found existing")
-        else:
-
-            command = [
-                asset_id,
-                "--target-dir",
-                str(asset_dst_dir),
-                "--renderer-dir",
-                str(renderers_dir),
-            ] + asset_args
-            comparison_ctx.append((asset_id, command))
+        gen_cli = IMAGEGEN_GET_CLI([asset_id] + asset_args)
+        asset = find_asset(asset_id)
+        if not asset:
+            raise ValueError(f"No asset with identifier '{asset_id}' found.")
+        renderers = lxmpicturelab.renderer.build_renderers(
+            dst_dir=renderers_dir,
+            renderer_ids=gen_cli.renderers,
+        )
+        encoding = get_comparison_encoding(asset_args, gen_cli)
+        comparison_hash = _get_comparison_hash(
+            asset, asset_args, renderers, engine, encoding
+        )
+        is_outdated = manifest.is_outdated(asset_dst_dir, comparison_hash)
+        if not is_outdated and not overwrite_existing:
+            LOGGER.info(f"⏩ skipping building for '{asset_id}': found unchanged")
+            continue
+
+        LOGGER.info(f"🔨 planning comparisons for '{asset_id}'")
+        if asset_dst_dir.exists():
+            LOGGER.debug(f"shutil.rmtree({asset_dst_dir})")
+            shutil.rmtree(asset_dst_dir)
+        asset_dst_dir.mkdir(parents=True)
+        session = IMAGEGEN_PLAN(
+            asset=asset,
+            renderers=renderers,
+            generators=IMAGEGEN_GET_GENERATORS(
+                gen_cli.generator_exposures,
+                gen_cli.generator_full,
+                gen_cli.generator_full_variants,
+            ),
+            target_dir=asset_dst_dir,
+            combined_renderers=gen_cli.combined_renderers,
+            encoding=encoding,
+        )
+        planned_sessions.append((session, asset_dst_dir))
+        comparison_hashes.append((asset_dst_dir, comparison_hash))
 
-    LOGGER.debug(f"🚦▶️ about to run {len(comparison_ctx)} comparisons in parallel ...")
-    with Pool(processes=4) as pool:
-        pool.starmap(_build_comparison, comparison_ctx)
-    LOGGER.debug(f"🚦✅ completed parallel run")
+    renders = [render for session, _ in planned_sessions for render in session.renders]
+    cache = RenderCache(IMAGEGEN_CACHE_DIR)
+    run_renders(renders, engine=engine, cache=cache)
+    for session, asset_dst_dir in planned_sessions:
+        IMAGEGEN_WRITE_SESSION(session, asset_dst_dir)
+    for asset_dst_dir, comparison_hash in comparison_hashes:
+        manifest.update(asset_dst_dir, comparison_hash)
 
     for asset_dst_dir in comparison_dirs:
         try:
@@ -291,8 +462,13 @@ def build_comparisons(
         else:
             sessions.append(session)
 
-    LOGGER.debug(f"copytree('{comparisons_dir}', '{dst_dir}')")
-    shutil.copytree(comparisons_dir, dst_dir, ignore=shutil.ignore_patterns("*.json"))
+    LOGGER.debug(f"copying changed images from '{comparisons_dir}' to '{dst_dir}'")
+    for asset_dst_dir in comparison_dirs:
+        for src_path in asset_dst_dir.iterdir():
+            if src_path.suffix == ".json":
+                continue
+            dst_path = dst_dir / src_path.relative_to(comparisons_dir)
+            copy_file(src_path, dst_path, manifest)
 
     def swap_path(p: str) -> str:
         p = Path(p).relative_to(comparisons_dir)
@@ -327,6 +503,13 @@ def slugify(value, allow_unicode=False):
     return re.sub(r"[-\s]+", "-", value).strip("-_")
 
 
+def format_srcset(srcset: list[tuple[str, int]]) -> str:
+    """
+    Convert a list of (image path, image width) to a html ``srcset`` attribute value.
+    """
+    return ", ".join(f"{path} {width}w" for path, width in srcset)
+
+
 def get_jinja_env(publish: bool) -> jinja2.Environment:
 
     def expand_siteurl(path: str) -> str:
@@ -354,17 +537,42 @@ def get_jinja_env(publish: bool) -> jinja2.Environment:
         loader=jinja2.FileSystemLoader(THISDIR),
     )
     jinja_env.filters["slugify"] = slugify
+    jinja_env.filters["srcset"] = format_srcset
     jinja_env.filters["expand_siteurl"] = expand_siteurl
     jinja_env.filters["format_link"] = format_link
     return jinja_env
 
 
+def render_page(
+    template: jinja2.Template,
+    page_ctx: dict[str, Any],
+    html_path: Path,
+    templates_hash: str,
+    manifest: BuildManifest,
+):
+    """
+    Write the given template to disk only if its context or the templates changed.
+    """
+    # the build date would make every page outdated at each build
+    hashed_ctx = {key: value for key, value in page_ctx.items() if key != "BUILD_DATE"}
+    page_hash = hash_object([templates_hash, hashed_ctx])
+    if not manifest.is_outdated(html_path, page_hash):
+        LOGGER.debug(f"⏩ skipping unchanged '{html_path}'")
+        return
+
+    html = template.render(**page_ctx)
+    LOGGER.info(f"💾 writing html to '{html_path}'")
+    html_path.write_text(html, encoding="utf-8")
+    manifest.update(html_path, page_hash)
+
+
 def build(
     assets: dict[str, list[str]],
     renderer_ids: list[str],
     build_dir: Path,
     work_dir: Path,
     publish: bool,
+    engine: RenderEngine = RenderEngine.oiiotool,
 ):
     """
     Generate the final static html site.
@@ -372,9 +580,11 @@ def build(
     Args:
         assets: collection of asset to build the website against
         renderer_ids: list of renderer identifier to build and use for the comparison
-        build_dir: filesystem path to a non-existing directory. Used to store the final site.
+        build_dir: filesystem path to an existing directory. Used to store the final site.
+            Only the files whose inputs changed since the last build are written.
         work_dir: filesystem path to an existing directory.
         publish: true to build for web publishing else implies local testing.
+        engine: how to execute the image processing of the comparisons.
     """
 
     def conformize_paths(p: str) -> str:
@@ -391,6 +601,8 @@ def build(
             )
             return 0
 
+    manifest = BuildManifest(work_dir / "site-build.manifest.json")
+
     # // comparison images generation
 
     img_dir = build_dir / "img"
@@ -408,12 +620,18 @@ def build(
         comparisons_dir=comparisons_dir,
         renderers_dir=renderers_dir,
         dst_dir=img_dir,
+        manifest=manifest,
+        engine=engine,
     )
 
     # // HTML generation
 
     jinja_env = get_jinja_env(publish=publish)
     comparison_template = jinja_env.get_template("comparison.html")
+    # templates can include each other, so any change affect all pages
+    templates_hash = hash_object(
+        [publish] + [hash_file(path) for path in sorted(THISDIR.glob("*.html"))]
+    )
 
     # build comparison.html
 
@@ -432,15 +650,15 @@ def build(
     for comparison in comparisons:
         comparison.edit_paths(callback=conformize_paths)
         comparison.sort_renders(callback=sort_renders)
+
+    for comparison in comparisons:
         page_ctx = {
             **global_ctx,
             "Comparison": comparison,
             "PAGEURL": comparison.page_slug,
         }
-        html = comparison_template.render(**page_ctx)
         html_path = build_dir / f"{comparison.page_slug}.html"
-        LOGGER.info(f"💾 writing html to '{html_path}'")
-        html_path.write_text(html, encoding="utf-8")
+        render_page(comparison_template, page_ctx, html_path, templates_hash, manifest)
 
     # build about.html
 
@@ -450,10 +668,8 @@ def build(
         "PAGEURL": "about",
     }
     about_template = jinja_env.get_template("about.html")
-    html = about_template.render(**page_ctx)
     html_path = build_dir / f"about.html"
-    LOGGER.info(f"💾 writing html to '{html_path}'")
-    html_path.write_text(html, encoding="utf-8")
+    render_page(about_template, page_ctx, html_path, templates_hash, manifest)
 
     # build index.html
 
@@ -462,22 +678,29 @@ def build(
         "PAGEURL": "index",
     }
     index_template = jinja_env.get_template("index.html")
-    html = index_template.render(**page_ctx)
     html_path = build_dir / f"index.html"
-    LOGGER.info(f"💾 writing html to '{html_path}'")
-    html_path.write_text(html, encoding="utf-8")
+    render_page(index_template, page_ctx, html_path, templates_hash, manifest)
 
     # copy static resources
 
+    css_path = build_dir / CSS_PATH.name
     if publish:
-        shutil.copy(CSS_PATH, build_dir / CSS_PATH.name)
+        if css_path.is_symlink():
+            css_path.unlink()
+        copy_file(CSS_PATH, css_path, manifest)
     else:
-        os.symlink(CSS_PATH, build_dir / CSS_PATH.name)
+        if not css_path.is_symlink():
+            css_path.unlink(missing_ok=True)
+            os.symlink(CSS_PATH, css_path)
+        manifest.update(css_path, "symlink")
     for src_path, dst_path in STATIC_RESOURCES.items():
         src_path = Path(THISDIR, src_path)
         dst_path = Path(build_dir, dst_path)
-        LOGGER.debug(f"shutil.copy({src_path}, {dst_path})")
-        shutil.copy(src_path, dst_path)
+        copy_file(src_path, dst_path, manifest)
+
+    for removed_path in manifest.prune():
+        LOGGER.info(f"🗑️ removed stale output '{removed_path}'")
+    manifest.save()
 
 
 def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
@@ -503,6 +726,18 @@ def get_cli(argv: list[str] | None = None) -> argparse.Namespace:
         default=WORKDIR,
         help="filesystem path to write intermediates resource data to.",
     )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default=RenderEngine.oiiotool.value,
+        choices=[engine.value for engine in RenderEngine],
+        help="How to execute the image processing of the comparisons.",
+    )
+    parser.add_argument(
+        "--clean",
+        action="store_true",
+        help="If specified, delete the target directory to rebuild the site from scratch.",
+    )
     parsed = parser.parse_args(argv)
     return parsed
 
@@ -512,14 +747,18 @@ def main(argv: list[str] | None = None):
     work_dir: Path = cli.work_dir
     build_dir: Path = cli.target_dir
     publish: bool = cli.publish
+    engine = RenderEngine(cli.engine)
+    clean: bool = cli.clean
 
     stime = time.time()
 
     LOGGER.debug(f"{build_dir=}")
     LOGGER.debug(f"{work_dir=}")
     LOGGER.debug(f"{publish=}")
+    LOGGER.debug(f"{engine=}")
+    LOGGER.debug(f"{clean=}")
 
-    if build_dir.exists() and not publish:
+    if build_dir.exists() and clean:
         LOGGER.debug(f"shutil.rmtree({build_dir})")
         shutil.rmtree(build_dir)
 
@@ -533,6 +772,7 @@ def main(argv: list[str] | None = None):
         build_dir=build_dir,
         work_dir=work_dir,
         publish=publish,
+        engine=engine,
     )
     LOGGER.info(f"✅ site build finished in {(time.time() - stime)/60:.2f}min.")
     LOGGER.info(f"🌐 check 'file:///{build_dir.as_posix()}/index.html'")
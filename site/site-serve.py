@@ -3,7 +3,6 @@ import logging
 import http.server
 import os
 import runpy
-import shutil
 import socketserver
 import sys
 from pathlib import Path
@@ -21,9 +20,6 @@ BUILDSCRIPT = runpy.run_path(str(BUILDSCRIPT_PATH))["main"]
 # // site build
 
 LOGGER.info(f"📃 building doc to '{BUILDIR}'")
-if BUILDIR.exists():
-    LOGGER.debug(f"rmtree({BUILDIR})")
-    shutil.rmtree(BUILDIR)
 BUILDSCRIPT(["--publish", "--target-dir", str(BUILDIR)])
 
 